@@ -1,3 +1,4 @@
+import os
 import requests
 import unittest
 import json
@@ -230,9 +231,13 @@ class TestCartelAdminAPI(unittest.TestCase):
             self.assertIn("name", partner)
             self.assertIn("email", partner)
             self.assertIn("commission_rate", partner)
-            self.assertIn("api_key", partner)
+            self.assertIn("api_key_prefix", partner)
             self.assertIn("referral_code", partner)
             
+            # Only a hash of the API key is stored, and it is never returned
+            self.assertNotIn("api_key", partner)
+            self.assertNotIn("api_key_hash", partner)
+            
             # Ensure API secret is hidden
             if "api_secret" in partner:
                 self.assertEqual(partner["api_secret"], "***hidden***")
@@ -387,5 +392,373 @@ class TestCartelAdminAPI(unittest.TestCase):
         print(f"Settings Response: {json.dumps(data, indent=2)}")
         print("✅ Get Settings test passed")
 
+    def test_11_get_index_report(self):
+        """Test the MongoDB index report endpoint"""
+        print("\n=== Testing Get Index Report ===")
+        
+        if not TestCartelAdminAPI.auth_token:
+            self.skipTest("No auth token available from login test")
+        
+        response = requests.get(
+            f"{ADMIN_API_URL}/indexes",
+            headers={"Authorization": f"Bearer {TestCartelAdminAPI.auth_token}"}
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data["success"])
+        
+        # Every hot collection is provisioned at startup
+        report = data["data"]
+        for collection in ["exchanges", "partners", "admin_users", "currency_tokens"]:
+            self.assertIn(collection, report)
+            self.assertEqual(report[collection]["missing"], [])
+        
+        print(f"Index Report Response: {json.dumps(data, indent=2)}")
+        print("✅ Get Index Report test passed")
+
+    def test_12_get_loop_diagnostics(self):
+        """Test the event-loop diagnostics endpoint"""
+        print("\n=== Testing Get Loop Diagnostics ===")
+        
+        if not TestCartelAdminAPI.auth_token:
+            self.skipTest("No auth token available from login test")
+        
+        response = requests.get(
+            f"{ADMIN_API_URL}/diagnostics/loop",
+            headers={"Authorization": f"Bearer {TestCartelAdminAPI.auth_token}"}
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data["success"])
+        for field in ["enabled", "threshold_ms", "stalls", "offenders"]:
+            self.assertIn(field, data["data"])
+        
+        print(f"Loop Diagnostics Response: {json.dumps(data, indent=2)}")
+        print("✅ Get Loop Diagnostics test passed")
+
+    def test_13_get_range_statistics(self):
+        """Test USD analytics over a time range"""
+        print("\n=== Testing Get Range Statistics ===")
+        
+        if not TestCartelAdminAPI.auth_token:
+            self.skipTest("No auth token available from login test")
+        
+        response = requests.get(
+            f"{ADMIN_API_URL}/stats/range",
+            params={"start": "2025-01-01T00:00:00"},
+            headers={"Authorization": f"Bearer {TestCartelAdminAPI.auth_token}"}
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data["success"])
+        for field in ["exchanges", "volume_usd", "commission_usd", "by_currency", "by_partner"]:
+            self.assertIn(field, data["data"])
+        
+        print(f"Range Statistics Response: {json.dumps(data, indent=2)}")
+        print("✅ Get Range Statistics test passed")
+
+    def test_14_exchanges_cursor_pagination(self):
+        """Test that next_cursor continues the exchange listing without overlap"""
+        print("\n=== Testing Exchanges Cursor Pagination ===")
+        
+        if not TestCartelAdminAPI.auth_token:
+            self.skipTest("No auth token available from login test")
+        
+        headers = {"Authorization": f"Bearer {TestCartelAdminAPI.auth_token}"}
+        response = requests.get(f"{ADMIN_API_URL}/exchanges", params={"page_size": 2}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        first = response.json()
+        self.assertIn("next_cursor", first)
+        
+        if first["next_cursor"]:
+            response = requests.get(
+                f"{ADMIN_API_URL}/exchanges",
+                params={"page_size": 2, "cursor": first["next_cursor"], "with_total": "false"},
+                headers=headers
+            )
+            self.assertEqual(response.status_code, 200)
+            second = response.json()
+            self.assertIsNone(second["total"])
+            first_ids = {e["id"] for e in first["data"]}
+            self.assertFalse(first_ids & {e["id"] for e in second["data"]})
+        
+        response = requests.get(f"{ADMIN_API_URL}/exchanges", params={"cursor": "not-a-cursor"}, headers=headers)
+        self.assertEqual(response.status_code, 400)
+        
+        print("✅ Exchanges Cursor Pagination test passed")
+
+    def test_15_search_partners(self):
+        """Test ranked partner search"""
+        print("\n=== Testing Search Partners ===")
+        
+        if not TestCartelAdminAPI.auth_token:
+            self.skipTest("No auth token available from login test")
+        
+        response = requests.get(
+            f"{ADMIN_API_URL}/partners/search",
+            params={"q": "test"},
+            headers={"Authorization": f"Bearer {TestCartelAdminAPI.auth_token}"}
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data["success"])
+        self.assertIsInstance(data["data"], list)
+        for partner in data["data"]:
+            self.assertNotIn("api_secret", partner)
+            self.assertNotIn("search_terms", partner)
+        
+        print(f"Search Partners Response: {json.dumps(data, indent=2)}")
+        print("✅ Search Partners test passed")
+
+    def test_16_get_audit_log(self):
+        """Test the admin audit log query endpoint"""
+        print("\n=== Testing Get Audit Log ===")
+        
+        if not TestCartelAdminAPI.auth_token:
+            self.skipTest("No auth token available from login test")
+        
+        response = requests.get(
+            f"{ADMIN_API_URL}/audit",
+            params={"page_size": 10, "entity_type": "partner"},
+            headers={"Authorization": f"Bearer {TestCartelAdminAPI.auth_token}"}
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data["success"])
+        self.assertIn("next_cursor", data)
+        for entry in data["data"]:
+            self.assertEqual(entry["entity_type"], "partner")
+            self.assertIn("actor", entry)
+            self.assertIn("changes", entry)
+            self.assertNotIn("api_secret", entry["changes"])
+        
+        print(f"Audit Log Response: {json.dumps(data, indent=2)}")
+        print("✅ Get Audit Log test passed")
+
+    def test_17_get_dashboard(self):
+        """Test the combined dashboard endpoint and its field selector"""
+        print("\n=== Testing Get Dashboard ===")
+        
+        if not TestCartelAdminAPI.auth_token:
+            self.skipTest("No auth token available from login test")
+        
+        headers = {"Authorization": f"Bearer {TestCartelAdminAPI.auth_token}"}
+        response = requests.get(f"{ADMIN_API_URL}/dashboard", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data["success"])
+        for field in ["stats", "partners", "exchanges", "tokens", "settings"]:
+            self.assertIn(field, data["data"])
+        
+        response = requests.get(f"{ADMIN_API_URL}/dashboard", params={"fields": "stats"}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()["data"]), ["stats"])
+        
+        response = requests.get(f"{ADMIN_API_URL}/dashboard", params={"fields": "unknown"}, headers=headers)
+        self.assertEqual(response.status_code, 400)
+        
+        print("✅ Get Dashboard test passed")
+
+    def test_18_get_partner_usage(self):
+        """Test metered partner usage report"""
+        print("\n=== Testing Get Partner Usage ===")
+        
+        if not TestCartelAdminAPI.auth_token:
+            self.skipTest("No auth token available from login test")
+        
+        headers = {"Authorization": f"Bearer {TestCartelAdminAPI.auth_token}"}
+        partners = requests.get(f"{ADMIN_API_URL}/partners", params={"page_size": 1}, headers=headers).json()["data"]
+        if not partners:
+            self.skipTest("No partners available")
+        
+        response = requests.get(f"{ADMIN_API_URL}/partners/{partners[0]['id']}/usage", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        for field in ["rate_limit_per_minute", "total", "rate_limited", "endpoints", "pairs", "hours"]:
+            self.assertIn(field, data)
+        
+        response = requests.get(f"{ADMIN_API_URL}/partners/unknown-partner/usage", headers=headers)
+        self.assertEqual(response.status_code, 404)
+        
+        print("✅ Get Partner Usage test passed")
+
+    def test_19_partner_attributed_exchange(self):
+        """Test that exchanges from a referral code or partner API key land in the partner's stats"""
+        print("\n=== Testing Partner Attributed Exchange ===")
+        
+        if not TestCartelAdminAPI.auth_token:
+            self.skipTest("No auth token available from login test")
+        
+        headers = {"Authorization": f"Bearer {TestCartelAdminAPI.auth_token}"}
+        response = requests.post(f"{ADMIN_API_URL}/partners", json={
+            "name": "Attribution Test Partner",
+            "email": f"attribution-{int(time.time() * 1000)}@example.com",
+            "commission_rate": 25.0
+        }, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        partner = response.json()["data"]
+        
+        start = time.strftime("%Y-%m-%dT%H:00:00", time.gmtime(time.time() - 3600))
+        exchange_data = {
+            "from_currency": "BTC",
+            "to_currency": "ETH",
+            "from_amount": 0.1,
+            "to_amount": 1.63,
+            "receiving_address": "0x742d35Cc6634C0532925a3b844Bc454e4438f44e",
+            "rate_type": "float"
+        }
+        response = requests.post(f"{API_URL}/exchange", json={**exchange_data, "referral_code": partner["referral_code"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["partner_id"], partner["id"])
+        
+        response = requests.post(f"{API_URL}/exchange", json=exchange_data, headers={"X-API-Key": partner["api_key"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["partner_id"], partner["id"])
+        
+        # An invalid API key is rejected rather than silently unattributed
+        response = requests.post(f"{API_URL}/exchange", json=exchange_data, headers={"X-API-Key": "not-a-key"})
+        self.assertEqual(response.status_code, 401)
+        
+        response = requests.get(f"{ADMIN_API_URL}/stats/range", params={"start": start}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        bucket = response.json()["data"]["by_partner"].get(partner["id"])
+        self.assertIsNotNone(bucket)
+        self.assertEqual(bucket["count"], 2)
+        
+        requests.delete(f"{ADMIN_API_URL}/partners/{partner['id']}", headers=headers)
+        print("✅ Partner Attributed Exchange test passed")
+
+
+    def test_20_bulk_update_exchanges(self):
+        """Test that a bulk update reports which exchanges it actually wrote"""
+        print("\n=== Testing Bulk Update Exchanges ===")
+        
+        if not TestCartelAdminAPI.auth_token:
+            self.skipTest("No auth token available from login test")
+        
+        headers = {"Authorization": f"Bearer {TestCartelAdminAPI.auth_token}"}
+        response = requests.post(f"{API_URL}/exchange", json={
+            "from_currency": "BTC",
+            "to_currency": "ETH",
+            "from_amount": 0.1,
+            "to_amount": 1.63,
+            "receiving_address": "0x742d35Cc6634C0532925a3b844Bc454e4438f44e",
+            "rate_type": "float"
+        })
+        self.assertEqual(response.status_code, 200)
+        exchange_id = response.json()["id"]
+        deposit_hash = f"bulk-test-{int(time.time() * 1000)}"
+        
+        response = requests.post(f"{ADMIN_API_URL}/exchanges/bulk", json={"updates": [
+            {"id": exchange_id, "deposit_hash": deposit_hash},
+            {"id": "no-such-exchange", "deposit_hash": deposit_hash},
+            {"id": exchange_id, "deposit_hash": deposit_hash}
+        ]}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["data"]["results"]
+        print(f"Bulk results: {results}")
+        self.assertEqual([r["result"] for r in results], ["updated", "not_found", "duplicate"])
+        
+        # Only the ids reported as updated were written
+        response = requests.get(f"{ADMIN_API_URL}/exchanges/{exchange_id}", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["deposit_hash"], deposit_hash)
+        
+        print("✅ Bulk Update Exchanges test passed")
+
+
+    def test_21_rotate_partner_api_key(self):
+        """Test that a hashed partner key authenticates and stops working once rotated"""
+        print("\n=== Testing Rotate Partner API Key ===")
+        
+        if not TestCartelAdminAPI.auth_token:
+            self.skipTest("No auth token available from login test")
+        
+        headers = {"Authorization": f"Bearer {TestCartelAdminAPI.auth_token}"}
+        response = requests.post(f"{ADMIN_API_URL}/partners", json={
+            "name": "Key Rotation Test Partner",
+            "email": f"rotation-{int(time.time() * 1000)}@example.com",
+            "commission_rate": 10.0
+        }, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        partner = response.json()["data"]
+        old_key = partner["api_key"]
+        
+        # Only the hash is stored, yet the key handed out at creation works
+        response = requests.get(f"{API_URL}/partner/status", headers={"X-API-Key": old_key})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["partner_id"], partner["id"])
+        
+        response = requests.post(f"{ADMIN_API_URL}/partners/{partner['id']}/api-key", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        new_key = response.json()["data"]["api_key"]
+        self.assertNotEqual(new_key, old_key)
+        
+        # The cached principal for the old key is dropped immediately
+        response = requests.get(f"{API_URL}/partner/status", headers={"X-API-Key": old_key})
+        self.assertEqual(response.status_code, 401)
+        response = requests.get(f"{API_URL}/partner/status", headers={"X-API-Key": new_key})
+        self.assertEqual(response.status_code, 200)
+        
+        requests.delete(f"{ADMIN_API_URL}/partners/{partner['id']}", headers=headers)
+        print("✅ Rotate Partner API Key test passed")
+
+
+    def test_22_admin_write_invalidates_principal(self):
+        """Test that a write to admin_users drops the cached principal for existing tokens"""
+        print("\n=== Testing Admin Principal Invalidation ===")
+        
+        if not TestCartelAdminAPI.auth_token:
+            self.skipTest("No auth token available from login test")
+        
+        headers = {"Authorization": f"Bearer {TestCartelAdminAPI.auth_token}"}
+        # Caches the principal for this token
+        response = requests.get(f"{ADMIN_API_URL}/me", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        last_login = response.json()["data"].get("last_login")
+        
+        # Logging in again writes last_login to admin_users
+        time.sleep(1)
+        response = requests.post(f"{ADMIN_API_URL}/login", json={"username": "admin", "password": "cartel123"})
+        self.assertEqual(response.status_code, 200)
+        
+        response = requests.get(f"{ADMIN_API_URL}/me", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        print(f"last_login: {last_login} -> {response.json()['data'].get('last_login')}")
+        self.assertNotEqual(response.json()["data"].get("last_login"), last_login)
+        
+        print("✅ Admin Principal Invalidation test passed")
+
+
+    def test_23_login_limiter(self):
+        """Test that failed logins are limited per username and address"""
+        print("\n=== Testing Login Limiter ===")
+        
+        # Off by default; set LOGIN_MAX_FAILURES to the backend's value to run this
+        max_failures = int(os.getenv("LOGIN_MAX_FAILURES", "0"))
+        if not max_failures:
+            self.skipTest("LOGIN_MAX_FAILURES not set")
+        
+        # A throwaway username so the admin account used by other tests is never locked out
+        username = f"limiter-{int(time.time() * 1000)}"
+        for _ in range(max_failures):
+            response = requests.post(f"{ADMIN_API_URL}/login", json={"username": username, "password": "wrong"})
+            self.assertEqual(response.status_code, 401)
+        
+        response = requests.post(f"{ADMIN_API_URL}/login", json={"username": username, "password": "wrong"})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response.headers)
+        
+        # Another username from the same address has its own budget
+        response = requests.post(f"{ADMIN_API_URL}/login", json={"username": f"{username}-other", "password": "wrong"})
+        self.assertEqual(response.status_code, 401)
+        
+        print("✅ Login Limiter test passed")
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
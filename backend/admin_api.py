@@ -1,13 +1,33 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from motor.motor_asyncio import AsyncIOMotorDatabase
 import jwt
-import bcrypt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional
+import asyncio
+import uuid
 import os
 import logging
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 from admin_models import *
+from exchange_cache import exchange_cache, notify_exchange_changed, notify_exchanges_changed
+from db_indexes import index_report
+from fast_json import FastJSONResponse, EXCHANGE_PROJECTION, PARTNER_PROJECTION, DOCUMENT_PROJECTION
+from currency_catalog import currency_catalog
+from loop_watchdog import loop_watchdog
+from password_hashing import password_hasher, login_limiter, HasherBusyError
+from principal_cache import principal_cache, notify_admin_changed, ADMIN_PRINCIPAL_PROJECTION
+from stats_engine import stats_engine
+from pagination import keyset_page, count_cache, InvalidCursorError
+from partner_search import search_partners, search_query, search_terms, SEARCH_FIELDS
+from exchange_export import export_exchanges, MEDIA_TYPES
+from audit_log import audit_log, COLLECTION as AUDIT_COLLECTION
+from admin_feed import admin_feed
+from partner_auth import stored_key_fields, notify_partner_changed
+from exchange_settings import settings_service
+from partner_usage import usage_report, rate_limit_for
 
 logger = logging.getLogger(__name__)
 
@@ -15,9 +35,43 @@ logger = logging.getLogger(__name__)
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "cartel_admin_secret_key_2025")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 720  # 12 hours
+# Feed tokens travel in the EventSource URL, so they only open the feed and expire quickly
+FEED_TOKEN_SECONDS = 60
 
 security = HTTPBearer()
 
+MAX_PAGE_SIZE = 200
+MAX_BULK_UPDATES = 500
+# Recent bulk write ids kept on an exchange to confirm which bulk updates applied
+WRITE_IDS_KEPT = 5
+DASHBOARD_FIELDS = ("stats", "partners", "exchanges", "tokens", "settings")
+
+def exchange_filter(status: Optional[str], partner_id: Optional[str],
+                    from_currency: Optional[str], to_currency: Optional[str]) -> dict:
+    """Mongo query for the admin exchange filters"""
+    query = {}
+    if status:
+        query["status"] = status
+    if partner_id:
+        query["partner_id"] = partner_id
+    if from_currency:
+        query["from_currency"] = from_currency
+    if to_currency:
+        query["to_currency"] = to_currency
+    return query
+
+def paginated(data: list, next_cursor: Optional[str], page: int, page_size: int, total: Optional[int]) -> dict:
+    """PaginatedResponse body; total is cached per filter and may lag by a few seconds"""
+    return {
+        "success": True,
+        "data": data,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "total_pages": (total + page_size - 1) // page_size if total is not None else None,
+        "next_cursor": next_cursor
+    }
+
 class AdminService:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
@@ -33,44 +87,77 @@ class AdminService:
         return encoded_jwt
     
     async def verify_token(self, credentials: HTTPAuthorizationCredentials = Depends(security)):
+        return await self.authenticate(credentials.credentials)
+    
+    async def authenticate(self, token: str, scope: Optional[str] = None):
+        """Resolve a token to the active admin, or raise 401.
+
+        Access tokens carry no scope; scoped tokens (the feed token) are only
+        accepted where that scope is asked for and are never cached.
+        """
+        # A cached principal means an access token was verified and the user active recently
+        admin = principal_cache.get(token) if scope is None else None
+        if admin is not None:
+            return admin
+        
         try:
-            payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
             username: str = payload.get("sub")
-            if username is None:
+            if username is None or payload.get("scope") != scope:
                 raise HTTPException(status_code=401, detail="Invalid authentication credentials")
             
-            admin = await self.db.admin_users.find_one({"username": username, "is_active": True})
+            admin = await self.db.admin_users.find_one(
+                {"username": username, "is_active": True}, ADMIN_PRINCIPAL_PROJECTION
+            )
             if admin is None:
                 raise HTTPException(status_code=401, detail="User not found")
             
+            if scope is None:
+                principal_cache.put(token, admin, payload["exp"])
             return admin
         except jwt.PyJWTError:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     
-    def hash_password(self, password: str) -> str:
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    async def hash_password(self, password: str) -> str:
+        return await password_hasher.hash(password)
     
-    def verify_password(self, password: str, hashed_password: str) -> bool:
-        return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+    async def verify_password(self, password: str, hashed_password: str) -> bool:
+        return await password_hasher.verify(password, hashed_password)
 
 def create_admin_router(db: AsyncIOMotorDatabase) -> APIRouter:
     router = APIRouter(prefix="/api/admin", tags=["Admin"])
     admin_service = AdminService(db)
     
+    async def load_settings() -> dict:
+        # Also refreshes the copy the rate endpoints use
+        return await settings_service.load(db)
+    
     # Authentication endpoints
     @router.post("/login", response_model=APIResponse)
-    async def admin_login(credentials: AdminLogin):
+    async def admin_login(credentials: AdminLogin, request: Request):
         """Admin login"""
         try:
+            limiter_key = login_limiter.key(credentials.username, request.client.host if request.client else None)
+            retry_after = login_limiter.retry_after(limiter_key)
+            if retry_after:
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many failed login attempts",
+                    headers={"Retry-After": str(retry_after)}
+                )
+            
             admin = await db.admin_users.find_one({"username": credentials.username, "is_active": True})
-            if not admin or not admin_service.verify_password(credentials.password, admin["password_hash"]):
+            if not admin or not await admin_service.verify_password(credentials.password, admin["password_hash"]):
+                login_limiter.record_failure(limiter_key)
                 raise HTTPException(status_code=401, detail="Invalid credentials")
+            login_limiter.record_success(limiter_key)
             
             # Update last login
             await db.admin_users.update_one(
                 {"username": credentials.username},
                 {"$set": {"last_login": datetime.utcnow()}}
             )
+            await notify_admin_changed(credentials.username)
             
             access_token = admin_service.create_access_token(data={"sub": admin["username"]})
             
@@ -87,6 +174,10 @@ def create_admin_router(db: AsyncIOMotorDatabase) -> APIRouter:
                     }
                 }
             )
+        except HTTPException:
+            raise
+        except HasherBusyError:
+            raise HTTPException(status_code=503, detail="Login is busy, please retry", headers={"Retry-After": "1"})
         except Exception as e:
             logger.error(f"Login error: {e}")
             raise HTTPException(status_code=500, detail="Login failed")
@@ -110,47 +201,52 @@ def create_admin_router(db: AsyncIOMotorDatabase) -> APIRouter:
     async def get_partners(
         page: int = 1,
         page_size: int = 20,
+        cursor: Optional[str] = None,
+        with_total: bool = True,
         search: Optional[str] = None,
         current_admin = Depends(admin_service.verify_token)
     ):
-        """Get all partners with pagination"""
+        """Get all partners, newest first, with cursor pagination"""
         try:
-            skip = (page - 1) * page_size
+            page_size = max(1, min(page_size, MAX_PAGE_SIZE))
             
-            # Build query
-            query = {}
-            if search:
-                query["$or"] = [
-                    {"name": {"$regex": search, "$options": "i"}},
-                    {"email": {"$regex": search, "$options": "i"}},
-                    {"company": {"$regex": search, "$options": "i"}}
-                ]
-            
-            # Get total count
-            total = await db.partners.count_documents(query)
-            
-            # Get partners
-            partners = await db.partners.find(query).skip(skip).limit(page_size).to_list(page_size)
-            
-            # Remove sensitive data
-            for partner in partners:
-                if "_id" in partner:
-                    del partner["_id"]
-                if "api_secret" in partner:
-                    partner["api_secret"] = "***hidden***"
-            
-            return PaginatedResponse(
-                success=True,
-                data=partners,
-                total=total,
-                page=page,
-                page_size=page_size,
-                total_pages=(total + page_size - 1) // page_size
+            # Build query (word-prefix match on name, email and company)
+            query = search_query(search) if search else {}
+            
+            # Get partners (the projection drops _id and api_secret server-side)
+            partners, next_cursor = await keyset_page(
+                db.partners, query, PARTNER_PROJECTION, page_size,
+                cursor=cursor, skip=0 if cursor else (page - 1) * page_size
             )
+            
+            return FastJSONResponse(paginated(
+                partners, next_cursor, page, page_size,
+                await count_cache.count(db.partners, query) if with_total else None
+            ))
+        except InvalidCursorError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
         except Exception as e:
             logger.error(f"Get partners error: {e}")
             raise HTTPException(status_code=500, detail="Failed to get partners")
     
+    @router.get("/partners/search", response_model=APIResponse)
+    async def search_partner_list(
+        q: str,
+        limit: int = 20,
+        current_admin = Depends(admin_service.verify_token)
+    ):
+        """Partners matching every word of q as a word prefix, best matches first"""
+        try:
+            partners = await search_partners(db, q, max(1, min(limit, 100)))
+            return FastJSONResponse({
+                "success": True,
+                "message": "Partners found",
+                "data": partners
+            })
+        except Exception as e:
+            logger.error(f"Search partners error: {e}")
+            raise HTTPException(status_code=500, detail="Failed to search partners")
+    
     @router.post("/partners", response_model=APIResponse)
     async def create_partner(
         partner_data: PartnerCreate,
@@ -168,10 +264,17 @@ def create_admin_router(db: AsyncIOMotorDatabase) -> APIRouter:
             # Generate unique referral URL
             partner.referral_url = f"https://cartelex.ch/?ref={partner.referral_code}"
             
-            await db.partners.insert_one(partner.dict())
+            # Only the hash of the API key is stored; the key itself is returned once below
+            partner_doc = partner.dict()
+            partner_doc.update(stored_key_fields(partner_doc.pop("api_key")))
+            partner_doc["search_terms"] = search_terms(partner_doc)
+            await db.partners.insert_one(partner_doc)
+            await stats_engine.refresh_partners(db)
+            audit_log.record(current_admin["username"], "create", "partner", partner.id, None, partner_doc)
             
             # Remove sensitive data from response but show new keys
             partner_dict = partner.dict()
+            partner_dict["api_key_prefix"] = partner_doc["api_key_prefix"]
             partner_dict["api_secret_display"] = partner_dict["api_secret"]  # Show once for copy
             partner_dict["api_secret"] = "***hidden***"
             
@@ -199,13 +302,26 @@ def create_admin_router(db: AsyncIOMotorDatabase) -> APIRouter:
             if not update_data:
                 raise HTTPException(status_code=400, detail="No data to update")
             
-            result = await db.partners.update_one(
+            # Keep the search prefixes in step with the searchable fields
+            if any(field in update_data for field in SEARCH_FIELDS):
+                current = await db.partners.find_one({"id": partner_id}, {"_id": 0, **{f: 1 for f in SEARCH_FIELDS}})
+                if current is None:
+                    raise HTTPException(status_code=404, detail="Partner not found")
+                update_data["search_terms"] = search_terms({**current, **update_data})
+            
+            previous = await db.partners.find_one_and_update(
                 {"id": partner_id},
-                {"$set": update_data}
+                {"$set": update_data},
+                projection={"_id": 0},
+                return_document=ReturnDocument.BEFORE
             )
             
-            if result.matched_count == 0:
+            if previous is None:
                 raise HTTPException(status_code=404, detail="Partner not found")
+            await notify_partner_changed(partner_id)
+            if "status" in update_data:
+                await stats_engine.refresh_partners(db)
+            audit_log.record(current_admin["username"], "update", "partner", partner_id, previous, {**previous, **update_data})
             
             return APIResponse(
                 success=True,
@@ -216,6 +332,79 @@ def create_admin_router(db: AsyncIOMotorDatabase) -> APIRouter:
         except Exception as e:
             logger.error(f"Update partner error: {e}")
             raise HTTPException(status_code=500, detail="Failed to update partner")
+
+    @router.post("/partners/{partner_id}/api-key", response_model=APIResponse)
+    async def rotate_partner_api_key(
+        partner_id: str,
+        current_admin = Depends(admin_service.verify_token)
+    ):
+        """Issue a new partner API key; the old one stops working at once"""
+        try:
+            api_key = str(uuid.uuid4())
+            key_fields = stored_key_fields(api_key)
+            previous = await db.partners.find_one_and_update(
+                {"id": partner_id},
+                {"$set": key_fields},
+                projection={"_id": 0, "api_key_prefix": 1},
+                return_document=ReturnDocument.BEFORE
+            )
+            if previous is None:
+                raise HTTPException(status_code=404, detail="Partner not found")
+            await notify_partner_changed(partner_id)
+            audit_log.record(
+                current_admin["username"], "update", "partner", partner_id,
+                previous, {"api_key_prefix": key_fields["api_key_prefix"]}
+            )
+
+            # Shown once, like at creation
+            return APIResponse(
+                success=True,
+                message="Partner API key rotated",
+                data={"api_key": api_key, "api_key_prefix": key_fields["api_key_prefix"]}
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Rotate partner API key error: {e}")
+            raise HTTPException(status_code=500, detail="Failed to rotate partner API key")
+
+    @router.get("/partners/{partner_id}/usage", response_model=APIResponse)
+    async def get_partner_usage(
+        partner_id: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        current_admin = Depends(admin_service.verify_token)
+    ):
+        """Metered API usage of a partner in [start, end), the last 24 hours by default"""
+        # Usage minutes are stored in naive UTC like created_at
+        end = end or datetime.utcnow()
+        end = end.astimezone(timezone.utc).replace(tzinfo=None) if end.tzinfo else end
+        start = start or end - timedelta(days=1)
+        start = start.astimezone(timezone.utc).replace(tzinfo=None) if start.tzinfo else start
+        if end <= start:
+            raise HTTPException(status_code=400, detail="end must be after start")
+        
+        try:
+            partner = await db.partners.find_one({"id": partner_id}, {"_id": 0, "id": 1, "rate_limit_per_minute": 1})
+            if partner is None:
+                raise HTTPException(status_code=404, detail="Partner not found")
+            
+            report = await usage_report(db, partner_id, start, end)
+            return APIResponse(
+                success=True,
+                message="Partner usage retrieved successfully",
+                data={
+                    "start": start,
+                    "end": end,
+                    "rate_limit_per_minute": rate_limit_for(partner),
+                    **report
+                }
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Get partner usage error: {e}")
+            raise HTTPException(status_code=500, detail="Failed to get partner usage")
     
     @router.delete("/partners/{partner_id}", response_model=APIResponse)
     async def delete_partner(
@@ -224,9 +413,12 @@ def create_admin_router(db: AsyncIOMotorDatabase) -> APIRouter:
     ):
         """Delete partner"""
         try:
-            result = await db.partners.delete_one({"id": partner_id})
-            if result.deleted_count == 0:
+            previous = await db.partners.find_one_and_delete({"id": partner_id}, projection={"_id": 0})
+            if previous is None:
                 raise HTTPException(status_code=404, detail="Partner not found")
+            await notify_partner_changed(partner_id)
+            await stats_engine.refresh_partners(db)
+            audit_log.record(current_admin["username"], "delete", "partner", partner_id, previous, None)
             
             return APIResponse(
                 success=True,
@@ -243,50 +435,70 @@ def create_admin_router(db: AsyncIOMotorDatabase) -> APIRouter:
     async def get_exchanges(
         page: int = 1,
         page_size: int = 20,
+        cursor: Optional[str] = None,
+        with_total: bool = True,
         status: Optional[str] = None,
         partner_id: Optional[str] = None,
         from_currency: Optional[str] = None,
         to_currency: Optional[str] = None,
         current_admin = Depends(admin_service.verify_token)
     ):
-        """Get all exchanges with filtering"""
+        """Get all exchanges with filtering, newest first, with cursor pagination"""
         try:
-            skip = (page - 1) * page_size
+            page_size = max(1, min(page_size, MAX_PAGE_SIZE))
             
-            # Build query
-            query = {}
-            if status:
-                query["status"] = status
-            if partner_id:
-                query["partner_id"] = partner_id
-            if from_currency:
-                query["from_currency"] = from_currency
-            if to_currency:
-                query["to_currency"] = to_currency
-            
-            # Get total count
-            total = await db.exchanges.count_documents(query)
+            query = exchange_filter(status, partner_id, from_currency, to_currency)
             
             # Get exchanges
-            exchanges = await db.exchanges.find(query).sort("created_at", -1).skip(skip).limit(page_size).to_list(page_size)
-            
-            # Remove MongoDB ObjectId
-            for exchange in exchanges:
-                if "_id" in exchange:
-                    del exchange["_id"]
-            
-            return PaginatedResponse(
-                success=True,
-                data=exchanges,
-                total=total,
-                page=page,
-                page_size=page_size,
-                total_pages=(total + page_size - 1) // page_size
+            exchanges, next_cursor = await keyset_page(
+                db.exchanges, query, EXCHANGE_PROJECTION, page_size,
+                cursor=cursor, skip=0 if cursor else (page - 1) * page_size
             )
+            
+            return FastJSONResponse(paginated(
+                exchanges, next_cursor, page, page_size,
+                await count_cache.count(db.exchanges, query) if with_total else None
+            ))
+        except InvalidCursorError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
         except Exception as e:
             logger.error(f"Get exchanges error: {e}")
             raise HTTPException(status_code=500, detail="Failed to get exchanges")
     
+    @router.get("/exchanges/export")
+    async def export_exchange_list(
+        format: str = "csv",
+        gzip: bool = False,
+        status: Optional[str] = None,
+        partner_id: Optional[str] = None,
+        from_currency: Optional[str] = None,
+        to_currency: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        current_admin = Depends(admin_service.verify_token)
+    ):
+        """Stream every matching exchange created in [start, end) as CSV or NDJSON"""
+        if format not in MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+        
+        query = exchange_filter(status, partner_id, from_currency, to_currency)
+        created_at = {}
+        if start:
+            created_at["$gte"] = start
+        if end:
+            created_at["$lt"] = end
+        if created_at:
+            query["created_at"] = created_at
+        
+        # A gzip export is a .gz file download, not a compressed transfer of the text,
+        # so clients keep it compressed instead of decoding it on the fly
+        filename = f"exchanges-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{format}" + (".gz" if gzip else "")
+        return StreamingResponse(
+            export_exchanges(db, query, format, compress=gzip),
+            media_type="application/gzip" if gzip else MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+    
     @router.get("/exchanges/{exchange_id}", response_model=APIResponse)
     async def get_exchange(
         exchange_id: str,
@@ -294,18 +506,15 @@ def create_admin_router(db: AsyncIOMotorDatabase) -> APIRouter:
     ):
         """Get single exchange details"""
         try:
-            exchange = await db.exchanges.find_one({"id": exchange_id})
+            exchange = await db.exchanges.find_one({"id": exchange_id}, EXCHANGE_PROJECTION)
             if not exchange:
                 raise HTTPException(status_code=404, detail="Exchange not found")
             
-            if "_id" in exchange:
-                del exchange["_id"]
-            
-            return APIResponse(
-                success=True,
-                message="Exchange retrieved successfully",
-                data=exchange
-            )
+            return FastJSONResponse({
+                "success": True,
+                "message": "Exchange retrieved successfully",
+                "data": exchange
+            })
         except HTTPException:
             raise
         except Exception as e:
@@ -325,13 +534,22 @@ def create_admin_router(db: AsyncIOMotorDatabase) -> APIRouter:
             if not update_data:
                 raise HTTPException(status_code=400, detail="No data to update")
             
-            result = await db.exchanges.update_one(
+            # The previous document is needed to move the stats counters
+            previous = await db.exchanges.find_one_and_update(
                 {"id": exchange_id},
-                {"$set": update_data}
+                {"$set": update_data, "$inc": {"version": 1}},
+                projection={"_id": 0},
+                return_document=ReturnDocument.BEFORE
             )
             
-            if result.matched_count == 0:
+            if previous is None:
                 raise HTTPException(status_code=404, detail="Exchange not found")
+            exchange = {**previous, **update_data, "version": previous.get("version", 0) + 1}
+            
+            # Refresh caches and wake long-poll clients waiting on this exchange
+            await notify_exchange_changed(exchange)
+            await stats_engine.record_change(db, exchange, previous)
+            audit_log.record(current_admin["username"], "update", "exchange", exchange_id, previous, exchange)
             
             return APIResponse(
                 success=True,
@@ -343,22 +561,112 @@ def create_admin_router(db: AsyncIOMotorDatabase) -> APIRouter:
             logger.error(f"Update exchange error: {e}")
             raise HTTPException(status_code=500, detail="Failed to update exchange")
     
+    @router.post("/exchanges/bulk", response_model=APIResponse)
+    async def bulk_update_exchanges(
+        bulk: ExchangeBulkUpdate,
+        current_admin = Depends(admin_service.verify_token)
+    ):
+        """Apply many exchange updates with one unordered bulk_write.
+
+        Each update only applies if the exchange was not modified since it
+        was read, so per-item results and stats stay exact. Applied updates
+        are told apart by a per-request write id pushed onto write_ids, which
+        later writes cannot make ambiguous. Costs three round trips whatever
+        the batch size.
+        """
+        if not bulk.updates:
+            raise HTTPException(status_code=400, detail="No updates given")
+        if len(bulk.updates) > MAX_BULK_UPDATES:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_UPDATES} updates per request")
+        
+        try:
+            results = [None] * len(bulk.updates)
+            # exchange id -> position in the request
+            positions = {}
+            changes = {}
+            for position, item in enumerate(bulk.updates):
+                update_data = {k: v for k, v in item.dict().items() if v is not None and k != "id"}
+                if item.id in positions:
+                    results[position] = "duplicate"
+                    continue
+                positions[item.id] = position
+                if not update_data:
+                    results[position] = "no_changes"
+                else:
+                    changes[item.id] = update_data
+            
+            previous = {
+                exchange["id"]: exchange
+                async for exchange in db.exchanges.find({"id": {"$in": list(changes)}}, {"_id": 0, "write_ids": 0})
+            }
+            write_id = uuid.uuid4().hex
+            operations = []
+            for exchange_id, update_data in list(changes.items()):
+                if exchange_id not in previous:
+                    results[positions[exchange_id]] = "not_found"
+                    del changes[exchange_id]
+                    continue
+                version = previous[exchange_id].get("version")
+                operations.append(UpdateOne(
+                    {"id": exchange_id, "version": version if version is not None else {"$exists": False}},
+                    {
+                        "$set": update_data,
+                        "$inc": {"version": 1},
+                        "$push": {"write_ids": {"$each": [write_id], "$slice": -WRITE_IDS_KEPT}}
+                    }
+                ))
+            
+            if operations:
+                operation_ids = list(changes)
+                try:
+                    await db.exchanges.bulk_write(operations, ordered=False)
+                except BulkWriteError as e:
+                    for error in e.details.get("writeErrors", []):
+                        failed_id = operation_ids[error["index"]]
+                        results[positions[failed_id]] = "error"
+                        del changes[failed_id]
+            
+            # Updates that lost a race to another writer do not carry our write id
+            for exchange_id in changes:
+                results[positions[exchange_id]] = "conflict"
+            applied = [
+                exchange["id"] async for exchange in db.exchanges.find(
+                    {"id": {"$in": list(changes)}, "write_ids": write_id}, {"_id": 0, "id": 1}
+                )
+            ]
+            updated = []
+            for exchange_id in applied:
+                results[positions[exchange_id]] = "updated"
+                before = previous[exchange_id]
+                # The document as our write left it, like update_exchange
+                updated.append({**before, **changes[exchange_id], "version": before.get("version", 0) + 1})
+            
+            await notify_exchanges_changed(updated)
+            for exchange in updated:
+                audit_log.record(current_admin["username"], "update", "exchange", exchange["id"], previous[exchange["id"]], exchange)
+            await stats_engine.record_changes(db, [(exchange, previous[exchange["id"]]) for exchange in updated])
+            
+            return APIResponse(
+                success=True,
+                message=f"Updated {len(updated)} of {len(bulk.updates)} exchanges",
+                data={"results": [{"id": item.id, "result": result} for item, result in zip(bulk.updates, results)]}
+            )
+        except Exception as e:
+            logger.error(f"Bulk update exchanges error: {e}")
+            raise HTTPException(status_code=500, detail="Failed to update exchanges")
+    
     # Currency/Token management
     @router.get("/tokens", response_model=APIResponse)
     async def get_tokens(current_admin = Depends(admin_service.verify_token)):
         """Get all currency tokens"""
         try:
-            tokens = await db.currency_tokens.find({}).sort("order_index", 1).to_list(None)
-            
-            for token in tokens:
-                if "_id" in token:
-                    del token["_id"]
+            tokens = await db.currency_tokens.find({}, DOCUMENT_PROJECTION).sort("order_index", 1).to_list(None)
             
-            return APIResponse(
-                success=True,
-                message="Tokens retrieved successfully",
-                data=tokens
-            )
+            return FastJSONResponse({
+                "success": True,
+                "message": "Tokens retrieved successfully",
+                "data": tokens
+            })
         except Exception as e:
             logger.error(f"Get tokens error: {e}")
             raise HTTPException(status_code=500, detail="Failed to get tokens")
@@ -375,13 +683,19 @@ def create_admin_router(db: AsyncIOMotorDatabase) -> APIRouter:
             if not update_data:
                 raise HTTPException(status_code=400, detail="No data to update")
             
-            result = await db.currency_tokens.update_one(
+            previous = await db.currency_tokens.find_one_and_update(
                 {"id": token_id},
-                {"$set": update_data}
+                {"$set": update_data},
+                projection={"_id": 0},
+                return_document=ReturnDocument.BEFORE
             )
             
-            if result.matched_count == 0:
+            if previous is None:
                 raise HTTPException(status_code=404, detail="Token not found")
+            audit_log.record(current_admin["username"], "update", "token", token_id, previous, {**previous, **update_data})
+            
+            # Rebuild the public and partner currency catalog
+            await currency_catalog.invalidate(db)
             
             return APIResponse(
                 success=True,
@@ -398,15 +712,7 @@ def create_admin_router(db: AsyncIOMotorDatabase) -> APIRouter:
     async def get_settings(current_admin = Depends(admin_service.verify_token)):
         """Get system settings"""
         try:
-            settings = await db.exchange_settings.find_one({})
-            if not settings:
-                # Create default settings
-                default_settings = ExchangeSettings()
-                await db.exchange_settings.insert_one(default_settings.dict())
-                settings = default_settings.dict()
-            
-            if "_id" in settings:
-                del settings["_id"]
+            settings = await load_settings()
             
             return APIResponse(
                 success=True,
@@ -431,11 +737,16 @@ def create_admin_router(db: AsyncIOMotorDatabase) -> APIRouter:
             update_data["updated_at"] = datetime.utcnow()
             update_data["updated_by"] = current_admin["username"]
             
-            await db.exchange_settings.update_one(
+            previous = await db.exchange_settings.find_one_and_update(
                 {},
                 {"$set": update_data},
-                upsert=True
+                projection={"_id": 0},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
             )
+            # Take effect on this worker now; others reload on the change stream
+            await settings_service.load(db)
+            audit_log.record(current_admin["username"], "update", "settings", None, previous, {**(previous or {}), **update_data})
             
             return APIResponse(
                 success=True,
@@ -452,51 +763,8 @@ def create_admin_router(db: AsyncIOMotorDatabase) -> APIRouter:
     async def get_statistics(current_admin = Depends(admin_service.verify_token)):
         """Get exchange statistics"""
         try:
-            # Total exchanges
-            total_exchanges = await db.exchanges.count_documents({})
-            
-            # Active partners
-            active_partners = await db.partners.count_documents({"status": "active"})
-            
-            # Today's stats
-            today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-            today_exchanges = await db.exchanges.count_documents({"created_at": {"$gte": today_start}})
-            
-            # Monthly stats
-            month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            monthly_exchanges = await db.exchanges.count_documents({"created_at": {"$gte": month_start}})
-            
-            # Recent exchanges
-            recent_exchanges = await db.exchanges.find({}).sort("created_at", -1).limit(10).to_list(10)
-            for exchange in recent_exchanges:
-                if "_id" in exchange:
-                    del exchange["_id"]
-            
-            # Top currencies (aggregation)
-            top_currencies_pipeline = [
-                {"$group": {
-                    "_id": "$from_currency",
-                    "count": {"$sum": 1},
-                    "total_amount": {"$sum": "$from_amount"}
-                }},
-                {"$sort": {"count": -1}},
-                {"$limit": 5}
-            ]
-            top_currencies = await db.exchanges.aggregate(top_currencies_pipeline).to_list(5)
-            
-            stats = ExchangeStats(
-                total_exchanges=total_exchanges,
-                total_volume_usd=0.0,  # Will need to calculate based on rates
-                total_commission=0.0,
-                total_partner_commission=0.0,
-                active_partners=active_partners,
-                today_exchanges=today_exchanges,
-                today_volume_usd=0.0,
-                monthly_exchanges=monthly_exchanges,
-                monthly_volume_usd=0.0,
-                top_currencies=top_currencies,
-                recent_exchanges=recent_exchanges
-            )
+            # Today's and this month's buckets come back with the totals in one query
+            stats = ExchangeStats(**await stats_engine.read(db))
             
             return APIResponse(
                 success=True,
@@ -507,4 +775,167 @@ def create_admin_router(db: AsyncIOMotorDatabase) -> APIRouter:
             logger.error(f"Get statistics error: {e}")
             raise HTTPException(status_code=500, detail="Failed to get statistics")
     
+    @router.get("/stats/range", response_model=APIResponse)
+    async def get_range_statistics(
+        start: datetime,
+        end: Optional[datetime] = None,
+        current_admin = Depends(admin_service.verify_token)
+    ):
+        """Exchange counts, USD volume and commissions for exchanges created in [start, end)"""
+        # Buckets are keyed in naive UTC like created_at
+        start = start.astimezone(timezone.utc).replace(tzinfo=None) if start.tzinfo else start
+        end = end or datetime.utcnow()
+        end = end.astimezone(timezone.utc).replace(tzinfo=None) if end.tzinfo else end
+        if end <= start:
+            raise HTTPException(status_code=400, detail="end must be after start")
+        
+        try:
+            report = await stats_engine.range_report(db, start, end)
+            return APIResponse(
+                success=True,
+                message="Statistics retrieved successfully",
+                data={"start": start, "end": end, **report}
+            )
+        except Exception as e:
+            logger.error(f"Get range statistics error: {e}")
+            raise HTTPException(status_code=500, detail="Failed to get statistics")
+    
+    @router.get("/dashboard")
+    async def get_dashboard(
+        fields: str = ",".join(DASHBOARD_FIELDS),
+        page_size: int = 20,
+        current_admin = Depends(admin_service.verify_token)
+    ):
+        """Everything the admin panel shows, in one call.
+
+        fields selects a comma-separated subset of stats, partners,
+        exchanges, tokens and settings; the selected queries run concurrently.
+        """
+        selected = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = set(selected) - set(DASHBOARD_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        
+        async def listing(collection, projection):
+            data, next_cursor = await keyset_page(collection, {}, projection, page_size)
+            return {"data": data, "next_cursor": next_cursor}
+        
+        loaders = {
+            "stats": lambda: stats_engine.read(db),
+            "partners": lambda: listing(db.partners, PARTNER_PROJECTION),
+            "exchanges": lambda: listing(db.exchanges, EXCHANGE_PROJECTION),
+            "tokens": lambda: db.currency_tokens.find({}, DOCUMENT_PROJECTION).sort("order_index", 1).to_list(None),
+            "settings": load_settings
+        }
+        try:
+            results = await asyncio.gather(*(loaders[field]() for field in selected))
+            return FastJSONResponse({
+                "success": True,
+                "message": "Dashboard retrieved successfully",
+                "data": dict(zip(selected, results))
+            })
+        except Exception as e:
+            logger.error(f"Get dashboard error: {e}")
+            raise HTTPException(status_code=500, detail="Failed to get dashboard")
+    
+    @router.post("/feed/token", response_model=APIResponse)
+    async def create_feed_token(current_admin = Depends(admin_service.verify_token)):
+        """Short-lived token that only opens /feed"""
+        token = admin_service.create_access_token(
+            {"sub": current_admin["username"], "scope": "feed"},
+            expires_delta=timedelta(seconds=FEED_TOKEN_SECONDS)
+        )
+        return APIResponse(
+            success=True,
+            message="Feed token created",
+            data={"token": token, "expires_in": FEED_TOKEN_SECONDS}
+        )
+    
+    @router.get("/feed")
+    async def admin_event_feed(token: str):
+        """Server-sent exchange, partner and stats deltas.
+
+        EventSource cannot send headers, so the token comes as a query
+        parameter. It is a feed token from POST /feed/token, never the admin
+        access token, so what lands in access logs expires within a minute
+        and cannot call the rest of the API.
+        """
+        await admin_service.authenticate(token, scope="feed")
+        return StreamingResponse(
+            admin_feed.stream(admin_feed.subscribe()),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    @router.get("/audit", response_model=PaginatedResponse)
+    async def get_audit_log(
+        page_size: int = 50,
+        cursor: Optional[str] = None,
+        entity_type: Optional[str] = None,
+        entity_id: Optional[str] = None,
+        actor: Optional[str] = None,
+        action: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        current_admin = Depends(admin_service.verify_token)
+    ):
+        """Admin changes, newest first, with cursor pagination"""
+        try:
+            page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+            query = {}
+            for field, value in (("entity_type", entity_type), ("entity_id", entity_id), ("actor", actor), ("action", action)):
+                if value:
+                    query[field] = value
+            created_at = {}
+            if start:
+                created_at["$gte"] = start
+            if end:
+                created_at["$lt"] = end
+            if created_at:
+                query["created_at"] = created_at
+            
+            entries, next_cursor = await keyset_page(db[AUDIT_COLLECTION], query, DOCUMENT_PROJECTION, page_size, cursor=cursor)
+            return FastJSONResponse(paginated(entries, next_cursor, 1, page_size, None))
+        except InvalidCursorError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        except Exception as e:
+            logger.error(f"Get audit log error: {e}")
+            raise HTTPException(status_code=500, detail="Failed to get audit log")
+    
+    @router.get("/cache/stats", response_model=APIResponse)
+    async def get_cache_stats(current_admin = Depends(admin_service.verify_token)):
+        """Hit ratio and size of the in-process exchange cache"""
+        return APIResponse(
+            success=True,
+            message="Cache statistics retrieved successfully",
+            data={"exchanges": exchange_cache.stats()}
+        )
+    
+    @router.get("/indexes", response_model=APIResponse)
+    async def get_index_report(current_admin = Depends(admin_service.verify_token)):
+        """Report missing, undeclared and unused MongoDB indexes"""
+        try:
+            report = await index_report(db)
+            return APIResponse(
+                success=True,
+                message="Index report retrieved successfully",
+                data=report
+            )
+        except Exception as e:
+            logger.error(f"Index report error: {e}")
+            raise HTTPException(status_code=500, detail="Failed to get index report")
+    
+    @router.get("/diagnostics/loop", response_model=APIResponse)
+    async def get_loop_diagnostics(reset: bool = False, current_admin = Depends(admin_service.verify_token)):
+        """Worst event-loop stalls seen by the watchdog (LOOP_DIAGNOSTICS_ENABLED=true)"""
+        report = loop_watchdog.report()
+        if reset:
+            loop_watchdog.reset()
+        return APIResponse(
+            success=True,
+            message="Loop diagnostics retrieved successfully",
+            data=report
+        )
+    
     return router
\ No newline at end of file
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import PyMongoError
+
+from fast_json import dumps
+from stats_engine import stats_engine
+
+logger = logging.getLogger(__name__)
+
+WATCHED_COLLECTIONS = {"exchanges": "exchange", "partners": "partner"}
+# Never sent to the browser
+HIDDEN_FIELDS = {"_id", "api_key_hash", "api_secret", "search_terms", "monitor_shard", "usd", "write_ids"}
+HEARTBEAT_SECONDS = 15
+# Stats pushes are coalesced to at most one per interval
+STATS_PUSH_SECONDS = 2.0
+
+
+def compact(fields: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in fields.items() if k.split(".")[0] not in HIDDEN_FIELDS}
+
+
+class AdminSubscriber:
+    """One SSE connection; if it falls behind, it is told to reload instead of buffering"""
+
+    def __init__(self, max_pending: int = 1000):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+
+    def offer(self, event: Dict[str, Any]):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+
+
+class AdminFeed:
+    """Change-stream consumer pushing exchange and partner deltas to admins.
+
+    One change stream per worker watches both collections and fans each
+    change out to that worker's SSE subscribers as {op, id, data}. Inserts
+    carry the document, updates only the changed fields. After changes, the
+    materialized stats are re-read once per STATS_PUSH_SECONDS and pushed
+    too. Change streams need a replica set (a single node is enough);
+    without one the feed retries every minute and tells subscribers with a
+    {"type": "status", "live": false} event so they can poll instead.
+    """
+
+    def __init__(self):
+        self.subscribers: Set[AdminSubscriber] = set()
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self._resume_token = None
+        self._stats_dirty = False
+        # Whether a change stream is currently open
+        self.live = False
+        # Deletes only carry _id; remember which business id it belonged to
+        self._ids: "OrderedDict[Any, str]" = OrderedDict()
+        self._tasks = []
+
+    def subscribe(self) -> AdminSubscriber:
+        subscriber = AdminSubscriber()
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: AdminSubscriber):
+        self.subscribers.discard(subscriber)
+
+    def broadcast(self, event: Dict[str, Any]):
+        for subscriber in self.subscribers:
+            subscriber.offer(event)
+
+    def _set_live(self, live: bool):
+        if live != self.live:
+            self.live = live
+            self.broadcast({"type": "status", "live": live})
+
+    def _remember(self, object_id: Any, doc_id: Optional[str]):
+        if doc_id is None:
+            return
+        self._ids[object_id] = doc_id
+        self._ids.move_to_end(object_id)
+        while len(self._ids) > 10000:
+            self._ids.popitem(last=False)
+
+    def to_event(self, change: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        entity = WATCHED_COLLECTIONS.get(change["ns"]["coll"])
+        operation = change["operationType"]
+        object_id = change["documentKey"]["_id"]
+        document = change.get("fullDocument") or {}
+        self._remember(object_id, document.get("id"))
+
+        if operation in ("insert", "replace"):
+            data = compact(document)
+        elif operation == "update":
+            data = compact(change["updateDescription"]["updatedFields"])
+            if not data:
+                return None
+        elif operation == "delete":
+            data = None
+        else:
+            return None
+        return {"type": entity, "op": operation, "id": self._ids.get(object_id), "data": data}
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        if self._tasks:
+            return
+        self.db = db
+        self._tasks = [asyncio.create_task(self._watch()), asyncio.create_task(self._push_stats())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def _watch(self):
+        pipeline = [{"$match": {"ns.coll": {"$in": list(WATCHED_COLLECTIONS)}}}]
+        while True:
+            try:
+                async with self.db.watch(pipeline, full_document="updateLookup",
+                                         resume_after=self._resume_token) as stream:
+                    self._set_live(True)
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        event = self.to_event(change)
+                        if event:
+                            self._stats_dirty = True
+                            self.broadcast(event)
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.warning(f"Admin feed change stream unavailable, retrying in 60s: {e}")
+                self._set_live(False)
+                self._resume_token = None
+                await asyncio.sleep(60)
+            except Exception as e:
+                logger.error(f"Admin feed failed: {e}")
+                self._set_live(False)
+                await asyncio.sleep(5)
+
+    async def _push_stats(self):
+        while True:
+            await asyncio.sleep(STATS_PUSH_SECONDS)
+            if not self._stats_dirty or not self.subscribers:
+                continue
+            self._stats_dirty = False
+            try:
+                self.broadcast({"type": "stats", "data": await stats_engine.read(self.db)})
+            except Exception as e:
+                logger.error(f"Admin feed stats push failed: {e}")
+
+    async def stream(self, subscriber: AdminSubscriber) -> AsyncIterator[bytes]:
+        """Server-sent events for one subscriber; unsubscribes when the client goes away"""
+        try:
+            yield b"retry: 3000\n\n"
+            yield b"event: status\ndata: " + dumps({"type": "status", "live": self.live}) + b"\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                yield b"event: " + event["type"].encode() + b"\ndata: " + dumps(event) + b"\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+# Global instance
+admin_feed = AdminFeed()
@@ -36,6 +36,7 @@ class Partner(BaseModel):
     payout_address: Optional[str] = None
     payout_currency: Optional[str] = None
     min_payout: float = 50.0
+    rate_limit_per_minute: Optional[int] = None  # None uses the settings default
 
 class PartnerCreate(BaseModel):
     name: str
@@ -55,6 +56,7 @@ class PartnerUpdate(BaseModel):
     payout_address: Optional[str] = None
     payout_currency: Optional[str] = None
     min_payout: Optional[float] = None
+    rate_limit_per_minute: Optional[int] = None  # 0 reverts to the settings default
 
 # Enhanced Exchange Model for Admin
 class ExchangeAdmin(BaseModel):
@@ -154,6 +156,7 @@ class ExchangeSettings(BaseModel):
     
     # Partner settings
     default_partner_commission: float = 30.0  # %
+    default_partner_rate_limit: int = 600  # partner API requests per minute
     
     # System settings
     auto_processing: bool = False
@@ -170,6 +173,7 @@ class SettingsUpdate(BaseModel):
     default_floating_fee: Optional[float] = None
     default_fixed_fee: Optional[float] = None
     default_partner_commission: Optional[float] = None
+    default_partner_rate_limit: Optional[int] = None
     auto_processing: Optional[bool] = None
     email_notifications: Optional[bool] = None
     telegram_notifications: Optional[bool] = None
@@ -188,6 +192,12 @@ class ExchangeStats(BaseModel):
     top_currencies: List[Dict[str, Any]]
     recent_exchanges: List[Dict[str, Any]]
 
+class ExchangeBulkUpdateItem(ExchangeUpdate):
+    id: str
+
+class ExchangeBulkUpdate(BaseModel):
+    updates: List[ExchangeBulkUpdateItem]
+
 # API Response Models
 class APIResponse(BaseModel):
     success: bool
@@ -198,7 +208,8 @@ class APIResponse(BaseModel):
 class PaginatedResponse(BaseModel):
     success: bool
     data: List[Any]
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
-    total_pages: int
\ No newline at end of file
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
\ No newline at end of file
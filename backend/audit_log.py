@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import os
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "admin_audit_log"
+# Never copied into audit entries
+REDACTED_FIELDS = {"_id", "api_key", "api_key_hash", "api_secret", "password_hash", "search_terms", "version", "monitor_shard", "write_ids"}
+
+
+def diff(before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Changed top-level fields as {field: {"from": old, "to": new}}"""
+    before, after = before or {}, after or {}
+    changes = {}
+    for field in set(before) | set(after):
+        if field in REDACTED_FIELDS:
+            continue
+        if before.get(field) != after.get(field):
+            changes[field] = {"from": before.get(field), "to": after.get(field)}
+    return changes
+
+
+class AuditLog:
+    """Append-only record of admin mutations.
+
+    record() only appends to an in-memory queue; a background task writes
+    queued entries with one insert_many per flush_interval (or sooner once
+    batch_size entries are waiting), so admin writes never wait on the
+    audit collection. At most max_queue entries are held while Mongo is
+    unreachable; beyond that the oldest are dropped and logged.
+
+    Entries use their id as _id, so re-sending an entry that was already
+    written hits a duplicate key and counts as written; a partly failed
+    batch only re-queues the entries that were not stored.
+    """
+
+    def __init__(self, flush_interval: float = 1.0, batch_size: int = 500, max_queue: int = 50000):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.dropped = 0
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, actor: str, action: str, entity_type: str, entity_id: Optional[str],
+               before: Optional[Dict[str, Any]] = None, after: Optional[Dict[str, Any]] = None):
+        changes = diff(before, after)
+        if action == "update" and not changes:
+            return
+        if len(self._queue) >= self.max_queue:
+            self._queue.popleft()
+            self.dropped += 1
+            logger.error(f"Audit queue full, dropped {self.dropped} entries so far")
+        entry_id = str(uuid.uuid4())
+        self._queue.append({
+            "_id": entry_id,
+            "id": entry_id,
+            "created_at": datetime.utcnow(),
+            "actor": actor,
+            "action": action,
+            "entity_type": entity_type,
+            "entity_id": entity_id,
+            "changes": changes
+        })
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self):
+        while self._queue and self.db is not None:
+            batch: List[Dict[str, Any]] = []
+            while self._queue and len(batch) < self.batch_size:
+                batch.append(self._queue.popleft())
+            try:
+                await self.db[COLLECTION].insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                failed = [
+                    batch[error["index"]]
+                    for error in e.details.get("writeErrors", [])
+                    if error.get("code") != 11000
+                ]
+                if failed:
+                    self._queue.extendleft(reversed(failed))
+                    logger.error(f"Audit log flush failed for {len(failed)} entries: {e}")
+                    return
+            except Exception as e:
+                # Put the batch back and retry on the next tick
+                self._queue.extendleft(reversed(batch))
+                logger.error(f"Audit log flush failed: {e}")
+                return
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        if self._task:
+            return
+        self.db = db
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+
+# Global instance
+audit_log = AuditLog(flush_interval=float(os.getenv("AUDIT_FLUSH_SECONDS", "1")))
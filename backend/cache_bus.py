@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "cache_invalidations"
+# Capped size of the invalidation log; old messages are overwritten
+COLLECTION_BYTES = 4 * 1024 * 1024
+# Re-read on reconnect; covers clock skew between publishing workers
+RESUME_OVERLAP = timedelta(seconds=10)
+# Message ids remembered to skip the re-read overlap
+SEEN_MESSAGES = 10000
+
+
+class CacheBus:
+    """Cross-worker cache invalidation over a capped Mongo collection.
+
+    Publishers insert small {channel, key} messages; every worker tails the
+    collection with an awaitable cursor and runs the local handlers for
+    messages that came from other workers. The publishing worker updates its
+    own state directly.
+
+    After a reconnect the tail resumes RESUME_OVERLAP before the last
+    message it saw, in natural (insertion) order, and skips messages it has
+    already handled; ObjectIds from different processes are not ordered, so
+    they cannot mark the resume point.
+    """
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self.handlers: Dict[str, List[Callable[[str], None]]] = {}
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_seen: Optional[datetime] = None
+        self._seen: "OrderedDict[Any, None]" = OrderedDict()
+
+    def subscribe(self, channel: str, handler: Callable[[str], None]):
+        self.handlers.setdefault(channel, []).append(handler)
+
+    def _dispatch(self, channel: str, key: str):
+        for handler in self.handlers.get(channel, []):
+            try:
+                handler(key)
+            except Exception as e:
+                logger.error(f"Cache bus handler for {channel} failed: {e}")
+
+    async def publish(self, channel: str, key: str):
+        """Broadcast an invalidated key to the other workers"""
+        if self.db is None:
+            return
+        try:
+            await self.db[COLLECTION].insert_one({
+                "channel": channel,
+                "key": key,
+                "origin": self.origin,
+                "created_at": datetime.utcnow()
+            })
+        except Exception as e:
+            # Remote entries still expire through their TTL
+            logger.error(f"Cache bus publish failed: {e}")
+
+    async def publish_many(self, channel: str, keys: List[str]):
+        """Broadcast several invalidated keys in one insert"""
+        if self.db is None or not keys:
+            return
+        now = datetime.utcnow()
+        try:
+            await self.db[COLLECTION].insert_many([
+                {"channel": channel, "key": key, "origin": self.origin, "created_at": now}
+                for key in keys
+            ], ordered=False)
+        except Exception as e:
+            logger.error(f"Cache bus publish failed: {e}")
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        if self._task:
+            return
+        self.db = db
+        try:
+            await db.create_collection(COLLECTION, capped=True, size=COLLECTION_BYTES)
+        except CollectionInvalid:
+            pass
+        self._task = asyncio.create_task(self._tail())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def _handle(self, message: Dict[str, Any]):
+        if message["_id"] in self._seen:
+            return
+        self._seen[message["_id"]] = None
+        while len(self._seen) > SEEN_MESSAGES:
+            self._seen.popitem(last=False)
+        created_at = message.get("created_at")
+        if created_at and (self._last_seen is None or created_at > self._last_seen):
+            self._last_seen = created_at
+        if message.get("origin") != self.origin and message.get("channel"):
+            self._dispatch(message["channel"], message["key"])
+
+    async def _tail(self):
+        while True:
+            try:
+                # A tailable cursor dies at once when nothing matches; the marker always does
+                now = datetime.utcnow()
+                await self.db[COLLECTION].insert_one({"channel": None, "origin": self.origin, "created_at": now})
+                since = (self._last_seen or now) - RESUME_OVERLAP
+                cursor = self.db[COLLECTION].find(
+                    {"created_at": {"$gte": since}},
+                    cursor_type=CursorType.TAILABLE_AWAIT
+                )
+                while cursor.alive:
+                    async for message in cursor:
+                        self._handle(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cache bus tail failed: {e}")
+            await asyncio.sleep(1)
+
+
+# Global instance
+cache_bus = CacheBus()
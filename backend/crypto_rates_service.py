@@ -5,6 +5,7 @@ from typing import Dict, Optional
 from datetime import datetime, timedelta
 from kucoin.client import Client
 import time
+from metrics import cache_requests, record_upstream
 
 logger = logging.getLogger(__name__)
 
@@ -60,6 +61,26 @@ class KuCoinRatesService:
             import traceback
             logger.error(f"Full traceback: {traceback.format_exc()}")
     
+    async def _call_kucoin(self, method, *args):
+        """Run a blocking KuCoin client call in the executor and time it"""
+        started = time.perf_counter()
+        try:
+            result = await asyncio.get_event_loop().run_in_executor(None, method, *args)
+        except Exception:
+            record_upstream("kucoin", started, failed=True)
+            raise
+        record_upstream("kucoin", started)
+        return result
+    
+    def _cached(self, cache_key: str, current_time: float):
+        """Return a fresh cached value (or None) and count the lookup"""
+        if (cache_key in self.cache and 
+            current_time - self.last_update.get(cache_key, 0) < self.cache_duration):
+            cache_requests.inc("rates", "hit")
+            return self.cache[cache_key]
+        cache_requests.inc("rates", "miss")
+        return None
+    
     async def get_price(self, from_currency: str, to_currency: str) -> Optional[float]:
         """Get price for currency pair from KuCoin"""
         try:
@@ -108,9 +129,9 @@ class KuCoinRatesService:
             cache_key = f"{from_symbol}_{to_symbol}"
             current_time = time.time()
             
-            if (cache_key in self.cache and 
-                current_time - self.last_update.get(cache_key, 0) < self.cache_duration):
-                return self.cache[cache_key]
+            cached = self._cached(cache_key, current_time)
+            if cached is not None:
+                return cached
             
             # Get prices from KuCoin
             from_price = await self._get_ticker_price(from_symbol)
@@ -133,6 +154,16 @@ class KuCoinRatesService:
             logger.error(f"Error getting price from KuCoin: {e}")
             return None
     
+    async def get_usd_price(self, currency: str) -> Optional[float]:
+        """USD price of one unit of currency (USDT pairs are treated as USD)"""
+        currency = currency.upper()
+        if currency in ['USDT-ERC20', 'USDT-TRX']:
+            return 1.0
+        symbol = self.currency_mapping.get(currency)
+        if not self.client or not symbol:
+            return None
+        return await self._get_ticker_price(symbol)
+    
     async def _get_ticker_price(self, symbol: str) -> Optional[float]:
         """Get ticker price for a symbol"""
         try:
@@ -140,14 +171,12 @@ class KuCoinRatesService:
             cache_key = f"price_{symbol}"
             current_time = time.time()
             
-            if (cache_key in self.cache and 
-                current_time - self.last_update.get(cache_key, 0) < self.cache_duration):
-                return self.cache[cache_key]
+            cached = self._cached(cache_key, current_time)
+            if cached is not None:
+                return cached
             
             # Use sync client in async context with proper handling
-            ticker = await asyncio.get_event_loop().run_in_executor(
-                None, self.client.get_ticker, symbol
-            )
+            ticker = await self._call_kucoin(self.client.get_ticker, symbol)
             
             if ticker and 'price' in ticker:
                 price = float(ticker['price'])
@@ -171,18 +200,16 @@ class KuCoinRatesService:
             current_time = time.time()
             
             # Check cache first
-            if (cache_key in self.cache and 
-                current_time - self.last_update.get(cache_key, 0) < self.cache_duration):
-                return self.cache[cache_key]
+            cached = self._cached(cache_key, current_time)
+            if cached is not None:
+                return cached
             
             if not self.client:
                 logger.warning("KuCoin client not initialized")
                 return None
             
             # Get all ticker prices
-            all_tickers = await asyncio.get_event_loop().run_in_executor(
-                None, self.client.get_all_tickers
-            )
+            all_tickers = await self._call_kucoin(self.client.get_all_tickers)
             
             if not all_tickers or 'ticker' not in all_tickers:
                 logger.error("No ticker data received from KuCoin")
@@ -234,9 +261,7 @@ class KuCoinRatesService:
                 return False
                 
             # Try to get server time
-            server_time = await asyncio.get_event_loop().run_in_executor(
-                None, self.client.get_server_timestamp
-            )
+            server_time = await self._call_kucoin(self.client.get_server_timestamp)
             
             if server_time:
                 logger.info("KuCoin API connection test successful")
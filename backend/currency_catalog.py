@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from starlette.requests import Request
+from starlette.responses import Response
+
+from fast_json import dumps, DOCUMENT_PROJECTION
+
+logger = logging.getLogger(__name__)
+
+# Served when currency_tokens has not been initialised yet (see init_admin.py)
+SUPPORTED_CURRENCIES = [
+    {
+        "currency": "BTC",
+        "name": "Bitcoin",
+        "networks": [{"chain": "BTC", "name": "Bitcoin Network"}]
+    },
+    {
+        "currency": "ETH",
+        "name": "Ethereum",
+        "networks": [{"chain": "ETH", "name": "Ethereum Network"}]
+    },
+    {
+        "currency": "XMR",
+        "name": "Monero",
+        "networks": [{"chain": "XMR", "name": "Monero Network"}]
+    },
+    {
+        "currency": "LTC",
+        "name": "Litecoin",
+        "networks": [{"chain": "LTC", "name": "Litecoin Network"}]
+    },
+    {
+        "currency": "XRP",
+        "name": "Ripple",
+        "networks": [{"chain": "XRP", "name": "Ripple Network"}]
+    },
+    {
+        "currency": "DOGE",
+        "name": "Dogecoin",
+        "networks": [{"chain": "DOGE", "name": "Dogecoin Network"}]
+    },
+    {
+        "currency": "USDT-ERC20",
+        "name": "Tether USD (ERC20)",
+        "networks": [{"chain": "ETH", "name": "Ethereum Network"}]
+    },
+    {
+        "currency": "USDC-ERC20",
+        "name": "USD Coin (ERC20)",
+        "networks": [{"chain": "ETH", "name": "Ethereum Network"}]
+    },
+    {
+        "currency": "USDT-TRX",
+        "name": "Tether USD (TRX)",
+        "networks": [{"chain": "TRX", "name": "Tron Network"}]
+    },
+    {
+        "currency": "TRX",
+        "name": "Tron",
+        "networks": [{"chain": "TRX", "name": "Tron Network"}]
+    }
+]
+
+# Catalog version marker bumped by token edits so every worker rebuilds
+VERSION_ID = "currency_catalog"
+
+
+def public_currency(token: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a currency token like the public /api/currencies entries"""
+    return {
+        "currency": token["currency"],
+        "name": token["name"],
+        "symbol": token.get("symbol"),
+        "networks": [{"chain": token["chain"], "name": token["network"]}],
+        "contract_address": token.get("contract_address"),
+        "decimals": token.get("decimals"),
+        "icon_url": token.get("icon_url"),
+        "min_amount": token.get("min_amount"),
+        "max_amount": token.get("max_amount")
+    }
+
+
+class CurrencyCatalog:
+    """Active and visible currency tokens, pre-serialized once per change.
+
+    Both the public widget and the partner API are served from the same
+    cached bytes. Token edits bump a version document; each worker checks it
+    at most every version_check_interval seconds and only rebuilds when it
+    moved.
+    """
+
+    def __init__(self, version_check_interval: float = 10.0):
+        self.version_check_interval = version_check_interval
+        self.version: Optional[datetime] = None
+        self.etag: Optional[str] = None
+        self.public_body: bytes = b""
+        self.partner_data: bytes = b"[]"
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _current_version(self, db: AsyncIOMotorDatabase) -> Optional[datetime]:
+        marker = await db.cache_versions.find_one({"_id": VERSION_ID})
+        return marker["updated_at"] if marker else None
+
+    async def rebuild(self, db: AsyncIOMotorDatabase, version: Optional[datetime] = None):
+        tokens = await db.currency_tokens.find(
+            {"is_active": True, "is_visible": True}, DOCUMENT_PROJECTION
+        ).sort("order_index", 1).to_list(None)
+
+        public = [public_currency(token) for token in tokens] if tokens else SUPPORTED_CURRENCIES
+        self.public_body = dumps({"code": "200000", "message": "Success", "data": public})
+        self.partner_data = dumps(tokens)
+        self.etag = '"' + hashlib.sha1(self.public_body + self.partner_data).hexdigest() + '"'
+        self.version = version
+        logger.info(f"Currency catalog rebuilt with {len(tokens)} tokens")
+
+    async def refresh(self, db: AsyncIOMotorDatabase):
+        """Rebuild when never built or when another worker bumped the version"""
+        now = time.monotonic()
+        if self.etag is not None and now - self._checked_at < self.version_check_interval:
+            return
+        async with self._lock:
+            if self.etag is not None and now - self._checked_at < self.version_check_interval:
+                return
+            version = await self._current_version(db)
+            if self.etag is None or version != self.version:
+                await self.rebuild(db, version)
+            self._checked_at = time.monotonic()
+
+    async def invalidate(self, db: AsyncIOMotorDatabase):
+        """Called after a token edit: bump the shared version and rebuild here"""
+        version = datetime.utcnow()
+        await db.cache_versions.update_one(
+            {"_id": VERSION_ID}, {"$set": {"updated_at": version}}, upsert=True
+        )
+        async with self._lock:
+            await self.rebuild(db, version)
+            self._checked_at = time.monotonic()
+
+    def _respond(self, request: Request, body: bytes, headers: Dict[str, str]) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache", **headers}
+        if request.headers.get("if-none-match") == self.etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    async def public_response(self, db: AsyncIOMotorDatabase, request: Request) -> Response:
+        await self.refresh(db)
+        return self._respond(request, self.public_body, {})
+
+    async def partner_response(self, db: AsyncIOMotorDatabase, request: Request, partner_id: str) -> Response:
+        await self.refresh(db)
+        body = b'{"success":true,"data":' + self.partner_data + b',"partner_id":' + dumps(partner_id) + b'}'
+        return self._respond(request, body, {"Vary": "X-API-Key"})
+
+
+# Global instance
+currency_catalog = CurrencyCatalog()
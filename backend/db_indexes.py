@@ -0,0 +1,144 @@
+import logging
+from typing import Any, Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Indexes required by the hot query paths, per collection
+REQUIRED_INDEXES: Dict[str, List[IndexModel]] = {
+    "exchanges": [
+        # GET /api/exchange/{id}, status endpoint, admin get/update
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Admin keyset pagination (newest first, id breaks ties) and stats
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id_desc"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="status_created_at_id"),
+        IndexModel([("partner_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="partner_created_at_id"),
+        # A deposit transaction is credited to at most one exchange
+        IndexModel([("deposit_hash", ASCENDING)], name="deposit_hash_unique", unique=True,
+                   partialFilterExpression={"deposit_hash": {"$type": "string"}}),
+        # Deposit monitor shard scans
+        IndexModel([("monitor_shard", ASCENDING), ("status", ASCENDING)], name="monitor_shard_status"),
+    ],
+    "partners": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Partner API key authentication (cache misses only); partners whose
+        # plaintext key is not hashed yet are left out of the unique index
+        IndexModel([("api_key_hash", ASCENDING)], name="api_key_hash_unique", unique=True,
+                   partialFilterExpression={"api_key_hash": {"$type": "string"}}),
+        IndexModel([("email", ASCENDING)], name="email"),
+        # Crediting exchanges created from a ?ref= link
+        IndexModel([("referral_code", ASCENDING)], name="referral_code"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id_desc"),
+        # Admin partner search on word prefixes (see partner_search.py)
+        IndexModel([("search_terms", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="search_terms_created_at_id"),
+    ],
+    "admin_users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    ],
+    "currency_tokens": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("order_index", ASCENDING)], name="order_index"),
+    ],
+    "admin_audit_log": [
+        # Append-only; queried newest first by entity, actor or time
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id_desc"),
+        IndexModel([("entity_type", ASCENDING), ("entity_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="entity_created_at_id"),
+        IndexModel([("actor", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="actor_created_at_id"),
+    ],
+    "partner_usage": [
+        # One counter per partner, minute, endpoint, pair and status; $inc upserts match on it
+        IndexModel([("partner_id", ASCENDING), ("minute", ASCENDING), ("endpoint", ASCENDING), ("pair", ASCENDING), ("status", ASCENDING)],
+                   name="bucket_unique", unique=True),
+        # Per-minute usage is kept for 90 days
+        IndexModel([("minute", ASCENDING)], name="minute_ttl", expireAfterSeconds=90 * 86400),
+    ],
+    "idempotency_keys": [
+        # Keys can be replayed for a day
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=86400),
+    ],
+    "monitor_workers": [
+        # Dead workers disappear an hour after their last heartbeat
+        IndexModel([("heartbeat_at", ASCENDING)], name="heartbeat_ttl", expireAfterSeconds=3600),
+    ],
+}
+
+
+# Indexes replaced by a wider definition above
+SUPERSEDED_INDEXES: Dict[str, List[str]] = {
+    "exchanges": ["created_at_desc", "status_created_at", "partner_created_at"],
+    "partners": ["api_key_status"],
+}
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> Dict[str, List[str]]:
+    """Create every required index; returns the names that could not be created.
+
+    create_index is a no-op when an identical index already exists, so this is
+    safe to run on every startup. Superseded indexes are dropped once all of
+    a collection's replacements exist.
+    """
+    failed: Dict[str, List[str]] = {}
+    for collection, indexes in REQUIRED_INDEXES.items():
+        for index in indexes:
+            name = index.document["name"]
+            try:
+                await db[collection].create_indexes([index])
+            except OperationFailure as e:
+                # Usually duplicate data under a unique index or a conflicting definition
+                logger.error(f"Could not create index {collection}.{name}: {e}")
+                failed.setdefault(collection, []).append(name)
+
+    for collection, names in SUPERSEDED_INDEXES.items():
+        if collection in failed:
+            continue
+        existing = {index["name"] async for index in db[collection].list_indexes()}
+        for name in names:
+            if name in existing:
+                await db[collection].drop_index(name)
+                logger.info(f"Dropped superseded index {collection}.{name}")
+    return failed
+
+
+async def index_report(db: AsyncIOMotorDatabase) -> Dict[str, Dict[str, Any]]:
+    """Compare the declared indexes with what exists and how often each is used"""
+    report: Dict[str, Dict[str, Any]] = {}
+    for collection, indexes in REQUIRED_INDEXES.items():
+        declared = {index.document["name"] for index in indexes}
+        existing = set()
+        async for index in db[collection].list_indexes():
+            existing.add(index["name"])
+
+        usage: Dict[str, int] = {}
+        try:
+            async for stats in db[collection].aggregate([{"$indexStats": {}}]):
+                usage[stats["name"]] = stats["accesses"]["ops"]
+        except OperationFailure:
+            # $indexStats needs the clusterMonitor role on some deployments
+            pass
+
+        report[collection] = {
+            "missing": sorted(declared - existing),
+            "undeclared": sorted(existing - declared - {"_id_"}),
+            "unused": sorted(name for name, ops in usage.items() if ops == 0 and name != "_id_"),
+            "usage": usage
+        }
+    return report
+
+
+async def provision_indexes(db: AsyncIOMotorDatabase):
+    """Create the required indexes and log anything missing or unused"""
+    try:
+        await ensure_indexes(db)
+        report = await index_report(db)
+    except Exception as e:
+        logger.error(f"Index provisioning failed: {e}")
+        return
+
+    for collection, result in report.items():
+        if result["missing"]:
+            logger.warning(f"Missing indexes on {collection}: {', '.join(result['missing'])}")
+        if result["unused"]:
+            logger.info(f"Unused indexes on {collection}: {', '.join(result['unused'])}")
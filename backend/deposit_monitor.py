@@ -0,0 +1,437 @@
+import asyncio
+import heapq
+import logging
+import math
+import os
+import socket
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from exchange_cache import notify_exchange_changed
+from stats_engine import stats_engine
+
+logger = logging.getLogger(__name__)
+
+# Exchanges in these states still need explorer checks
+MONITORED_STATUSES = ["waiting", "received"]
+
+# Currency -> chain used for sharding. XMR is left out on purpose: it needs a
+# private wallet integration and has no public explorer to poll.
+CURRENCY_CHAINS = {
+    'BTC': 'BTC',
+    'ETH': 'ETH',
+    'LTC': 'LTC',
+    'XRP': 'XRP',
+    'DOGE': 'DOGE',
+    'USDT-ERC20': 'ETH',
+    'USDC-ERC20': 'ETH',
+    'USDT-TRX': 'TRX',
+    'TRX': 'TRX'
+}
+
+MONITOR_CHAINS = sorted(set(CURRENCY_CHAINS.values()))
+MONITOR_BUCKETS = int(os.getenv("MONITOR_BUCKETS", "16"))
+
+# Average block interval per chain in seconds
+CHAIN_BLOCK_SECONDS = {
+    'BTC': 600,
+    'ETH': 12,
+    'LTC': 150,
+    'DOGE': 60,
+    'XRP': 4,
+    'TRX': 3
+}
+
+MIN_POLL_SECONDS = 5
+MAX_POLL_SECONDS = 900
+# Waiting exchanges older than this are no longer polled
+EXCHANGE_EXPIRY = timedelta(hours=int(os.getenv("EXCHANGE_EXPIRY_HOURS", "24")))
+# A detection within this window keeps the address on the fast path
+RECENT_ACTIVITY = timedelta(minutes=10)
+# Relative difference allowed between a deposit and the exchange's from_amount
+AMOUNT_TOLERANCE = float(os.getenv("DEPOSIT_AMOUNT_TOLERANCE", "0.001"))
+
+
+def shard_for(currency: str, address: Optional[str], buckets: int = MONITOR_BUCKETS) -> Optional[str]:
+    """Return the shard id ("CHAIN:bucket") that owns a deposit address"""
+    chain = CURRENCY_CHAINS.get((currency or "").upper())
+    if not chain or not address:
+        return None
+    bucket = zlib.crc32(address.encode('utf-8')) % buckets
+    return f"{chain}:{bucket}"
+
+
+def tx_time(result: Dict[str, Any]) -> Optional[datetime]:
+    """Explorer transaction time as naive UTC, like created_at; None if unknown"""
+    timestamp = result.get("timestamp")
+    if not timestamp:
+        return None
+    try:
+        value = datetime.fromisoformat(str(timestamp).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if value.tzinfo:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def can_claim(exchange: Dict[str, Any], result: Dict[str, Any]) -> bool:
+    """Whether a detected transaction can be the deposit for this exchange.
+
+    Deposit addresses are shared, so the explorer reports the newest
+    transaction the address ever received; it only belongs to an exchange
+    created before it and must carry that exchange's amount. Transactions
+    without a chain time cannot be placed and are never claimed.
+    """
+    sent_at = tx_time(result)
+    if sent_at is None or sent_at < exchange["created_at"]:
+        return False
+    amount = result.get("amount") or 0.0
+    expected = exchange["from_amount"]
+    return abs(amount - expected) <= expected * AMOUNT_TOLERANCE
+
+
+def poll_delay(chain: str, group: List[Dict[str, Any]], now: datetime,
+               last_activity: Optional[datetime] = None) -> float:
+    """Seconds until an address should be checked again.
+
+    Addresses with a detected deposit are checked once per block while
+    confirmations accrue. Waiting addresses start at half a block and back off
+    as the youngest exchange on them ages, since most deposits arrive within
+    minutes of the exchange being created. Polling never runs past expiry.
+    """
+    block = CHAIN_BLOCK_SECONDS.get(chain, 60)
+    recent = last_activity is not None and now - last_activity < RECENT_ACTIVITY
+
+    if recent or any(exchange["status"] == "received" for exchange in group):
+        delay = block
+    else:
+        youngest = max(exchange["created_at"] for exchange in group)
+        age = (now - youngest).total_seconds()
+        # One extra half-block of delay per 10 minutes of age
+        delay = (block / 2) * (1 + age / 600)
+        remaining = (youngest + EXCHANGE_EXPIRY - now).total_seconds()
+        delay = min(delay, max(remaining, MIN_POLL_SECONDS))
+
+    return min(max(delay, MIN_POLL_SECONDS), MAX_POLL_SECONDS)
+
+
+def failure_delay(failures: int) -> float:
+    """Exponential backoff after consecutive failed scans of an address"""
+    return min(MIN_POLL_SECONDS * 2 ** (failures - 1), MAX_POLL_SECONDS)
+
+
+class ShardLeaseManager:
+    """Renewable shard leases stored in the monitor_leases collection.
+
+    Every worker heartbeats into monitor_workers and aims to hold an equal
+    share of the shards. A lease that is not renewed before it expires can be
+    taken over by any other live worker, which is how a dead worker fails over.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, worker_id: str, chains: List[str],
+                 buckets: int, lease_seconds: int = 30):
+        self.db = db
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.shards = [f"{chain}:{bucket}" for chain in chains for bucket in range(buckets)]
+        self.owned: Set[str] = set()
+
+    async def heartbeat(self):
+        await self.db.monitor_workers.update_one(
+            {"_id": self.worker_id},
+            {"$set": {"heartbeat_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    async def live_workers(self) -> int:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        return await self.db.monitor_workers.count_documents({"heartbeat_at": {"$gte": cutoff}})
+
+    async def _try_acquire(self, shard_id: str) -> bool:
+        now = datetime.utcnow()
+        chain, bucket = shard_id.split(":")
+        try:
+            lease = await self.db.monitor_leases.find_one_and_update(
+                {"_id": shard_id, "$or": [{"owner": self.worker_id}, {"expires_at": {"$lt": now}}]},
+                {"$set": {
+                    "owner": self.worker_id,
+                    "chain": chain,
+                    "bucket": int(bucket),
+                    "expires_at": now + timedelta(seconds=self.lease_seconds)
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Somebody else holds a live lease on this shard
+            return False
+        return lease is not None and lease.get("owner") == self.worker_id
+
+    async def release(self, shard_id: str):
+        await self.db.monitor_leases.update_one(
+            {"_id": shard_id, "owner": self.worker_id},
+            {"$set": {"expires_at": datetime.utcfromtimestamp(0)}}
+        )
+        self.owned.discard(shard_id)
+
+    async def release_all(self):
+        for shard_id in list(self.owned):
+            await self.release(shard_id)
+        await self.db.monitor_workers.delete_one({"_id": self.worker_id})
+
+    async def rebalance(self) -> Set[str]:
+        """Renew held leases, shed extras and pick up free shards up to our fair share"""
+        await self.heartbeat()
+        workers = max(1, await self.live_workers())
+        target = math.ceil(len(self.shards) / workers)
+
+        # Renew what we already hold
+        renewed = set()
+        for shard_id in sorted(self.owned):
+            if await self._try_acquire(shard_id):
+                renewed.add(shard_id)
+        self.owned = renewed
+
+        # Give shards back when new workers joined
+        for shard_id in sorted(self.owned)[target:]:
+            await self.release(shard_id)
+
+        if len(self.owned) < target:
+            now = datetime.utcnow()
+            taken = {
+                lease["_id"] async for lease in self.db.monitor_leases.find(
+                    {"expires_at": {"$gte": now}, "owner": {"$ne": self.worker_id}}, {"_id": 1}
+                )
+            }
+            # Start at a worker-specific offset so workers don't race for the same shards
+            offset = zlib.crc32(self.worker_id.encode('utf-8')) % len(self.shards)
+            candidates = self.shards[offset:] + self.shards[:offset]
+            for shard_id in candidates:
+                if len(self.owned) >= target:
+                    break
+                if shard_id in self.owned or shard_id in taken:
+                    continue
+                if await self._try_acquire(shard_id):
+                    self.owned.add(shard_id)
+
+        return set(self.owned)
+
+
+class DepositMonitor:
+    """Background deposit scanner that only checks the shards this worker leases.
+
+    Watched addresses live in a min-heap ordered by their next check time, so
+    each tick only pops the addresses that are due.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, explorer, required_confirmations: Callable[[str], int]):
+        self.db = db
+        self.explorer = explorer
+        self.required_confirmations = required_confirmations
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.scan_interval = float(os.getenv("MONITOR_SCAN_INTERVAL", "15"))
+        self.tick = float(os.getenv("MONITOR_TICK_SECONDS", "1"))
+        self.concurrency = int(os.getenv("MONITOR_CONCURRENCY", "8"))
+        self.leases = ShardLeaseManager(
+            db,
+            self.worker_id,
+            MONITOR_CHAINS,
+            MONITOR_BUCKETS,
+            lease_seconds=int(os.getenv("MONITOR_LEASE_SECONDS", "30"))
+        )
+        self._task: Optional[asyncio.Task] = None
+        # (currency, address) -> exchanges watched on that address
+        self.watched: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self._heap: List[Tuple[float, int, Tuple[str, str]]] = []
+        self._due: Dict[Tuple[str, str], float] = {}
+        self._activity: Dict[Tuple[str, str], datetime] = {}
+        # (currency, address) -> consecutive failed scans
+        self._failures: Dict[Tuple[str, str], int] = {}
+        self._seq = 0
+        self._next_refresh = 0.0
+
+    async def start(self):
+        """Backfill shard ids on older exchanges and start the scan loop"""
+        if self._task:
+            return
+        await self.backfill_shards()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Deposit monitor {self.worker_id} started")
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.leases.release_all()
+        logger.info(f"Deposit monitor {self.worker_id} stopped")
+
+    async def backfill_shards(self):
+        """Assign monitor_shard to active exchanges created before sharding existed"""
+        cursor = self.db.exchanges.find(
+            {"status": {"$in": MONITORED_STATUSES}, "monitor_shard": {"$exists": False}},
+            {"_id": 0, "id": 1, "from_currency": 1, "deposit_address": 1}
+        )
+        async for exchange in cursor:
+            shard_id = shard_for(exchange.get("from_currency"), exchange.get("deposit_address"))
+            if shard_id:
+                await self.db.exchanges.update_one({"id": exchange["id"]}, {"$set": {"monitor_shard": shard_id}})
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Deposit monitor scan failed: {e}")
+            await asyncio.sleep(self.tick)
+
+    def _schedule(self, key: Tuple[str, str], due: float):
+        self._seq += 1
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, self._seq, key))
+
+    async def refresh(self):
+        """Renew leases and reload the exchanges watched in our shards"""
+        shards = await self.leases.rebalance()
+        watched: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+
+        if shards:
+            cutoff = datetime.utcnow() - EXCHANGE_EXPIRY
+            exchanges = await self.db.exchanges.find(
+                {
+                    "monitor_shard": {"$in": sorted(shards)},
+                    "$or": [
+                        {"status": "received"},
+                        {"status": "waiting", "created_at": {"$gte": cutoff}}
+                    ]
+                },
+                {"_id": 0}
+            ).sort("created_at", 1).to_list(None)
+
+            # Many exchanges share one deposit address; check each address once
+            for exchange in exchanges:
+                key = (exchange["from_currency"], exchange["deposit_address"])
+                watched.setdefault(key, []).append(exchange)
+
+        now = time.monotonic()
+        for key in watched:
+            if key not in self._due:
+                self._schedule(key, now)
+        for key in list(self._due):
+            if key not in watched:
+                del self._due[key]
+                self._activity.pop(key, None)
+                self._failures.pop(key, None)
+        self.watched = watched
+
+    async def run_once(self) -> int:
+        """Check every address that is due; returns the number of explorer calls"""
+        now = time.monotonic()
+        if now >= self._next_refresh:
+            await self.refresh()
+            self._next_refresh = now + self.scan_interval
+            now = time.monotonic()
+
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            scheduled, _, key = heapq.heappop(self._heap)
+            # Skip entries that were rescheduled or are no longer watched
+            if self._due.get(key) == scheduled:
+                due.append(key)
+        if not due:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def scan(key: Tuple[str, str]):
+            currency, address = key
+            group = self.watched[key]
+            try:
+                async with semaphore:
+                    result = await self.explorer.check_address(address, currency)
+                if await self.apply_result(group, result):
+                    self._activity[key] = datetime.utcnow()
+                self._failures.pop(key, None)
+                delay = poll_delay(CURRENCY_CHAINS[currency], group, datetime.utcnow(), self._activity.get(key))
+            except Exception as e:
+                # A key that is not rescheduled is never checked again
+                failures = self._failures.get(key, 0) + 1
+                self._failures[key] = failures
+                delay = failure_delay(failures)
+                logger.error(f"Deposit scan of {currency} {address} failed ({failures} in a row), retrying in {delay:.0f}s: {e}")
+            self._schedule(key, time.monotonic() + delay)
+
+        await asyncio.gather(*(scan(key) for key in due))
+        return len(due)
+
+    async def apply_result(self, group: List[Dict[str, Any]], result: Dict[str, Any]) -> bool:
+        """Update the exchanges that share an address from one explorer result.
+
+        Returns True when any exchange changed.
+        """
+        if not result.get('detected'):
+            return False
+
+        tx_hash = result.get('tx_hash')
+        if not tx_hash:
+            return False
+        confirmations = result.get('confirmations', 0)
+        claimed = any(exchange.get("deposit_hash") == tx_hash for exchange in group)
+        changed = False
+
+        for exchange in group:
+            required = self.required_confirmations(exchange["from_currency"])
+            if exchange["status"] == "waiting" and not claimed and can_claim(exchange, result):
+                # Exchanges that already left the watched states are not in group
+                if await self.db.exchanges.find_one({"deposit_hash": tx_hash}, {"_id": 0, "id": 1}):
+                    return changed
+                # The oldest matching waiting exchange on the address claims the transaction
+                claimed = True
+                update = {
+                    "status": "exchanging" if confirmations >= required else "received",
+                    "deposit_hash": tx_hash,
+                    "actual_received_amount": result.get('amount'),
+                    "confirmations": confirmations
+                }
+            elif exchange["status"] == "received" and exchange.get("deposit_hash") == tx_hash:
+                if confirmations == exchange.get("confirmations"):
+                    continue
+                update = {"confirmations": confirmations}
+                if confirmations >= required:
+                    update["status"] = "exchanging"
+            else:
+                continue
+
+            previous_status = exchange["status"]
+            try:
+                updated = await self.db.exchanges.find_one_and_update(
+                    {"id": exchange["id"], "status": previous_status},
+                    {"$set": update, "$inc": {"version": 1}},
+                    projection={"_id": 0},
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # deposit_hash_unique: another exchange claimed the transaction first
+                logger.warning(f"Transaction {tx_hash} is already claimed, not assigning it to {exchange['id']}")
+                continue
+            if updated:
+                exchange.update(updated)
+                await notify_exchange_changed(updated)
+                await stats_engine.record_status_change(self.db, updated, previous_status)
+                changed = True
+
+        return changed
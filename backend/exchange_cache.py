@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from cache_bus import cache_bus
+from exchange_events import exchange_events
+from fast_json import EXCHANGE_PROJECTION
+from metrics import cache_requests
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "exchanges"
+
+
+class ExchangeCache:
+    """Bounded LRU read-through cache of exchange documents.
+
+    Writers update or invalidate entries synchronously and broadcast the id
+    over the cache bus. Entries also expire after max_staleness seconds, which
+    is the upper bound on staleness even if a broadcast is lost.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_staleness: float = 10.0):
+        self.max_entries = max_entries
+        self.max_staleness = max_staleness
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, exchange: Dict[str, Any]):
+        doc = {k: v for k, v in exchange.items() if k not in EXCHANGE_PROJECTION}
+        self._entries[doc["id"]] = (time.monotonic(), doc)
+        self._entries.move_to_end(doc["id"])
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, exchange_id: str):
+        self._entries.pop(exchange_id, None)
+
+    async def get(self, db: AsyncIOMotorDatabase, exchange_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(exchange_id)
+        if entry and time.monotonic() - entry[0] < self.max_staleness:
+            self.hits += 1
+            cache_requests.inc("exchanges", "hit")
+            self._entries.move_to_end(exchange_id)
+            return entry[1]
+
+        self.misses += 1
+        cache_requests.inc("exchanges", "miss")
+        exchange = await db.exchanges.find_one({"id": exchange_id}, EXCHANGE_PROJECTION)
+        if exchange:
+            self.put(exchange)
+        else:
+            self.invalidate(exchange_id)
+        return exchange
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "max_staleness_seconds": self.max_staleness
+        }
+
+
+async def notify_exchange_changed(exchange: Dict[str, Any]):
+    """Fan a written exchange out to the cache, the event hub and other workers"""
+    exchange_cache.put(exchange)
+    exchange_events.publish(exchange)
+    await cache_bus.publish(CHANNEL, exchange["id"])
+
+
+async def notify_exchanges_changed(exchanges: List[Dict[str, Any]]):
+    """notify_exchange_changed for a batch, with a single cache bus insert"""
+    for exchange in exchanges:
+        exchange_cache.put(exchange)
+        exchange_events.publish(exchange)
+    await cache_bus.publish_many(CHANNEL, [exchange["id"] for exchange in exchanges])
+
+
+def watch_remote_changes(db: AsyncIOMotorDatabase):
+    """Drop cached copies and wake local waiters when another worker writes"""
+    def on_remote_change(exchange_id: str):
+        exchange_cache.invalidate(exchange_id)
+        # Reloading publishes the new version to local long-poll and socket clients
+        asyncio.get_running_loop().create_task(exchange_events.load(db, exchange_id))
+
+    cache_bus.subscribe(CHANNEL, on_remote_change)
+
+
+# Global instance
+exchange_cache = ExchangeCache(
+    max_entries=int(os.getenv("EXCHANGE_CACHE_SIZE", "10000")),
+    max_staleness=float(os.getenv("EXCHANGE_CACHE_MAX_STALENESS", "10"))
+)
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from starlette.websockets import WebSocket
+
+logger = logging.getLogger(__name__)
+
+# Fields served by the status endpoint
+STATUS_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "status": 1,
+    "version": 1,
+    "confirmations": 1,
+    "deposit_hash": 1,
+    "withdrawal_hash": 1,
+    "actual_received_amount": 1,
+    "actual_sent_amount": 1
+}
+
+# Seconds between heartbeats on idle event sockets
+HEARTBEAT_SECONDS = 25
+
+
+def diff_events(previous: Dict[str, Any], snapshot: Dict[str, Any]) -> List[str]:
+    """Lifecycle event types implied by the change from previous to snapshot"""
+    events = []
+    if snapshot.get("status") != previous.get("status"):
+        events.append("status")
+    if snapshot.get("deposit_hash") and snapshot.get("deposit_hash") != previous.get("deposit_hash"):
+        events.append("detection")
+    if snapshot.get("confirmations") != previous.get("confirmations"):
+        events.append("confirmations")
+    if (snapshot.get("withdrawal_hash") != previous.get("withdrawal_hash")
+            or snapshot.get("actual_sent_amount") != previous.get("actual_sent_amount")):
+        events.append("payout")
+    return events
+
+
+class Subscription:
+    """One event-bus consumer with a bounded send buffer.
+
+    When a slow consumer's buffer is full the oldest event is dropped; every
+    event carries the full status snapshot, so the newest one is what matters.
+    """
+
+    def __init__(self, max_buffer: int = 64):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffer)
+        self.exchange_ids: Set[str] = set()
+        self.dropped = 0
+
+    def offer(self, event: Dict[str, Any]):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class ExchangeEventHub:
+    """In-process change notification hub for exchanges.
+
+    Writers (deposit monitor, admin updates) publish the new status snapshot
+    after every write. Long-poll requests wait on the hub instead of polling
+    Mongo, and all clients watching the same exchange share one cached snapshot.
+    """
+
+    def __init__(self, max_snapshots: int = 10000, snapshot_max_age: float = 30.0):
+        self.max_snapshots = max_snapshots
+        # Snapshots older than this are reloaded once waiters time out, which
+        # bounds staleness for changes written by other workers
+        self.snapshot_max_age = snapshot_max_age
+        self._snapshots: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._loaded_at: Dict[str, float] = {}
+        # exchange id -> waiting futures and the version each caller already has
+        self._waiters: Dict[str, Dict[asyncio.Future, int]] = {}
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+
+    def _remember(self, exchange_id: str, snapshot: Dict[str, Any]):
+        self._snapshots[exchange_id] = snapshot
+        self._snapshots.move_to_end(exchange_id)
+        self._loaded_at[exchange_id] = time.monotonic()
+        while len(self._snapshots) > self.max_snapshots:
+            evicted, _ = self._snapshots.popitem(last=False)
+            self._loaded_at.pop(evicted, None)
+
+    def snapshot(self, exchange_id: str) -> Optional[Dict[str, Any]]:
+        return self._snapshots.get(exchange_id)
+
+    def is_fresh(self, exchange_id: str) -> bool:
+        loaded_at = self._loaded_at.get(exchange_id)
+        return loaded_at is not None and time.monotonic() - loaded_at < self.snapshot_max_age
+
+    def publish(self, exchange: Dict[str, Any]):
+        """Record the latest state of an exchange and wake everyone waiting on it"""
+        exchange_id = exchange["id"]
+        snapshot = {k: exchange.get(k) for k in STATUS_PROJECTION if k != "_id"}
+        current = self._snapshots.get(exchange_id)
+        if current and current.get("version", 0) > snapshot.get("version", 0):
+            return
+        self._remember(exchange_id, snapshot)
+
+        # Reloads republish unchanged versions; only wake callers that lack this one
+        waiters = self._waiters.get(exchange_id, {})
+        for waiter, since in list(waiters.items()):
+            if since != snapshot.get("version", 0):
+                del waiters[waiter]
+                if not waiter.done():
+                    waiter.set_result(snapshot)
+
+        subscribers = self._subscribers.get(exchange_id)
+        previous = current or {}
+        if not subscribers or previous.get("version") == snapshot.get("version"):
+            return
+        for event_type in diff_events(previous, snapshot):
+            event = {"type": event_type, "exchange_id": exchange_id, "data": snapshot}
+            for subscription in subscribers:
+                subscription.offer(event)
+
+    def subscribe(self, subscription: Subscription, exchange_ids: Iterable[str]):
+        for exchange_id in exchange_ids:
+            subscription.exchange_ids.add(exchange_id)
+            self._subscribers.setdefault(exchange_id, set()).add(subscription)
+
+    def unsubscribe(self, subscription: Subscription, exchange_ids: Optional[Iterable[str]] = None):
+        """Drop some or all of a subscription's exchanges"""
+        for exchange_id in list(exchange_ids if exchange_ids is not None else subscription.exchange_ids):
+            subscription.exchange_ids.discard(exchange_id)
+            subscribers = self._subscribers.get(exchange_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[exchange_id]
+
+    async def load(self, db, exchange_id: str) -> Optional[Dict[str, Any]]:
+        """Read the status snapshot from Mongo and cache it"""
+        exchange = await db.exchanges.find_one({"id": exchange_id}, STATUS_PROJECTION)
+        if not exchange:
+            return None
+        exchange.setdefault("version", 0)
+        self.publish(exchange)
+        return self._snapshots[exchange_id]
+
+    async def get(self, db, exchange_id: str) -> Optional[Dict[str, Any]]:
+        if self.is_fresh(exchange_id):
+            return self._snapshots[exchange_id]
+        return await self.load(db, exchange_id)
+
+    async def wait(self, db, exchange_id: str, since: Optional[int], timeout: float) -> Optional[Dict[str, Any]]:
+        """Return the snapshot once its version differs from since, or after timeout"""
+        snapshot = await self.get(db, exchange_id)
+        if snapshot is None or since is None or timeout <= 0 or snapshot.get("version", 0) != since:
+            return snapshot
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.setdefault(exchange_id, {})[waiter] = since
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return await self.get(db, exchange_id)
+        finally:
+            waiters = self._waiters.get(exchange_id)
+            if waiters is not None:
+                waiters.pop(waiter, None)
+                if not waiters:
+                    del self._waiters[exchange_id]
+
+
+async def send_events(websocket: WebSocket, subscription: Subscription):
+    """Drain a subscription into a websocket, sending heartbeats while idle"""
+    while True:
+        try:
+            event = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_SECONDS)
+        except asyncio.TimeoutError:
+            event = {"type": "heartbeat"}
+        await websocket.send_json(event)
+
+
+# Global instance
+exchange_events = ExchangeEventHub()
@@ -0,0 +1,79 @@
+import csv
+import io
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from fast_json import dumps
+
+# Column order of the CSV export; usd.* are the values priced at creation
+EXPORT_FIELDS = [
+    "id", "created_at", "status", "rate_type",
+    "from_currency", "from_amount", "to_currency", "to_amount",
+    "actual_received_amount", "actual_sent_amount",
+    "usd.price", "usd.volume_usd", "usd.commission_usd", "usd.partner_commission_usd",
+    "partner_id", "deposit_address", "deposit_hash", "receiving_address", "withdrawal_hash",
+    "confirmations"
+]
+EXPORT_PROJECTION = {"_id": 0, **{field: 1 for field in EXPORT_FIELDS}}
+
+# Documents per Mongo round trip and bytes per chunk handed to the client
+BATCH_SIZE = 1000
+CHUNK_BYTES = 64 * 1024
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _field(doc: Dict[str, Any], path: str) -> Any:
+    value: Any = doc
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def export_exchanges(db: AsyncIOMotorDatabase, query: Dict[str, Any], fmt: str,
+                           compress: bool = False) -> AsyncIterator[bytes]:
+    """Stream matching exchanges oldest first as CSV or NDJSON chunks.
+
+    Only one cursor batch and one chunk are held at a time. Each chunk is
+    awaited by the ASGI server before the next batch is read, so a slow
+    client slows the cursor down instead of growing a buffer.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    text = io.StringIO()
+    writer = csv.writer(text)
+    buffer = bytearray()
+
+    def encode(chunk: bytes) -> bytes:
+        return compressor.compress(chunk) if compressor else chunk
+
+    if fmt == "csv":
+        writer.writerow(EXPORT_FIELDS)
+
+    cursor = db.exchanges.find(query, EXPORT_PROJECTION).sort([("created_at", 1), ("id", 1)]).batch_size(BATCH_SIZE)
+    async for doc in cursor:
+        if fmt == "csv":
+            writer.writerow([_field(doc, field) for field in EXPORT_FIELDS])
+            if text.tell() >= CHUNK_BYTES:
+                buffer += text.getvalue().encode("utf-8")
+                text.seek(0)
+                text.truncate()
+        else:
+            buffer += dumps(doc) + b"\n"
+
+        if len(buffer) >= CHUNK_BYTES:
+            chunk = encode(bytes(buffer))
+            buffer.clear()
+            if chunk:
+                yield chunk
+
+    buffer += text.getvalue().encode("utf-8")
+    tail = encode(bytes(buffer))
+    if compressor:
+        tail += compressor.flush()
+    if tail:
+        yield tail
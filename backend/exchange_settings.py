@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from admin_models import ExchangeSettings
+from fast_json import DOCUMENT_PROJECTION
+
+logger = logging.getLogger(__name__)
+
+# Reload interval when change streams are unavailable (no replica set)
+POLL_SECONDS = 60
+
+
+class SettingsService:
+    """In-memory copy of the exchange_settings document.
+
+    Rate paths read fees and markups from here instead of Mongo. The copy is
+    reloaded after an admin update on this worker and, on every worker, on
+    change-stream events for the collection; without a replica set it is
+    polled every POLL_SECONDS instead. Until the first load it serves the
+    ExchangeSettings defaults.
+    """
+
+    def __init__(self):
+        self.settings = ExchangeSettings()
+        self._task: Optional[asyncio.Task] = None
+
+    async def load(self, db: AsyncIOMotorDatabase) -> Dict[str, Any]:
+        """Read the settings, creating the defaults if none exist yet"""
+        doc = await db.exchange_settings.find_one({}, DOCUMENT_PROJECTION)
+        if doc is None:
+            # Only the first load on a fresh database writes
+            doc = await db.exchange_settings.find_one_and_update(
+                {},
+                {"$setOnInsert": ExchangeSettings().dict()},
+                projection=DOCUMENT_PROJECTION,
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        self.settings = ExchangeSettings(**doc)
+        return doc
+
+    def fee_percentage(self, rate_type: str) -> float:
+        """Fee kept from the rate, in percent"""
+        if rate_type == "fixed":
+            return self.settings.default_fixed_fee
+        return self.settings.default_floating_fee
+
+    def public_rate(self, base_rate: float) -> float:
+        """Market rate with the configured markup, before fees"""
+        return base_rate * (1 - self.settings.rate_markup_percentage / 100)
+
+    def partner_rate(self, base_rate: float) -> float:
+        """Market rate with the partner rate difference, before fees"""
+        return base_rate * (1 + self.settings.partner_rate_difference / 100)
+
+    def apply_fee(self, rate: float, rate_type: str) -> float:
+        return rate * (1 - self.fee_percentage(rate_type) / 100)
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        if self._task:
+            return
+        try:
+            await self.load(db)
+        except Exception as e:
+            logger.error(f"Could not load exchange settings, using defaults: {e}")
+        self._task = asyncio.create_task(self._watch(db))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _watch(self, db: AsyncIOMotorDatabase):
+        while True:
+            try:
+                async with db.exchange_settings.watch() as stream:
+                    async for _ in stream:
+                        await self.load(db)
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.info(f"Settings change stream unavailable, polling every {POLL_SECONDS}s: {e}")
+                await asyncio.sleep(POLL_SECONDS)
+                try:
+                    await self.load(db)
+                except Exception as e:
+                    logger.error(f"Settings reload failed: {e}")
+            except Exception as e:
+                logger.error(f"Settings watch failed: {e}")
+                await asyncio.sleep(5)
+
+
+# Global instance
+settings_service = SettingsService()
@@ -0,0 +1,42 @@
+import json
+from datetime import date, datetime
+from typing import Any
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+# Mongo projections that keep internal fields and secrets out of responses,
+# so handlers no longer strip them from every document in Python
+EXCHANGE_PROJECTION = {"_id": 0, "monitor_shard": 0, "usd": 0, "write_ids": 0}
+PARTNER_PROJECTION = {"_id": 0, "api_key_hash": 0, "api_secret": 0, "search_terms": 0}
+DOCUMENT_PROJECTION = {"_id": 0}
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode content as compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """JSON response that encodes plain dicts directly.
+
+    Returning it from a handler bypasses FastAPI's jsonable_encoder and
+    response_model validation, so handlers must pass already-safe documents.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
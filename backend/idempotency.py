@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyError(Exception):
+    """Raised when an idempotency key cannot be honoured"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def fingerprint(payload: Dict[str, Any]) -> str:
+    """Stable hash of a request body, used to reject key reuse with a different body"""
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class IdempotencyStore:
+    """Replays the stored response for a repeated Idempotency-Key.
+
+    Recent keys are served from a bounded in-memory LRU. The idempotency_keys
+    collection (unique _id, TTL on created_at) is the source of truth across
+    workers: the first request inserts a pending record, and concurrent
+    duplicates wait for it to complete instead of creating a second exchange.
+    A pending record holds a lease of lease_seconds; if its worker dies, a
+    retry with the same body takes the key over once the lease has expired.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, scope: str, max_entries: int = 10000,
+                 pending_timeout: float = 10.0, lease_seconds: float = 30.0):
+        self.db = db
+        self.scope = scope
+        self.max_entries = max_entries
+        self.pending_timeout = pending_timeout
+        self.lease_seconds = lease_seconds
+        self._cache: "OrderedDict[str, Tuple[str, Dict[str, Any]]]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Requests holding or queued on each lock; the lock is dropped at zero
+        self._lock_users: Dict[str, int] = {}
+
+    def _remember(self, key: str, request_hash: str, response: Dict[str, Any]):
+        self._cache[key] = (request_hash, response)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def _replay(self, key: str, request_hash: str, stored_hash: str, response: Dict[str, Any]) -> Dict[str, Any]:
+        if stored_hash != request_hash:
+            raise IdempotencyError(422, "Idempotency-Key was already used with a different request body")
+        self._remember(key, stored_hash, response)
+        return response
+
+    def _lease_expired(self, record: Dict[str, Any], now: datetime) -> bool:
+        # Records written before leases existed only have created_at
+        expires_at = record.get("lease_expires_at") or record["created_at"] + timedelta(seconds=self.lease_seconds)
+        return expires_at < now
+
+    async def _claim(self, key: str, request_hash: str) -> bool:
+        """Insert a pending record for key, or take over one whose lease has expired"""
+        now = datetime.utcnow()
+        lease = {"status": "pending", "lease_expires_at": now + timedelta(seconds=self.lease_seconds)}
+        try:
+            await self.db.idempotency_keys.insert_one({
+                "_id": key,
+                "request_hash": request_hash,
+                "created_at": now,
+                **lease
+            })
+            return True
+        except DuplicateKeyError:
+            pass
+
+        record = await self.db.idempotency_keys.find_one({"_id": key})
+        if record is None or record.get("status") != "pending" or record["request_hash"] != request_hash:
+            return False
+        if not self._lease_expired(record, now):
+            return False
+        # Conditional on the lease we saw, so only one retry wins the takeover
+        taken = await self.db.idempotency_keys.update_one(
+            {"_id": key, "status": "pending", "lease_expires_at": record.get("lease_expires_at")},
+            {"$set": lease}
+        )
+        if taken.modified_count:
+            logger.warning(f"Took over idempotency key {key} after its lease expired")
+        return taken.modified_count == 1
+
+    async def _wait_for_completion(self, key: str, request_hash: str, deadline: float) -> Optional[Dict[str, Any]]:
+        """Another worker holds the key; wait until it stores its response.
+
+        Returns None when the key is free to claim again: the holder failed
+        and released it, or its lease expired.
+        """
+        loop = asyncio.get_running_loop()
+        while loop.time() < deadline:
+            record = await self.db.idempotency_keys.find_one({"_id": key})
+            if record is None:
+                return None
+            if record["request_hash"] != request_hash:
+                raise IdempotencyError(422, "Idempotency-Key was already used with a different request body")
+            if record.get("status") == "completed":
+                return self._replay(key, request_hash, record["request_hash"], record["response"])
+            if self._lease_expired(record, datetime.utcnow()):
+                return None
+            await asyncio.sleep(0.1)
+        raise IdempotencyError(409, "A request with this Idempotency-Key is still in progress")
+
+    async def run(self, idempotency_key: str, payload: Dict[str, Any],
+                  create: Callable[[Callable[[Dict[str, Any]], Awaitable[None]]], Awaitable[Dict[str, Any]]]
+                  ) -> Tuple[Dict[str, Any], bool]:
+        """Return (response, replayed), calling create at most once per key.
+
+        create gets a `stored` callback to await as soon as its resource is
+        durably written; the key is completed then, so a failure in later
+        side effects cannot release it and let a retry create a duplicate.
+        Without the callback the key is completed when create returns.
+        """
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            raise IdempotencyError(400, f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters")
+
+        key = f"{self.scope}:{idempotency_key}"
+        request_hash = fingerprint(payload)
+
+        cached = self._cache.get(key)
+        if cached:
+            return self._replay(key, request_hash, *cached), True
+
+        # Serialize duplicates arriving at this worker
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                cached = self._cache.get(key)
+                if cached:
+                    return self._replay(key, request_hash, *cached), True
+
+                deadline = asyncio.get_running_loop().time() + self.pending_timeout
+                while not await self._claim(key, request_hash):
+                    response = await self._wait_for_completion(key, request_hash, deadline)
+                    if response is not None:
+                        return response, True
+
+                completed: List[Dict[str, Any]] = []
+
+                async def stored(response: Dict[str, Any]):
+                    completed.append(response)
+                    await self.db.idempotency_keys.update_one(
+                        {"_id": key},
+                        {"$set": {"status": "completed", "response": response}}
+                    )
+                    self._remember(key, request_hash, response)
+
+                try:
+                    response = await create(stored)
+                except Exception:
+                    # Only release the key when nothing was stored under it
+                    if not completed:
+                        await self.db.idempotency_keys.delete_one({"_id": key, "status": "pending"})
+                    raise
+
+                if not completed:
+                    await stored(response)
+                return response, False
+        finally:
+            self._lock_users[key] -= 1
+            if not self._lock_users[key]:
+                del self._lock_users[key]
+                del self._locks[key]
@@ -15,6 +15,9 @@ import uuid
 # Add the backend directory to the path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from admin_models import AdminUser, ExchangeSettings, CurrencyToken
+from db_indexes import ensure_indexes, index_report
+from cache_bus import cache_bus
+from principal_cache import notify_admin_changed
 
 # Load environment variables
 load_dotenv()
@@ -42,6 +45,10 @@ async def init_admin_data():
         )
         
         await db.admin_users.insert_one(admin_user.dict())
+        # Drop principals cached by running servers for this username
+        await cache_bus.start(db)
+        await notify_admin_changed("admin")
+        await cache_bus.stop()
         print("✅ Default admin user created:")
         print("   Username: admin")
         print("   Password: cartel123")
@@ -181,10 +188,26 @@ async def init_admin_data():
             token = CurrencyToken(**currency_data)
             await db.currency_tokens.insert_one(token.dict())
         
+        # Make running servers rebuild their currency catalog
+        await db.cache_versions.update_one(
+            {"_id": "currency_catalog"},
+            {"$set": {"updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        
         print(f"✅ Initialized {len(supported_currencies)} currency tokens")
     else:
         print("ℹ️  Currency tokens already exist")
     
+    # 4. Create indexes for the hot query paths
+    failed = await ensure_indexes(db)
+    report = await index_report(db)
+    missing = {collection: result["missing"] for collection, result in report.items() if result["missing"]}
+    if failed or missing:
+        print(f"⚠️  Missing indexes: {missing}")
+    else:
+        print("✅ Database indexes are in place")
+    
     # Close database connection
     client.close()
     
@@ -2,15 +2,28 @@ import asyncio
 import httpx
 import logging
 from typing import Optional, Dict, Any
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from metrics import InstrumentedTransport
 
 logger = logging.getLogger(__name__)
 
+# XRP ledger times count seconds from 2000-01-01 UTC
+RIPPLE_EPOCH = 946684800
+
+
+def utc_timestamp(seconds: Optional[float]) -> Optional[str]:
+    """ISO time of a chain timestamp in UTC; None when the chain gave none"""
+    if not seconds:
+        return None
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).isoformat()
+
+
 class BlockchainMonitor:
     """Real blockchain monitoring service for deposit addresses"""
     
     def __init__(self):
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # Explorer calls are timed per upstream host for /metrics
+        self.client = httpx.AsyncClient(timeout=30.0, transport=InstrumentedTransport())
         self.cache = {}  # Simple in-memory cache
         
     async def check_btc_address(self, address: str, expected_amount: float = None) -> Dict[str, Any]:
@@ -41,7 +54,7 @@ class BlockchainMonitor:
                         'expected_amount': expected_amount,
                         'amount_match': abs(amount_btc - (expected_amount or 0)) < 0.0001 if expected_amount else True,
                         'currency': 'BTC',
-                        'timestamp': latest_tx.get('confirmed', datetime.now().isoformat())
+                        'timestamp': latest_tx.get('confirmed') or latest_tx.get('received')
                     }
             
             return {'detected': False, 'currency': 'BTC'}
@@ -86,7 +99,7 @@ class BlockchainMonitor:
                         'expected_amount': expected_amount,
                         'amount_match': abs(amount_eth - (expected_amount or 0)) < 0.001 if expected_amount else True,
                         'currency': 'ETH',
-                        'timestamp': datetime.fromtimestamp(int(latest_tx.get('timeStamp', 0))).isoformat()
+                        'timestamp': utc_timestamp(int(latest_tx.get('timeStamp', 0)))
                     }
                     
             return {'detected': False, 'currency': 'ETH'}
@@ -119,7 +132,7 @@ class BlockchainMonitor:
                         'expected_amount': expected_amount,
                         'amount_match': abs(amount_ltc - (expected_amount or 0)) < 0.0001 if expected_amount else True,
                         'currency': 'LTC',
-                        'timestamp': latest_tx.get('confirmed', datetime.now().isoformat())
+                        'timestamp': latest_tx.get('confirmed') or latest_tx.get('received')
                     }
                     
             return {'detected': False, 'currency': 'LTC'}
@@ -152,7 +165,7 @@ class BlockchainMonitor:
                         'expected_amount': expected_amount,
                         'amount_match': abs(amount_doge - (expected_amount or 0)) < 0.01 if expected_amount else True,
                         'currency': 'DOGE',
-                        'timestamp': latest_tx.get('confirmed', datetime.now().isoformat())
+                        'timestamp': latest_tx.get('confirmed') or latest_tx.get('received')
                     }
                     
             return {'detected': False, 'currency': 'DOGE'}
@@ -201,7 +214,7 @@ class BlockchainMonitor:
                         'expected_amount': expected_amount,
                         'amount_match': abs(amount_xrp - (expected_amount or 0)) < 0.001 if expected_amount else True,
                         'currency': 'XRP',
-                        'timestamp': datetime.now().isoformat()
+                        'timestamp': utc_timestamp(tx_data['date'] + RIPPLE_EPOCH) if tx_data.get('date') else None
                     }
                     
             return {'detected': False, 'currency': 'XRP'}
@@ -246,7 +259,7 @@ class BlockchainMonitor:
                         'expected_amount': expected_amount,
                         'amount_match': abs(amount_tokens - (expected_amount or 0)) < 0.01 if expected_amount else True,
                         'currency': 'ERC20',
-                        'timestamp': datetime.fromtimestamp(int(latest_tx.get('timeStamp', 0))).isoformat()
+                        'timestamp': utc_timestamp(int(latest_tx.get('timeStamp', 0)))
                     }
                     
             return {'detected': False, 'currency': 'ERC20'}
@@ -292,7 +305,7 @@ class BlockchainMonitor:
                         'expected_amount': expected_amount,
                         'amount_match': abs(amount_tokens - (expected_amount or 0)) < 0.01 if expected_amount else True,
                         'currency': currency_type,
-                        'timestamp': datetime.fromtimestamp(int(latest_tx.get('block_timestamp', 0)) / 1000).isoformat()
+                        'timestamp': utc_timestamp(int(latest_tx.get('block_timestamp', 0)) / 1000)
                     }
                     
             return {'detected': False, 'currency': 'TRX' if not is_token else 'TRC20'}
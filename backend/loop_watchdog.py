@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Frames from these paths are skipped when naming the code that held the loop
+LIBRARY_PATHS = ("/asyncio/", "site-packages", "/threading.py", "/selectors.py")
+
+
+class LoopWatchdog:
+    """Opt-in detector for code that blocks the event loop.
+
+    A coroutine on the loop bumps a heartbeat every `interval` seconds. A
+    daemon thread watches that heartbeat; once it is older than `threshold`
+    the thread samples the loop thread's stack with sys._current_frames().
+    When the loop recovers, the stall is charged to the application frame
+    that was on top of the stack, and the worst offenders are kept for the
+    admin diagnostics endpoint.
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.02, max_offenders: int = 50):
+        self.threshold = threshold
+        self.interval = interval
+        self.max_offenders = max_offenders
+        self.stalls = 0
+        self.max_lag = 0.0
+        self._offenders: Dict[Tuple[str, int, str], Dict[str, Any]] = {}
+        self._beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._stall_stack: Optional[List[traceback.FrameSummary]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self._task:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Loop watchdog started (threshold {self.threshold * 1000:.0f} ms)")
+
+    def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        self._task = None
+        self._stopped.set()
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = now - self._beat - self.interval
+            self._beat = now
+            if lag >= self.threshold:
+                self._record(lag)
+            else:
+                self._stall_stack = None
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            if self._stall_stack is not None:
+                continue
+            if time.monotonic() - self._beat < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._stall_stack = traceback.extract_stack(frame)
+
+    def _record(self, lag: float):
+        stack, self._stall_stack = self._stall_stack, None
+        self.stalls += 1
+        self.max_lag = max(self.max_lag, lag)
+        if not stack:
+            # The stall ended before the watchdog thread got to sample it
+            return
+
+        culprit = next(
+            (frame for frame in reversed(stack) if not any(path in frame.filename for path in LIBRARY_PATHS)),
+            stack[-1]
+        )
+        key = (culprit.filename, culprit.lineno, culprit.name)
+        with self._lock:
+            offender = self._offenders.get(key)
+            if offender is None:
+                if len(self._offenders) >= self.max_offenders:
+                    # Make room by forgetting the mildest offender
+                    mildest = min(self._offenders, key=lambda k: self._offenders[k]["max_ms"])
+                    if self._offenders[mildest]["max_ms"] >= lag * 1000:
+                        return
+                    del self._offenders[mildest]
+                offender = self._offenders[key] = {
+                    "location": f"{culprit.filename}:{culprit.lineno}",
+                    "function": culprit.name,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0
+                }
+            offender["count"] += 1
+            offender["total_ms"] += lag * 1000
+            if lag * 1000 >= offender["max_ms"]:
+                offender["max_ms"] = lag * 1000
+                offender["stack"] = traceback.format_list(stack[-15:])
+                offender["last_seen"] = time.time()
+        logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms in {culprit.name} ({culprit.filename}:{culprit.lineno})")
+
+    def report(self, limit: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            offenders = sorted(self._offenders.values(), key=lambda o: o["max_ms"], reverse=True)[:limit]
+            offenders = [dict(o, total_ms=round(o["total_ms"], 1), max_ms=round(o["max_ms"], 1)) for o in offenders]
+        return {
+            "enabled": self.running,
+            "threshold_ms": self.threshold * 1000,
+            "stalls": self.stalls,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "offenders": offenders
+        }
+
+    def reset(self):
+        with self._lock:
+            self._offenders.clear()
+        self.stalls = 0
+        self.max_lag = 0.0
+
+
+# Global instance
+loop_watchdog = LoopWatchdog(threshold=float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100")) / 1000)
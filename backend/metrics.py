@@ -0,0 +1,282 @@
+import asyncio
+import bisect
+import hmac
+import ipaddress
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from pymongo import monitoring
+from starlette.requests import Request
+
+logger = logging.getLogger(__name__)
+
+# Default latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Explorer and exchange hosts reported as upstreams
+UPSTREAM_HOSTS = {
+    "api.blockcypher.com": "blockcypher",
+    "api.etherscan.io": "etherscan",
+    "api.trongrid.io": "trongrid",
+    "s1.ripple.com": "xrpl",
+    "api.kucoin.com": "kucoin"
+}
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter keyed by label values.
+
+    inc() runs on the event loop thread, so plain dict updates are enough and
+    no lock is taken on the request path. Worker threads use inc_threadsafe(),
+    which adds to a separate per-label tally under a short lock; it is folded
+    in at scrape time and never holds more than one entry per label set.
+    """
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self._pending: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def inc_threadsafe(self, *labels: str):
+        with self._lock:
+            self._pending[labels] = self._pending.get(labels, 0.0) + 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for labels, amount in pending.items():
+            self.inc(*labels, amount=amount)
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is set directly or read from a callback at scrape time"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                 callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.callback = callback
+
+    def set(self, value: float, *labels: str):
+        self.values[labels] = value
+
+    def render(self) -> List[str]:
+        values = self.callback() if self.callback else self.values
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values.
+
+    Like Counter, observe() is for the event loop thread and
+    observe_threadsafe() for worker threads, whose observations are bucketed
+    into a separate per-label series under a short lock.
+    """
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = buckets
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.values: Dict[Tuple[str, ...], List[float]] = {}
+        self._pending: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, values: Dict[Tuple[str, ...], List[float]], value: float, labels: Tuple[str, ...]):
+        series = values.get(labels)
+        if series is None:
+            series = values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def observe(self, value: float, *labels: str):
+        self._add(self.values, value, labels)
+
+    def observe_threadsafe(self, value: float, *labels: str):
+        with self._lock:
+            self._add(self._pending, value, labels)
+
+    def _drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for labels, counts in pending.items():
+            series = self.values.get(labels)
+            if series is None:
+                self.values[labels] = counts
+            else:
+                for i, count in enumerate(counts):
+                    series[i] += count
+
+    def render(self) -> List[str]:
+        self._drain()
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route")))
+upstream_latency = registry.register(Histogram(
+    "upstream_request_duration_seconds", "Latency of calls to external APIs", ("upstream",)))
+upstream_errors = registry.register(Counter(
+    "upstream_errors_total", "Failed calls to external APIs", ("upstream",)))
+cache_requests = registry.register(Counter(
+    "cache_requests_total", "Cache lookups by cache and result", ("cache", "result")))
+mongo_latency = registry.register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", ("command",)))
+mongo_errors = registry.register(Counter(
+    "mongo_command_errors_total", "Failed MongoDB commands", ("command",)))
+loop_lag = registry.register(Gauge(
+    "event_loop_lag_seconds", "Most recent event-loop scheduling delay"))
+loop_lag_histogram = registry.register(Histogram(
+    "event_loop_lag_distribution_seconds", "Event-loop scheduling delay",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)))
+
+
+def record_upstream(upstream: str, started: float, failed: bool = False):
+    upstream_latency.observe(time.perf_counter() - started, upstream)
+    if failed:
+        upstream_errors.inc(upstream)
+
+
+def scrape_allowed(request: Request, token: Optional[str]) -> bool:
+    """With a token configured, require it as a bearer token; otherwise only
+    accept direct connections from loopback or private addresses"""
+    if token:
+        supplied = request.headers.get("authorization", "")
+        return hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode())
+    # Anything relayed by a proxy may have come from the internet
+    if "x-forwarded-for" in request.headers or request.client is None:
+        return False
+    try:
+        address = ipaddress.ip_address(request.client.host)
+    except ValueError:
+        return False
+    return address.is_loopback or address.is_private
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request counts and latency per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            http_requests.inc(scope["method"], path, str(status[0]))
+            http_latency.observe(time.perf_counter() - started, scope["method"], path)
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """httpx transport that times every request per upstream host"""
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        upstream = UPSTREAM_HOSTS.get(request.url.host, request.url.host)
+        started = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception:
+            record_upstream(upstream, started, failed=True)
+            raise
+        record_upstream(upstream, started, failed=response.status_code >= 400)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener; runs on motor's worker threads"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_latency.observe_threadsafe(event.duration_micros / 1e6, event.command_name)
+
+    def failed(self, event):
+        mongo_latency.observe_threadsafe(event.duration_micros / 1e6, event.command_name)
+        mongo_errors.inc_threadsafe(event.command_name)
+
+
+async def sample_loop_lag(interval: float = 0.5):
+    """Measure how late the loop wakes us up; runs until cancelled"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        loop_lag.set(lag)
+        loop_lag_histogram.observe(lag)
@@ -0,0 +1,95 @@
+import base64
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+# Listings are ordered newest first; id breaks ties between equal timestamps
+KEYSET_SORT = [("created_at", -1), ("id", -1)]
+
+
+class InvalidCursorError(ValueError):
+    """The continuation token was not produced by encode_cursor"""
+
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    """Opaque continuation token pointing just after doc"""
+    raw = json.dumps([doc["created_at"].isoformat(), doc["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Raises InvalidCursorError for tokens that were not produced by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, doc_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(doc_id)
+    except Exception:
+        raise InvalidCursorError(cursor)
+
+
+def after_cursor(query: Dict[str, Any], cursor: str) -> Dict[str, Any]:
+    """Restrict query to the documents that sort after the cursor"""
+    created_at, doc_id = decode_cursor(cursor)
+    keyset = {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "id": {"$lt": doc_id}}
+    ]}
+    return {"$and": [query, keyset]} if query else keyset
+
+
+async def keyset_page(collection: AsyncIOMotorCollection, query: Dict[str, Any], projection: Dict[str, Any],
+                      page_size: int, cursor: Optional[str] = None,
+                      skip: int = 0) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page in KEYSET_SORT order and the cursor for the next page (None on the last).
+
+    With a cursor every page is an index range scan starting at the cursor,
+    so deep pages cost the same as the first. `skip` only serves old
+    page-number clients.
+    """
+    if cursor:
+        query = after_cursor(query, cursor)
+    docs = await collection.find(query, projection).sort(KEYSET_SORT).skip(skip).limit(page_size + 1).to_list(page_size + 1)
+    if len(docs) <= page_size:
+        return docs, None
+    docs = docs[:page_size]
+    return docs, encode_cursor(docs[-1])
+
+
+class CountCache:
+    """Per-filter document counts, reused for `ttl` seconds.
+
+    Unfiltered counts come from collection metadata
+    (estimated_document_count) and never scan.
+    """
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+
+    async def count(self, collection: AsyncIOMotorCollection, query: Dict[str, Any]) -> int:
+        key = collection.name + ":" + hashlib.sha1(
+            json.dumps(query, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        entry = self._entries.get(key)
+        if entry and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+
+        if query:
+            total = await collection.count_documents(query)
+        else:
+            total = await collection.estimated_document_count()
+        self._entries[key] = (time.monotonic(), total)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return total
+
+
+# Global instance
+count_cache = CountCache()
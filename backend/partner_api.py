@@ -1,27 +1,59 @@
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends, Header, Request, WebSocket, WebSocketDisconnect
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import Optional
+from typing import Optional, Tuple
+import asyncio
+import json
 import logging
 from crypto_rates_service import kucoin_rates_service
+from exchange_events import exchange_events, Subscription, send_events
+from currency_catalog import currency_catalog
+from partner_auth import partner_key_cache
+from exchange_settings import settings_service
+from partner_usage import rate_limiter, rate_limit_for, usage_meter
 
 logger = logging.getLogger(__name__)
 
+# Most exchanges one partner socket may follow at once
+MAX_SOCKET_SUBSCRIPTIONS = 1000
+
 def create_partner_api_router(db: AsyncIOMotorDatabase) -> APIRouter:
     router = APIRouter(prefix="/api/partner", tags=["Partner API"])
     
-    async def verify_partner_api_key(x_api_key: Optional[str] = Header(None)):
-        """Verify partner API key"""
-        if not x_api_key:
+    async def find_partner(api_key: str) -> Optional[dict]:
+        """Look up the active partner that owns an API key (cached by key hash)"""
+        return await partner_key_cache.authenticate(db, api_key)
+    
+    async def authorize_partner(api_key: Optional[str]) -> Tuple[dict, int, int, int]:
+        """Authenticate an API key and count the request against the partner's rate limit.
+
+        Returns (partner, limit, remaining, retry_after); retry_after is 0 when allowed.
+        """
+        if not api_key:
             raise HTTPException(status_code=401, detail="API key required in X-API-Key header")
         
-        partner = await db.partners.find_one({
-            "api_key": x_api_key, 
-            "status": "active"
-        })
+        partner = await find_partner(api_key)
         
         if not partner:
             raise HTTPException(status_code=401, detail="Invalid or inactive API key")
         
+        limit = rate_limit_for(partner)
+        allowed, remaining, retry_after = rate_limiter.hit(partner["id"], limit)
+        return partner, limit, remaining, 0 if allowed else retry_after
+    
+    async def verify_partner_api_key(request: Request, x_api_key: Optional[str] = Header(None)):
+        """Verify partner API key and enforce the partner's rate limit"""
+        partner, limit, remaining, retry_after = await authorize_partner(x_api_key)
+        
+        # Read by PartnerUsageMiddleware for metering and the X-RateLimit headers
+        request.state.partner_id = partner["id"]
+        request.state.rate_limit = (limit, remaining)
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(retry_after)}
+            )
+        
         return partner
     
     @router.get("/rates")
@@ -49,22 +81,10 @@ def create_partner_api_router(db: AsyncIOMotorDatabase) -> APIRouter:
                     detail=f"Exchange rate service temporarily unavailable. Unable to get rate for {from_curr}/{to_curr} from KuCoin API"
                 )
             
-            # Get settings for rate manipulation
-            settings = await db.exchange_settings.find_one({})
-            partner_rate_difference = settings.get('partner_rate_difference', 0.0) if settings else 0.0
-            
-            # Apply partner rate difference (if configured in settings)
-            partner_base_rate = base_rate * (1 + partner_rate_difference / 100)
-            
-            # Apply standard fees based on rate type
-            if rate_type == "fixed":
-                # Fixed rate: 2% fee
-                final_rate = partner_base_rate * 0.98
-                fee_percentage = 2.0
-            else:
-                # Float rate: 1% fee
-                final_rate = partner_base_rate * 0.99
-                fee_percentage = 1.0
+            # Apply partner rate difference and fees from the cached settings
+            partner_base_rate = settings_service.partner_rate(base_rate)
+            fee_percentage = settings_service.fee_percentage(rate_type)
+            final_rate = settings_service.apply_fee(partner_base_rate, rate_type)
             
             # Calculate partner commission (partner gets commission from our fee)
             partner_commission_rate = partner.get('commission_rate', 30.0)
@@ -94,25 +114,11 @@ def create_partner_api_router(db: AsyncIOMotorDatabase) -> APIRouter:
             raise HTTPException(status_code=500, detail="Error getting exchange rate")
     
     @router.get("/currencies")
-    async def get_partner_currencies(partner: dict = Depends(verify_partner_api_key)):
+    async def get_partner_currencies(request: Request, partner: dict = Depends(verify_partner_api_key)):
         """Get list of supported currencies for partners"""
         try:
-            # Get active and visible currencies from database
-            currencies = await db.currency_tokens.find({
-                "is_active": True,
-                "is_visible": True
-            }).sort("order_index", 1).to_list(None)
-            
-            # Remove internal fields
-            for currency in currencies:
-                if "_id" in currency:
-                    del currency["_id"]
-            
-            return {
-                "success": True,
-                "data": currencies,
-                "partner_id": partner["id"]
-            }
+            # Active and visible currencies, served from the shared catalog
+            return await currency_catalog.partner_response(db, request, partner["id"])
             
         except Exception as e:
             logger.error(f"Error getting partner currencies: {e}")
@@ -132,7 +138,8 @@ def create_partner_api_router(db: AsyncIOMotorDatabase) -> APIRouter:
                     "total_volume": partner.get("total_volume", 0.0),
                     "total_commission": partner.get("total_commission", 0.0),
                     "api_usage": "active",
-                    "rate_access": "enabled"
+                    "rate_access": "enabled",
+                    "rate_limit_per_minute": rate_limit_for(partner)
                 }
             }
             
@@ -142,22 +149,100 @@ def create_partner_api_router(db: AsyncIOMotorDatabase) -> APIRouter:
     
     @router.post("/track-usage")
     async def track_api_usage(
+        request: Request,
         usage_data: dict,
         partner: dict = Depends(verify_partner_api_key)
     ):
-        """Track partner API usage for statistics"""
+        """Track partner API usage for statistics.
+
+        Every authenticated partner request, this one included, is metered by
+        PartnerUsageMiddleware; the response reports the current quota.
+        """
         try:
-            # Here you could log API usage, track volume, etc.
-            # For now, just return success
-            
+            limit, remaining = request.state.rate_limit
             return {
                 "success": True,
                 "message": "Usage tracked successfully",
-                "partner_id": partner["id"]
+                "partner_id": partner["id"],
+                "data": {
+                    "rate_limit_per_minute": limit,
+                    "remaining": remaining
+                }
             }
             
         except Exception as e:
             logger.error(f"Error tracking partner usage: {e}")
             raise HTTPException(status_code=500, detail="Error tracking usage")
     
+    @router.websocket("/ws")
+    async def partner_events_ws(
+        websocket: WebSocket,
+        x_api_key: Optional[str] = Header(None),
+        api_key: Optional[str] = None
+    ):
+        """Multiplexed exchange event stream.
+
+        Clients send {"action": "subscribe" | "unsubscribe", "exchange_ids": [...]}
+        and receive a snapshot per newly subscribed exchange followed by its
+        lifecycle events. Connecting counts against the partner's rate limit
+        and is metered like an HTTP request (101 accepted, 429 limited); the
+        socket is closed on binary frames.
+        """
+        try:
+            partner, _, _, retry_after = await authorize_partner(x_api_key or api_key)
+        except HTTPException:
+            await websocket.close(code=1008)
+            return
+        # PartnerUsageMiddleware only sees HTTP requests
+        usage_meter.record(partner["id"], "ws", "", 429 if retry_after else 101)
+        if retry_after:
+            # Try again later
+            await websocket.close(code=1013)
+            return
+        
+        await websocket.accept()
+        subscription = Subscription()
+        sender = asyncio.create_task(send_events(websocket, subscription))
+        try:
+            while True:
+                frame = await websocket.receive()
+                if frame["type"] == "websocket.disconnect":
+                    break
+                if frame.get("text") is None:
+                    # Unsupported data: only JSON text messages are understood
+                    await websocket.close(code=1003)
+                    break
+                try:
+                    message = json.loads(frame["text"])
+                    action = message.get("action")
+                    exchange_ids = [str(i) for i in message.get("exchange_ids", [])]
+                except (ValueError, AttributeError, TypeError):
+                    await websocket.send_json({"type": "error", "message": "Invalid message"})
+                    continue
+                
+                if action == "unsubscribe":
+                    exchange_events.unsubscribe(subscription, exchange_ids)
+                    continue
+                if action != "subscribe":
+                    await websocket.send_json({"type": "error", "message": f"Unknown action: {action}"})
+                    continue
+                
+                for exchange_id in exchange_ids:
+                    if exchange_id in subscription.exchange_ids:
+                        continue
+                    if len(subscription.exchange_ids) >= MAX_SOCKET_SUBSCRIPTIONS:
+                        await websocket.send_json({"type": "error", "message": "Subscription limit reached"})
+                        break
+                    status = await exchange_events.get(db, exchange_id)
+                    if not status:
+                        await websocket.send_json({"type": "error", "exchange_id": exchange_id, "message": "Exchange not found"})
+                        continue
+                    exchange_events.subscribe(subscription, [exchange_id])
+                    subscription.offer({"type": "snapshot", "exchange_id": exchange_id, "data": status})
+        except WebSocketDisconnect:
+            pass
+        finally:
+            sender.cancel()
+            exchange_events.unsubscribe(subscription)
+    
     return router
\ No newline at end of file
@@ -0,0 +1,96 @@
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from cache_bus import cache_bus
+from metrics import cache_requests
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "partners"
+
+# Characters of the key kept in clear so admins can tell keys apart
+KEY_PREFIX_LENGTH = 8
+# What partner API handlers get; never the key hash or secrets
+PARTNER_PRINCIPAL_PROJECTION = {"_id": 0, "api_key_hash": 0, "api_secret": 0, "search_terms": 0}
+
+
+def api_key_hash(api_key: str) -> str:
+    """Keys are random UUIDs, so a plain SHA-256 is enough to make the stored form useless"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+def stored_key_fields(api_key: str) -> Dict[str, str]:
+    """What a partner document stores in place of the plaintext key"""
+    return {"api_key_hash": api_key_hash(api_key), "api_key_prefix": api_key[:KEY_PREFIX_LENGTH]}
+
+
+class PartnerKeyCache:
+    """Active partners keyed by the hash of their API key.
+
+    A hit needs no Mongo read, so steady-state partner traffic costs nothing
+    beyond the hash. Updating or deleting a partner drops its entry here and,
+    through the cache bus, on the other workers; the TTL bounds staleness if
+    a broadcast is lost.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    async def authenticate(self, db: AsyncIOMotorDatabase, api_key: str) -> Optional[Dict[str, Any]]:
+        key = api_key_hash(api_key)
+        entry = self._entries.get(key)
+        if entry and time.monotonic() < entry[0]:
+            cache_requests.inc("partner_keys", "hit")
+            self._entries.move_to_end(key)
+            return dict(entry[1])
+        if entry:
+            del self._entries[key]
+
+        cache_requests.inc("partner_keys", "miss")
+        partner = await db.partners.find_one({"api_key_hash": key, "status": "active"}, PARTNER_PRINCIPAL_PROJECTION)
+        if partner:
+            self._entries[key] = (time.monotonic() + self.ttl, dict(partner))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return partner
+
+    def invalidate_partner(self, partner_id: str):
+        stale = [key for key, (_, partner) in self._entries.items() if partner.get("id") == partner_id]
+        for key in stale:
+            del self._entries[key]
+
+
+# Global instance
+partner_key_cache = PartnerKeyCache(ttl=float(os.getenv("PARTNER_KEY_CACHE_SECONDS", "60")))
+cache_bus.subscribe(CHANNEL, partner_key_cache.invalidate_partner)
+
+
+async def notify_partner_changed(partner_id: str):
+    """Call after any write to a partner (status, commission, deletion)"""
+    partner_key_cache.invalidate_partner(partner_id)
+    await cache_bus.publish(CHANNEL, partner_id)
+
+
+async def hash_stored_keys(db: AsyncIOMotorDatabase):
+    """Replace plaintext keys of partners created before keys were hashed"""
+    migrated = 0
+    try:
+        async for partner in db.partners.find({"api_key": {"$exists": True}}, {"id": 1, "api_key": 1}):
+            await db.partners.update_one(
+                {"id": partner["id"], "api_key": partner["api_key"]},
+                {"$set": stored_key_fields(partner["api_key"]), "$unset": {"api_key": ""}}
+            )
+            migrated += 1
+    except Exception as e:
+        logger.error(f"Partner API key migration failed: {e}")
+    if migrated:
+        logger.info(f"Hashed API keys of {migrated} partners")
@@ -0,0 +1,80 @@
+import logging
+import re
+from typing import Any, Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from fast_json import PARTNER_PROJECTION
+from pagination import KEYSET_SORT
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELDS = ("name", "email", "company")
+# Longest indexed prefix; longer query words are cut to match
+MAX_PREFIX = 15
+# Matches ranked per search; the index returns them newest first
+MAX_CANDIDATES = 200
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def words(text: str) -> List[str]:
+    return _WORD.findall((text or "").lower())
+
+
+def search_terms(partner: Dict[str, Any]) -> List[str]:
+    """Every prefix of every word in the searchable fields (edge n-grams)"""
+    terms = set()
+    for field in SEARCH_FIELDS:
+        for word in words(partner.get(field)):
+            for length in range(1, min(len(word), MAX_PREFIX) + 1):
+                terms.add(word[:length])
+    return sorted(terms)
+
+
+def search_query(text: str) -> Dict[str, Any]:
+    """Partners whose words start with every word of text; served by the search_terms index"""
+    tokens = sorted({word[:MAX_PREFIX] for word in words(text)})
+    if not tokens:
+        return {}
+    return {"search_terms": {"$all": tokens}}
+
+
+def rank(partner: Dict[str, Any], tokens: List[str]) -> int:
+    """Whole-word hits beat prefix hits, and hits in the name beat the rest"""
+    name_words = words(partner.get("name"))
+    other_words = words(partner.get("email")) + words(partner.get("company"))
+    score = 0
+    for token in tokens:
+        if token in name_words:
+            score += 4
+        elif token in other_words:
+            score += 3
+        elif any(word.startswith(token) for word in name_words):
+            score += 2
+        else:
+            score += 1
+    return score
+
+
+async def search_partners(db: AsyncIOMotorDatabase, text: str, limit: int = 20) -> List[Dict[str, Any]]:
+    query = search_query(text)
+    if not query:
+        return []
+    candidates = await db.partners.find(query, PARTNER_PROJECTION).sort(KEYSET_SORT).limit(MAX_CANDIDATES).to_list(MAX_CANDIDATES)
+    tokens = words(text)
+    # sorted() is stable, so equal scores stay newest first
+    return sorted(candidates, key=lambda partner: rank(partner, tokens), reverse=True)[:limit]
+
+
+async def backfill_search_terms(db: AsyncIOMotorDatabase):
+    """Index partners created before search_terms existed"""
+    updated = 0
+    try:
+        async for partner in db.partners.find({"search_terms": {"$exists": False}}, {"id": 1, **{f: 1 for f in SEARCH_FIELDS}}):
+            await db.partners.update_one({"id": partner["id"]}, {"$set": {"search_terms": search_terms(partner)}})
+            updated += 1
+    except Exception as e:
+        logger.error(f"Partner search backfill failed: {e}")
+    if updated:
+        logger.info(f"Indexed {updated} partners for search")
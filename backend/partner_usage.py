@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from exchange_settings import settings_service
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "partner_usage"
+PATH_PREFIX = "/api/partner/"
+
+# (partner_id, minute, endpoint, pair, status)
+BucketKey = Tuple[str, datetime, str, str, int]
+
+
+def rate_limit_for(partner: Dict[str, Any]) -> int:
+    """Requests per minute allowed for a partner; unset or 0 means the settings default"""
+    return partner.get("rate_limit_per_minute") or settings_service.settings.default_partner_rate_limit
+
+
+class SlidingWindowLimiter:
+    """Per-partner request limits over a sliding window, held in memory.
+
+    Each partner has two fixed-window counters; the previous window counts
+    in proportion to how much of it still overlaps the sliding window. That
+    is O(1) memory per partner and needs no lock since it only runs on the
+    event loop. Limits apply per worker process.
+    """
+
+    def __init__(self, window: float = 60.0):
+        self.window = window
+        # partner_id -> [window index, requests in it, requests in the one before]
+        self._counters: Dict[str, List[float]] = {}
+
+    def hit(self, key: str, limit: int, now: Optional[float] = None) -> Tuple[bool, int, int]:
+        """Count one request; returns (allowed, remaining, retry_after_seconds)"""
+        now = time.time() if now is None else now
+        index, offset = divmod(now, self.window)
+        counter = self._counters.get(key)
+        if counter is None or counter[0] < index - 1:
+            counter = [index, 0, 0]
+        elif counter[0] == index - 1:
+            counter = [index, 0, counter[1]]
+        self._counters[key] = counter
+
+        current, previous = counter[1], counter[2]
+        used = previous * (1 - offset / self.window) + current
+        if used >= limit:
+            if current >= limit or not previous:
+                wait = self.window - offset
+            else:
+                # Until enough of the previous window has slid out
+                wait = self.window * (1 - (limit - current) / previous) - offset
+            return False, 0, max(1, math.ceil(wait))
+        counter[1] += 1
+        return True, max(0, int(limit - used - 1)), 0
+
+
+class UsageMeter:
+    """Partner request counts per minute, endpoint, pair and status code.
+
+    record() only bumps an in-process counter. A background task writes the
+    counters accumulated since the last flush with one unordered bulk of
+    $inc upserts every flush_interval seconds, so metering adds no database
+    write to the request path. Counts that fail to flush are merged back;
+    beyond max_buckets pending buckets new ones are dropped and logged.
+    """
+
+    def __init__(self, flush_interval: float = 5.0, max_buckets: int = 100000):
+        self.flush_interval = flush_interval
+        self.max_buckets = max_buckets
+        self.dropped = 0
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self._counts: Dict[BucketKey, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, partner_id: str, endpoint: str, pair: str, status: int, count: int = 1):
+        key = (partner_id, datetime.utcnow().replace(second=0, microsecond=0), endpoint, pair, status)
+        if key not in self._counts and len(self._counts) >= self.max_buckets:
+            self.dropped += count
+            logger.error(f"Partner usage buffer full, dropped {self.dropped} requests so far")
+            return
+        self._counts[key] = self._counts.get(key, 0) + count
+
+    async def flush(self):
+        if not self._counts or self.db is None:
+            return
+        counts, self._counts = self._counts, {}
+        keys = list(counts)
+        operations = [
+            UpdateOne(
+                {"partner_id": key[0], "minute": key[1], "endpoint": key[2], "pair": key[3], "status": key[4]},
+                {"$inc": {"count": counts[key]}},
+                upsert=True
+            )
+            for key in keys
+        ]
+        try:
+            await self.db[COLLECTION].bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            failed = [keys[error["index"]] for error in e.details.get("writeErrors", [])]
+            self._merge({key: counts[key] for key in failed})
+            logger.error(f"Partner usage flush failed for {len(failed)} buckets: {e}")
+        except Exception as e:
+            self._merge(counts)
+            logger.error(f"Partner usage flush failed: {e}")
+
+    def _merge(self, counts: Dict[BucketKey, int]):
+        for key, count in counts.items():
+            self._counts[key] = self._counts.get(key, 0) + count
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        if self._task:
+            return
+        self.db = db
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+class PartnerUsageMiddleware:
+    """Pure ASGI middleware metering partner API responses.
+
+    verify_partner_api_key leaves the partner id and its rate limit state in
+    the request state; this adds the X-RateLimit headers and records the
+    final status code once the response has started.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(PATH_PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                rate_limit = scope.get("state", {}).get("rate_limit")
+                if rate_limit:
+                    message = {**message, "headers": [
+                        *message.get("headers", []),
+                        (b"x-ratelimit-limit", str(rate_limit[0]).encode()),
+                        (b"x-ratelimit-remaining", str(rate_limit[1]).encode())
+                    ]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            partner_id = scope.get("state", {}).get("partner_id")
+            if partner_id:
+                query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+                from_currency = query.get("from_currency", [""])[0].upper()
+                to_currency = query.get("to_currency", [""])[0].upper()
+                pair = f"{from_currency}/{to_currency}" if from_currency and to_currency else ""
+                usage_meter.record(partner_id, scope["path"][len(PATH_PREFIX):], pair, status[0])
+
+
+async def usage_report(db: AsyncIOMotorDatabase, partner_id: str, start: datetime, end: datetime) -> Dict[str, Any]:
+    """Flushed usage of one partner in [start, end), by endpoint and status, pair and hour"""
+    pipeline = [
+        {"$match": {"partner_id": partner_id, "minute": {"$gte": start, "$lt": end}}},
+        {"$facet": {
+            "endpoints": [
+                {"$group": {"_id": {"endpoint": "$endpoint", "status": "$status"}, "count": {"$sum": "$count"}}},
+                {"$sort": {"count": -1}}
+            ],
+            "pairs": [
+                {"$match": {"pair": {"$ne": ""}}},
+                {"$group": {"_id": "$pair", "count": {"$sum": "$count"}}},
+                {"$sort": {"count": -1}},
+                {"$limit": 20}
+            ],
+            "hours": [
+                {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%dT%H:00:00", "date": "$minute"}}, "count": {"$sum": "$count"}}},
+                {"$sort": {"_id": 1}}
+            ]
+        }}
+    ]
+    result = (await db[COLLECTION].aggregate(pipeline).to_list(1))[0]
+    endpoints = [{**row["_id"], "count": row["count"]} for row in result["endpoints"]]
+    return {
+        "total": sum(row["count"] for row in endpoints),
+        "rate_limited": sum(row["count"] for row in endpoints if row["status"] == 429),
+        "endpoints": endpoints,
+        "pairs": [{"pair": row["_id"], "count": row["count"]} for row in result["pairs"]],
+        "hours": [{"hour": row["_id"], "count": row["count"]} for row in result["hours"]]
+    }
+
+
+# Global instances
+rate_limiter = SlidingWindowLimiter()
+usage_meter = UsageMeter(flush_interval=float(os.getenv("PARTNER_USAGE_FLUSH_SECONDS", "5")))
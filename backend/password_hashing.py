@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Optional
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+
+class HasherBusyError(Exception):
+    """Raised when more hashing requests are queued than the hasher accepts"""
+
+
+class PasswordHasher:
+    """bcrypt on a small dedicated thread pool.
+
+    bcrypt releases the GIL, so a couple of threads keep the event loop free
+    while a login is being checked. At most `max_pending` calls may be running
+    or queued; further calls fail fast with HasherBusyError instead of piling
+    up behind the pool.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 32):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self.pending >= self.max_pending:
+            raise HasherBusyError()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt())
+        return hashed.decode('utf-8')
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(bcrypt.checkpw, password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class LoginAttemptLimiter:
+    """Sliding-window limit on failed logins per username and client address.
+
+    Only failures count; a successful login clears the key. Keying by address
+    too means failures from one client cannot lock the account out for
+    everyone else. Setting max_failures to 0 disables the limiter, which is
+    the default.
+    """
+
+    def __init__(self, max_failures: int = 5, window: float = 300.0, max_tracked: int = 10000):
+        self.max_failures = max_failures
+        self.window = window
+        self.max_tracked = max_tracked
+        self._failures: "OrderedDict[str, Deque[float]]" = OrderedDict()
+
+    @staticmethod
+    def key(username: str, client_host: Optional[str]) -> str:
+        return f"{username}|{client_host or ''}"
+
+    def retry_after(self, key: str) -> int:
+        """Seconds until the key may try again, or 0 if it may try now"""
+        if not self.max_failures:
+            return 0
+        failures = self._failures.get(key)
+        if not failures:
+            return 0
+        now = time.monotonic()
+        while failures and now - failures[0] >= self.window:
+            failures.popleft()
+        if len(failures) < self.max_failures:
+            return 0
+        return int(self.window - (now - failures[0])) + 1
+
+    def record_failure(self, key: str):
+        if not self.max_failures:
+            return
+        failures = self._failures.setdefault(key, deque(maxlen=self.max_failures))
+        failures.append(time.monotonic())
+        self._failures.move_to_end(key)
+        while len(self._failures) > self.max_tracked:
+            self._failures.popitem(last=False)
+
+    def record_success(self, key: str):
+        self._failures.pop(key, None)
+
+
+# Global instances
+password_hasher = PasswordHasher(
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", "2")),
+    max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+)
+login_limiter = LoginAttemptLimiter(
+    max_failures=int(os.getenv("LOGIN_MAX_FAILURES", "0")),
+    window=float(os.getenv("LOGIN_FAILURE_WINDOW_SECONDS", "300"))
+)
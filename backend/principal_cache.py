@@ -0,0 +1,74 @@
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from cache_bus import cache_bus
+from metrics import cache_requests
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "admin_users"
+
+# Loaded once per token instead of once per request
+ADMIN_PRINCIPAL_PROJECTION = {"_id": 0, "password_hash": 0}
+
+
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class PrincipalCache:
+    """Verified admin principals keyed by a hash of the bearer token.
+
+    An entry lives for at most `ttl` seconds and never past the token's own
+    expiry, so a hit stands for both a valid signature and an active user.
+    Changing or deactivating an admin drops every entry for that username
+    here and, through the cache bus, on the other workers.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = token_key(token)
+        entry = self._entries.get(key)
+        if entry and time.monotonic() < entry[0]:
+            cache_requests.inc("admin_principals", "hit")
+            self._entries.move_to_end(key)
+            # Handlers may edit the principal they are given
+            return dict(entry[1])
+        if entry:
+            del self._entries[key]
+        cache_requests.inc("admin_principals", "miss")
+        return None
+
+    def put(self, token: str, admin: Dict[str, Any], token_expires_at: float):
+        lifetime = min(self.ttl, token_expires_at - time.time())
+        if lifetime <= 0:
+            return
+        key = token_key(token)
+        self._entries[key] = (time.monotonic() + lifetime, dict(admin))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate_user(self, username: str):
+        stale = [key for key, (_, admin) in self._entries.items() if admin.get("username") == username]
+        for key in stale:
+            del self._entries[key]
+
+
+# Global instance
+principal_cache = PrincipalCache(ttl=float(os.getenv("ADMIN_PRINCIPAL_CACHE_SECONDS", "60")))
+cache_bus.subscribe(CHANNEL, principal_cache.invalidate_user)
+
+
+async def notify_admin_changed(username: str):
+    """Call after any write to an admin user (role, password, is_active, last_login)"""
+    principal_cache.invalidate_user(username)
+    await cache_bus.publish(CHANNEL, username)
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Header, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
@@ -19,6 +19,24 @@ import sys
 # Add the backend directory to the path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from kucoin_service import blockchain_monitor
+from deposit_monitor import DepositMonitor, shard_for
+from exchange_events import exchange_events, Subscription, send_events
+from db_indexes import provision_indexes
+from fast_json import FastJSONResponse
+from idempotency import IdempotencyStore, IdempotencyError
+from currency_catalog import currency_catalog
+from cache_bus import cache_bus
+from exchange_cache import exchange_cache, watch_remote_changes
+import metrics
+from loop_watchdog import loop_watchdog
+from password_hashing import password_hasher
+from stats_engine import stats_engine, usd_figures
+from partner_search import backfill_search_terms
+from partner_auth import hash_stored_keys, partner_key_cache, PARTNER_PRINCIPAL_PROJECTION
+from audit_log import audit_log
+from exchange_settings import settings_service
+from partner_usage import PartnerUsageMiddleware, usage_meter
+from admin_feed import admin_feed
 from crypto_rates_service import kucoin_rates_service
 from admin_api import create_admin_router
 from partner_api import create_partner_api_router
@@ -28,12 +46,18 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[metrics.MongoCommandMetrics()])
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
 app = FastAPI(title="CARTEL - Cryptocurrency Exchange API")
 
+# Per-partner usage metering and rate limit headers for /api/partner
+app.add_middleware(PartnerUsageMiddleware)
+
+# Per-route request counts and latency for /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -43,6 +67,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Replays exchange creation for retried requests carrying an Idempotency-Key
+exchange_idempotency = IdempotencyStore(db, scope="create_exchange")
+
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
@@ -81,6 +108,8 @@ class ExchangeCreate(BaseModel):
     refund_address: Optional[str] = None
     email: Optional[str] = None
     rate_type: str = "float"
+    # Partner referral code from a ?ref= link
+    referral_code: Optional[str] = None
 
 class Exchange(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -95,60 +124,11 @@ class Exchange(BaseModel):
     status: str = "waiting"
     created_at: datetime = Field(default_factory=datetime.utcnow)
     deposit_address: Optional[str] = None
+    partner_id: Optional[str] = None
+    version: int = 1
 
-# Supported currencies
-SUPPORTED_CURRENCIES = [
-    {
-        "currency": "BTC",
-        "name": "Bitcoin",
-        "networks": [{"chain": "BTC", "name": "Bitcoin Network"}]
-    },
-    {
-        "currency": "ETH", 
-        "name": "Ethereum",
-        "networks": [{"chain": "ETH", "name": "Ethereum Network"}]
-    },
-    {
-        "currency": "XMR",
-        "name": "Monero", 
-        "networks": [{"chain": "XMR", "name": "Monero Network"}]
-    },
-    {
-        "currency": "LTC",
-        "name": "Litecoin",
-        "networks": [{"chain": "LTC", "name": "Litecoin Network"}]
-    },
-    {
-        "currency": "XRP",
-        "name": "Ripple",
-        "networks": [{"chain": "XRP", "name": "Ripple Network"}]
-    },
-    {
-        "currency": "DOGE",
-        "name": "Dogecoin",
-        "networks": [{"chain": "DOGE", "name": "Dogecoin Network"}]
-    },
-    {
-        "currency": "USDT-ERC20",
-        "name": "Tether USD (ERC20)",
-        "networks": [{"chain": "ETH", "name": "Ethereum Network"}]
-    },
-    {
-        "currency": "USDC-ERC20",
-        "name": "USD Coin (ERC20)",
-        "networks": [{"chain": "ETH", "name": "Ethereum Network"}]
-    },
-    {
-        "currency": "USDT-TRX",
-        "name": "Tether USD (TRX)",
-        "networks": [{"chain": "TRX", "name": "Tron Network"}]
-    },
-    {
-        "currency": "TRX",
-        "name": "Tron",
-        "networks": [{"chain": "TRX", "name": "Tron Network"}]
-    }
-]
+# Longest a status request may be held open
+MAX_STATUS_WAIT = 60
 
 # Demo exchange rates
 DEMO_RATES = {
@@ -184,6 +164,9 @@ DEMO_RATES = {
     'DOGE_XRP': 0.243
 }
 
+# Longest exchange creation waits on the USD price used for analytics
+USD_PRICE_TIMEOUT = 2.0
+
 def get_required_confirmations(currency: str) -> int:
     """Get required confirmations for each currency"""
     confirmations = {
@@ -222,13 +205,13 @@ async def root():
     return {"message": "CARTEL Exchange API v1.0"}
 
 @api_router.get("/currencies")
-async def get_currencies():
-    """Get list of supported currencies"""
-    return {
-        "code": "200000",
-        "message": "Success", 
-        "data": SUPPORTED_CURRENCIES
-    }
+async def get_currencies(request: Request):
+    """Get list of supported currencies (active and visible currency tokens)"""
+    try:
+        return await currency_catalog.public_response(db, request)
+    except Exception as e:
+        logger.error(f"Error getting currencies: {e}")
+        raise HTTPException(status_code=500, detail="Error getting currencies")
 
 @api_router.get("/price")
 async def get_exchange_rate(from_currency: str, to_currency: str, rate_type: str = "float"):
@@ -264,15 +247,9 @@ async def get_exchange_rate(from_currency: str, to_currency: str, rate_type: str
                     detail=f"Exchange rate service temporarily unavailable. Unable to get rate for {from_curr}/{to_curr}"
                 )
         
-        # Apply fees based on rate type
-        if rate_type == "fixed":
-            # Fixed rate: 2% fee
-            final_rate = base_rate * 0.98
-            fee_percentage = 2.0
-        else:
-            # Float rate: 1% fee  
-            final_rate = base_rate * 0.99
-            fee_percentage = 1.0
+        # Apply the configured markup and the fee for the rate type
+        fee_percentage = settings_service.fee_percentage(rate_type)
+        final_rate = settings_service.apply_fee(settings_service.public_rate(base_rate), rate_type)
         
         return {
             "code": "200000",
@@ -281,6 +258,7 @@ async def get_exchange_rate(from_currency: str, to_currency: str, rate_type: str
                 "rate": round(final_rate, 8),
                 "base_rate": round(base_rate, 8),
                 "fee_percentage": fee_percentage,
+                "markup_percentage": settings_service.settings.rate_markup_percentage,
                 "rate_type": rate_type,
                 "from_currency": from_curr,
                 "to_currency": to_curr,
@@ -295,55 +273,162 @@ async def get_exchange_rate(from_currency: str, to_currency: str, rate_type: str
         raise HTTPException(status_code=500, detail="Error getting exchange rate")
 
 @api_router.post("/exchange", response_model=Exchange)
-async def create_exchange(exchange_data: ExchangeCreate):
-    """Create a new exchange"""
+async def create_exchange(
+    exchange_data: ExchangeCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    x_api_key: Optional[str] = Header(None)
+):
+    """Create a new exchange.
+
+    Requests that repeat an Idempotency-Key get the original exchange back
+    without a second insert. Exchanges created with a partner API key or a
+    partner referral code are credited to that partner.
+    """
     try:
-        # Generate deposit address
-        from_currency = exchange_data.from_currency.upper()
+        partner = await resolve_partner(exchange_data.referral_code, x_api_key)
+        if not idempotency_key:
+            return await insert_exchange(exchange_data, partner=partner)
         
-        # Use real deposit addresses for all currencies
-        deposit_address = generate_deposit_address(from_currency)
-        
-        # Create exchange object
-        exchange = Exchange(
-            from_currency=from_currency,
-            to_currency=exchange_data.to_currency.upper(),
-            from_amount=exchange_data.from_amount,
-            to_amount=exchange_data.to_amount,
-            receiving_address=exchange_data.receiving_address,
-            refund_address=exchange_data.refund_address,
-            email=exchange_data.email,
-            rate_type=exchange_data.rate_type,
-            deposit_address=deposit_address,
-            status="waiting"
+        exchange, replayed = await exchange_idempotency.run(
+            idempotency_key,
+            exchange_data.dict(),
+            lambda stored: insert_exchange(exchange_data, stored, partner)
         )
-        
-        # Save to database
-        await db.exchanges.insert_one(exchange.dict())
-        
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
         return exchange
         
+    except HTTPException:
+        raise
+    except IdempotencyError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         logging.error(f"Error creating exchange: {e}")
         raise HTTPException(status_code=500, detail="Error creating exchange")
 
+async def get_usd_price(currency: str) -> Optional[float]:
+    """Current USD price for analytics; never holds up exchange creation for long"""
+    try:
+        return await asyncio.wait_for(kucoin_rates_service.get_usd_price(currency), USD_PRICE_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"No USD price for {currency}, exchange recorded without USD value: {e}")
+        return None
+
+async def resolve_partner(referral_code: Optional[str], api_key: Optional[str]) -> Optional[dict]:
+    """Partner credited with a new exchange: the API key's owner, else the referral code's"""
+    if api_key:
+        partner = await partner_key_cache.authenticate(db, api_key)
+        if not partner:
+            raise HTTPException(status_code=401, detail="Invalid or inactive API key")
+        return partner
+    if referral_code:
+        # Unknown or inactive codes still create an unattributed exchange
+        return await db.partners.find_one(
+            {"referral_code": referral_code.strip().upper(), "status": "active"},
+            PARTNER_PRINCIPAL_PROJECTION
+        )
+    return None
+
+async def insert_exchange(exchange_data: ExchangeCreate, stored=None, partner: Optional[dict] = None) -> dict:
+    """Build and store a new exchange document; awaits stored(exchange) right after the insert"""
+    # Generate deposit address
+    from_currency = exchange_data.from_currency.upper()
+    
+    # Use real deposit addresses for all currencies
+    deposit_address = generate_deposit_address(from_currency)
+    
+    # Create exchange object
+    exchange = Exchange(
+        from_currency=from_currency,
+        to_currency=exchange_data.to_currency.upper(),
+        from_amount=exchange_data.from_amount,
+        to_amount=exchange_data.to_amount,
+        receiving_address=exchange_data.receiving_address,
+        refund_address=exchange_data.refund_address,
+        email=exchange_data.email,
+        rate_type=exchange_data.rate_type,
+        deposit_address=deposit_address,
+        status="waiting",
+        partner_id=partner["id"] if partner else None
+    )
+    
+    # Save to database with the monitor shard that will watch its deposit address
+    # and the USD value at creation time for the analytics buckets
+    exchange_doc = exchange.dict()
+    exchange_doc["monitor_shard"] = shard_for(from_currency, deposit_address)
+    exchange_doc["usd"] = usd_figures(
+        exchange.from_amount,
+        await get_usd_price(from_currency),
+        settings_service.fee_percentage(exchange.rate_type),
+        partner.get("commission_rate", 0.0) if partner else 0.0
+    )
+    await db.exchanges.insert_one(exchange_doc)
+    
+    exchange_dict = exchange.dict()
+    if stored:
+        await stored(exchange_dict)
+    exchange_cache.put(exchange_dict)
+    await stats_engine.record_created(db, exchange_doc)
+    return exchange_dict
+
 @api_router.get("/exchange/{exchange_id}")
 async def get_exchange(exchange_id: str):
     """Get exchange by ID"""
     try:
-        exchange = await db.exchanges.find_one({"id": exchange_id})
+        exchange = await exchange_cache.get(db, exchange_id)
         if not exchange:
             raise HTTPException(status_code=404, detail="Exchange not found")
         
-        # Remove MongoDB ObjectId from response to avoid JSON serialization issues
-        if "_id" in exchange:
-            del exchange["_id"]
-            
-        return exchange
+        return FastJSONResponse(exchange)
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error getting exchange: {e}")
         raise HTTPException(status_code=500, detail="Error getting exchange")
 
+@api_router.get("/exchange/{exchange_id}/status")
+async def get_exchange_status(exchange_id: str, wait: float = 0, since: Optional[int] = None):
+    """Get exchange status, optionally holding the request until it changes.
+
+    With wait and since, the request returns as soon as the exchange version
+    differs from since, or with the unchanged status once wait seconds pass.
+    """
+    try:
+        wait = min(max(wait, 0), MAX_STATUS_WAIT)
+        status = await exchange_events.wait(db, exchange_id, since, wait)
+        if not status:
+            raise HTTPException(status_code=404, detail="Exchange not found")
+        return status
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error getting exchange status: {e}")
+        raise HTTPException(status_code=500, detail="Error getting exchange status")
+
+@api_router.websocket("/exchange/{exchange_id}/ws")
+async def exchange_events_ws(websocket: WebSocket, exchange_id: str):
+    """Push status, detection, confirmation and payout events for one exchange"""
+    status = await exchange_events.get(db, exchange_id)
+    if not status:
+        await websocket.close(code=1008)
+        return
+    
+    await websocket.accept()
+    subscription = Subscription()
+    exchange_events.subscribe(subscription, [exchange_id])
+    subscription.offer({"type": "snapshot", "exchange_id": exchange_id, "data": status})
+    sender = asyncio.create_task(send_events(websocket, subscription))
+    try:
+        # Incoming messages are ignored; reading notices disconnects right away
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        exchange_events.unsubscribe(subscription)
+
 # Legacy status check endpoints (for backward compatibility)
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
@@ -367,6 +452,51 @@ app.include_router(admin_router)
 # Include Partner API routes
 app.include_router(partner_api_router)
 
+# Deposit monitor (each worker only scans the shards it holds a lease on)
+deposit_monitor = DepositMonitor(db, blockchain_monitor, get_required_confirmations)
+
+@app.on_event("startup")
+async def startup():
+    # Build indexes in the background so startup is not blocked on large collections
+    app.state.index_task = asyncio.create_task(provision_indexes(db))
+    app.state.search_backfill_task = asyncio.create_task(backfill_search_terms(db))
+    # Partner keys are looked up by hash, so legacy plaintext keys must be hashed before serving
+    await hash_stored_keys(db)
+    # Cross-worker invalidation for the exchange cache and status hub
+    watch_remote_changes(db)
+    await cache_bus.start(db)
+    await settings_service.start(db)
+    await stats_engine.start(db)
+    await audit_log.start(db)
+    await usage_meter.start(db)
+    await admin_feed.start(db)
+    app.state.loop_lag_task = asyncio.create_task(metrics.sample_loop_lag())
+    if os.getenv("LOOP_DIAGNOSTICS_ENABLED", "false").lower() == "true":
+        loop_watchdog.start()
+    if os.getenv("DEPOSIT_MONITOR_ENABLED", "true").lower() == "true":
+        await deposit_monitor.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await deposit_monitor.stop()
+    loop_watchdog.stop()
+    await cache_bus.stop()
+    await settings_service.stop()
+    await stats_engine.stop()
+    await audit_log.stop()
+    await usage_meter.stop()
+    await admin_feed.stop()
+    await blockchain_monitor.close()
+    password_hasher.shutdown()
+    client.close()
+
+@app.get("/metrics")
+async def get_metrics(request: Request):
+    """Prometheus text exposition of request, upstream, cache, Mongo and loop metrics"""
+    if not metrics.scrape_allowed(request, os.getenv("METRICS_TOKEN")):
+        raise HTTPException(status_code=403, detail="Metrics are only available to internal scrapers")
+    return Response(content=metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     return {"message": "CARTEL Exchange API", "version": "1.0.0", "status": "operational"}
@@ -0,0 +1,401 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from fast_json import EXCHANGE_PROJECTION
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "exchange_stats"
+TOTALS_ID = "totals"
+RECENT_LIMIT = 10
+TOP_CURRENCIES = 5
+# Volume and commission count once an exchange has paid out
+VOLUME_STATUS = "completed"
+# Hour and day buckets older than this are left as incrementally maintained
+RECONCILE_DAYS = 40
+USD_FIELDS = ("volume_usd", "commission_usd", "partner_commission_usd")
+
+
+def hour_key(moment: datetime) -> str:
+    return "hour:" + moment.strftime("%Y-%m-%dT%H")
+
+
+def day_key(moment: datetime) -> str:
+    return "day:" + moment.strftime("%Y-%m-%d")
+
+
+def month_key(moment: datetime) -> str:
+    return "month:" + moment.strftime("%Y-%m")
+
+
+def bucket_keys(moment: datetime) -> List[str]:
+    return [hour_key(moment), day_key(moment), month_key(moment)]
+
+
+def field_key(value: Any) -> str:
+    """Make a currency, status or partner id usable as a document field name"""
+    return str(value).replace(".", "_").replace("$", "_")
+
+
+def next_month(moment: datetime) -> datetime:
+    return (moment.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def covering_buckets(start: datetime, end: datetime) -> List[str]:
+    """Fewest hour/day/month buckets that cover [start, end).
+
+    Both ends are widened to whole hours, so a range costs at most a couple
+    of dozen hour and day documents at its edges plus whole months between.
+    """
+    moment = start.replace(minute=0, second=0, microsecond=0)
+    if end.replace(minute=0, second=0, microsecond=0) != end:
+        end = end.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    keys = []
+    while moment < end:
+        if moment.day == 1 and moment.hour == 0 and next_month(moment) <= end:
+            keys.append(month_key(moment))
+            moment = next_month(moment)
+        elif moment.hour == 0 and moment + timedelta(days=1) <= end:
+            keys.append(day_key(moment))
+            moment += timedelta(days=1)
+        else:
+            keys.append(hour_key(moment))
+            moment += timedelta(hours=1)
+    return keys
+
+
+def usd_figures(from_amount: float, usd_price: Optional[float], fee_percentage: float,
+                partner_commission_rate: float = 0.0) -> Dict[str, Any]:
+    """USD value of an exchange at creation time; stored on the exchange as `usd`"""
+    if usd_price is None:
+        return {"price": None, "volume_usd": 0.0, "commission_usd": 0.0, "partner_commission_usd": 0.0}
+    volume = from_amount * usd_price
+    commission = volume * fee_percentage / 100
+    return {
+        "price": usd_price,
+        "volume_usd": volume,
+        "commission_usd": commission,
+        "partner_commission_usd": commission * partner_commission_rate / 100
+    }
+
+
+def counters(status: str, currency: str, partner_id: Optional[str], count: int, amount: float,
+             usd: Dict[str, float]) -> Dict[str, float]:
+    """Dotted counter fields contributed by `count` exchanges in one status"""
+    status, currency = field_key(status), field_key(currency)
+    result = {
+        "exchanges": count,
+        f"by_status.{status}": count,
+        f"by_currency.{currency}.count": count,
+        f"by_currency.{currency}.total_amount": amount
+    }
+    if partner_id:
+        result[f"by_partner.{field_key(partner_id)}.count"] = count
+    if status == VOLUME_STATUS:
+        for field in USD_FIELDS:
+            result[field] = usd.get(field, 0.0)
+        result[f"by_currency.{currency}.volume_usd"] = usd.get("volume_usd", 0.0)
+        if partner_id:
+            result[f"by_partner.{field_key(partner_id)}.volume_usd"] = usd.get("volume_usd", 0.0)
+            result[f"by_partner.{field_key(partner_id)}.partner_commission_usd"] = usd.get("partner_commission_usd", 0.0)
+    return result
+
+
+def exchange_counters(exchange: Dict[str, Any], status: str, sign: int) -> Dict[str, float]:
+    usd = {field: sign * exchange.get("usd", {}).get(field, 0.0) for field in USD_FIELDS}
+    return counters(status, exchange["from_currency"], exchange.get("partner_id"),
+                    sign, sign * exchange["from_amount"], usd)
+
+
+def add_counters(target: Dict[str, float], source: Dict[str, float]):
+    for field, value in source.items():
+        target[field] = target.get(field, 0) + value
+
+
+def nest(dotted: Dict[str, float]) -> Dict[str, Any]:
+    """Turn {"a.b": 1} into {"a": {"b": 1}} for whole-document $set"""
+    nested: Dict[str, Any] = {}
+    for field, value in dotted.items():
+        parts = field.split(".")
+        target = nested
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return nested
+
+
+def summarize(documents: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Add up bucket documents into one report"""
+    total: Dict[str, float] = {}
+    for doc in documents:
+        for field in ("exchanges",) + USD_FIELDS:
+            total[field] = total.get(field, 0) + doc.get(field, 0)
+        for group in ("by_status", "by_currency", "by_partner"):
+            for key, value in doc.get(group, {}).items():
+                if isinstance(value, dict):
+                    for name, amount in value.items():
+                        add_counters(total, {f"{group}.{key}.{name}": amount})
+                else:
+                    add_counters(total, {f"{group}.{key}": value})
+    report = nest(total)
+    for field in ("exchanges",) + USD_FIELDS:
+        report.setdefault(field, 0)
+    for group in ("by_status", "by_currency", "by_partner"):
+        report.setdefault(group, {})
+    return report
+
+
+class StatsEngine:
+    """Materialized exchange statistics and USD analytics.
+
+    The exchange_stats collection holds one "totals" document plus a bucket
+    per creation hour, day and month. Each document counts exchanges by
+    status, currency and partner, and sums the USD volume and commissions of
+    completed exchanges, priced when they were created. Inserts and status
+    changes and admin edits apply small $inc deltas; a reconciliation job
+    periodically rebuilds the documents from streamed $group aggregations, so
+    counters that drifted (failed writes, manual edits) are corrected.
+
+    Every write bumps the document's `version`. Reconciliation reads the
+    versions before aggregating and only replaces documents whose version is
+    unchanged, so it never overwrites increments that landed meanwhile; those
+    documents are left for the next run.
+
+    The dashboard reads three documents in one query and any time range is
+    answered from the few buckets that cover it.
+    """
+
+    def __init__(self, reconcile_interval: float = 3600.0):
+        self.reconcile_interval = reconcile_interval
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def record_created(self, db: AsyncIOMotorDatabase, exchange: Dict[str, Any]):
+        increments = {**exchange_counters(exchange, exchange["status"], 1), "version": 1}
+        recent = {k: v for k, v in exchange.items() if k not in EXCHANGE_PROJECTION}
+        operations = [UpdateOne({"_id": TOTALS_ID}, {
+            "$inc": increments,
+            "$push": {"recent": {"$each": [recent], "$sort": {"created_at": -1}, "$slice": RECENT_LIMIT}}
+        }, upsert=True)]
+        operations += [
+            UpdateOne({"_id": key}, {"$inc": increments}, upsert=True)
+            for key in bucket_keys(exchange["created_at"])
+        ]
+        try:
+            await db[COLLECTION].bulk_write(operations, ordered=False)
+        except Exception as e:
+            # Reconciliation repairs the counters
+            logger.error(f"Stats update for exchange {exchange['id']} failed: {e}")
+
+    def _change_operations(self, exchange: Dict[str, Any], previous: Dict[str, Any]) -> List[UpdateOne]:
+        """Move an exchange's counters from its previous state (status, amount, usd, partner) to the new one"""
+        increments = exchange_counters(previous, previous["status"], -1)
+        add_counters(increments, exchange_counters(exchange, exchange["status"], 1))
+        increments = {field: value for field, value in increments.items() if value}
+        operations = []
+        if increments:
+            increments["version"] = 1
+            operations = [UpdateOne({"_id": key}, {"$inc": increments}, upsert=True)
+                          for key in [TOTALS_ID] + bucket_keys(exchange["created_at"])]
+        recent = {k: v for k, v in exchange.items() if k not in EXCHANGE_PROJECTION}
+        # Separate so a missing or trimmed recent list never blocks the counters
+        operations.append(UpdateOne(
+            {"_id": TOTALS_ID, "recent.id": exchange["id"]},
+            {"$set": {"recent.$": recent}, "$inc": {"version": 1}}
+        ))
+        return operations
+
+    async def record_status_change(self, db: AsyncIOMotorDatabase, exchange: Dict[str, Any], previous_status: str):
+        if exchange["status"] != previous_status:
+            await self.record_changes(db, [(exchange, {**exchange, "status": previous_status})])
+
+    async def record_change(self, db: AsyncIOMotorDatabase, exchange: Dict[str, Any], previous: Dict[str, Any]):
+        await self.record_changes(db, [(exchange, previous)])
+
+    async def record_changes(self, db: AsyncIOMotorDatabase, changes: List[Tuple[Dict[str, Any], Dict[str, Any]]]):
+        """Apply many (exchange, previous exchange) changes in one bulk_write"""
+        operations = [
+            operation
+            for exchange, previous in changes
+            for operation in self._change_operations(exchange, previous)
+        ]
+        if not operations:
+            return
+        try:
+            await db[COLLECTION].bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Stats update for {len(changes)} exchanges failed: {e}")
+
+    async def refresh_partners(self, db: AsyncIOMotorDatabase):
+        """Recount active partners after a partner is created, edited or removed"""
+        active_partners = await db.partners.count_documents({"status": "active"})
+        await db[COLLECTION].update_one(
+            {"_id": TOTALS_ID}, {"$set": {"active_partners": active_partners}, "$inc": {"version": 1}}, upsert=True
+        )
+
+    async def reconcile(self, db: AsyncIOMotorDatabase):
+        """Rebuild the stats documents from the exchanges collection.
+
+        Months and totals are rebuilt from the whole history; hour and day
+        buckets only for the last RECONCILE_DAYS days. The $group results are
+        streamed, so no single result document grows with the history, and
+        stats documents in that window that no exchange maps to any more are
+        reset to zero.
+        """
+        def grouped(date_format: str, match: Dict[str, Any]) -> List[Dict[str, Any]]:
+            return [{"$match": match}, {"$group": {
+                "_id": {
+                    "bucket": {"$dateToString": {"format": date_format, "date": "$created_at"}},
+                    "status": "$status",
+                    "currency": "$from_currency",
+                    "partner_id": "$partner_id"
+                },
+                "count": {"$sum": 1},
+                "amount": {"$sum": "$from_amount"},
+                **{field: {"$sum": {"$ifNull": [f"$usd.{field}", 0]}} for field in USD_FIELDS}
+            }}]
+
+        recent_start = (datetime.utcnow() - timedelta(days=RECONCILE_DAYS)).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        # Versions of every document this run may replace, read before aggregating
+        # (";" sorts right after ":", bounding each key prefix)
+        versions = {
+            doc["_id"]: doc.get("version")
+            async for doc in db[COLLECTION].find({"$or": [
+                {"_id": TOTALS_ID},
+                {"_id": {"$gte": "month:", "$lt": "month;"}},
+                {"_id": {"$gte": day_key(recent_start), "$lt": "day;"}},
+                {"_id": {"$gte": hour_key(recent_start), "$lt": "hour;"}}
+            ]}, {"version": 1})
+        }
+
+        buckets: Dict[str, Dict[str, float]] = {}
+        totals: Dict[str, float] = {}
+        for prefix, pipeline in (
+            ("month:", grouped("%Y-%m", {})),
+            ("hour:", grouped("%Y-%m-%dT%H", {"created_at": {"$gte": recent_start}}))
+        ):
+            async for row in db.exchanges.aggregate(pipeline, allowDiskUse=True):
+                key = row["_id"]
+                row_counters = counters(key["status"], key["currency"], key.get("partner_id"),
+                                        row["count"], row["amount"], row)
+                add_counters(buckets.setdefault(prefix + key["bucket"], {}), row_counters)
+                if prefix == "month:":
+                    add_counters(totals, row_counters)
+                else:
+                    add_counters(buckets.setdefault("day:" + key["bucket"][:10], {}), row_counters)
+        recent = await db.exchanges.find({}, EXCHANGE_PROJECTION).sort("created_at", -1).limit(RECENT_LIMIT).to_list(RECENT_LIMIT)
+
+        active_partners = await db.partners.count_documents({"status": "active"})
+        empty = {"exchanges": 0, "by_status": {}, "by_currency": {}, "by_partner": {}, **{f: 0 for f in USD_FIELDS}}
+        # Existing documents in the window that no exchange maps to any more
+        documents = {doc_id: dict(empty) for doc_id in versions}
+        documents[TOTALS_ID] = {
+            **empty,
+            **nest(totals),
+            "recent": recent,
+            "active_partners": active_partners,
+            "reconciled_at": datetime.utcnow()
+        }
+        documents.update((bucket_id, {**empty, **nest(bucket)}) for bucket_id, bucket in buckets.items())
+        # A missing version matches only a still missing (or legacy) document;
+        # if an increment created it meanwhile the upsert hits a duplicate _id
+        operations = [
+            UpdateOne(
+                {"_id": doc_id, "version": versions.get(doc_id)},
+                {"$set": {**doc, "version": (versions.get(doc_id) or 0) + 1}},
+                upsert=True
+            )
+            for doc_id, doc in documents.items()
+        ]
+        try:
+            result = await db[COLLECTION].bulk_write(operations, ordered=False)
+            replaced = result.matched_count + result.upserted_count
+        except BulkWriteError as e:
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+            replaced = e.details["nMatched"] + e.details["nUpserted"]
+        skipped = len(operations) - replaced
+        logger.info(f"Reconciled exchange stats ({len(buckets)} buckets, {skipped} changed meanwhile and skipped)")
+
+    async def read(self, db: AsyncIOMotorDatabase) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        today, month = day_key(now), month_key(now)
+        documents = {
+            doc["_id"]: doc
+            async for doc in db[COLLECTION].find({"_id": {"$in": [TOTALS_ID, today, month]}})
+        }
+        totals = documents.get(TOTALS_ID, {})
+        top_currencies = sorted(
+            ({"_id": currency, **values} for currency, values in totals.get("by_currency", {}).items()),
+            key=lambda row: row["count"], reverse=True
+        )[:TOP_CURRENCIES]
+        return {
+            "total_exchanges": totals.get("exchanges", 0),
+            "total_volume_usd": round(totals.get("volume_usd", 0.0), 2),
+            "total_commission": round(totals.get("commission_usd", 0.0), 2),
+            "total_partner_commission": round(totals.get("partner_commission_usd", 0.0), 2),
+            "active_partners": totals.get("active_partners", 0),
+            "today_exchanges": documents.get(today, {}).get("exchanges", 0),
+            "today_volume_usd": round(documents.get(today, {}).get("volume_usd", 0.0), 2),
+            "monthly_exchanges": documents.get(month, {}).get("exchanges", 0),
+            "monthly_volume_usd": round(documents.get(month, {}).get("volume_usd", 0.0), 2),
+            "top_currencies": top_currencies,
+            "recent_exchanges": totals.get("recent", [])
+        }
+
+    async def range_report(self, db: AsyncIOMotorDatabase, start: datetime, end: datetime) -> Dict[str, Any]:
+        """Counts and USD figures for exchanges created in [start, end), hour precision"""
+        keys = covering_buckets(start, end)
+        documents = await db[COLLECTION].find({"_id": {"$in": keys}}).to_list(None)
+        report = summarize(documents)
+        report["buckets"] = len(keys)
+        return report
+
+    async def _claim_reconcile(self) -> bool:
+        """Only one worker per interval wins the reconciliation"""
+        now = datetime.utcnow()
+        result = await self.db[COLLECTION].update_one(
+            {"_id": TOTALS_ID, "$or": [
+                {"reconciled_at": {"$exists": False}},
+                {"reconciled_at": {"$lt": now - timedelta(seconds=self.reconcile_interval)}}
+            ]},
+            {"$set": {"reconciled_at": now}}
+        )
+        if result.modified_count:
+            return True
+        return await self.db[COLLECTION].count_documents({"_id": TOTALS_ID}) == 0
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        if self._task:
+            return
+        self.db = db
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                if await self._claim_reconcile():
+                    await self.reconcile(self.db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Stats reconciliation failed: {e}")
+            await asyncio.sleep(min(self.reconcile_interval, 300))
+
+
+# Global instance
+stats_engine = StatsEngine(reconcile_interval=float(os.getenv("STATS_RECONCILE_SECONDS", "3600")))
@@ -1,8 +1,10 @@
+import os
 import requests
 import unittest
 import json
 import uuid
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Get the backend URL from the frontend .env file
 BACKEND_URL = "https://fb5a371d-9607-4268-a7a3-6d7aca3db5a0.preview.emergentagent.com"
@@ -847,5 +849,130 @@ class TestCartelBackendAPI(unittest.TestCase):
         # We'll consider this test as informational only
         print("⚠️ This test is informational only - please check the actual logs")
 
+    def test_21_exchange_status_long_poll(self):
+        """Test the long-polling exchange status endpoint"""
+        print("\n=== Testing Exchange Status Long-Poll ===")
+        
+        if not TestCartelBackendAPI.exchange_id:
+            self.skipTest("No exchange ID available from previous test")
+        
+        status_url = f"{API_URL}/exchange/{TestCartelBackendAPI.exchange_id}/status"
+        
+        # Without wait the current status is returned immediately
+        response = requests.get(status_url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["id"], TestCartelBackendAPI.exchange_id)
+        self.assertIn("status", data)
+        self.assertIn("version", data)
+        
+        # An unchanged exchange is held until the wait window expires
+        start = time.time()
+        response = requests.get(status_url, params={"wait": 2, "since": data["version"]})
+        elapsed = time.time() - start
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["version"], data["version"])
+        self.assertGreaterEqual(elapsed, 1.5)
+        
+        # When the shorter wait times out the server reloads the snapshot (older
+        # than 30s by then) and republishes the same version; the longer wait
+        # must keep holding until its own window expires
+        def timed_wait(wait):
+            start = time.time()
+            response = requests.get(status_url, params={"wait": wait, "since": data["version"]})
+            return response, time.time() - start
+        
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            long_wait = pool.submit(timed_wait, 40)
+            short_wait = pool.submit(timed_wait, 32)
+            short_response, _ = short_wait.result()
+            long_response, long_elapsed = long_wait.result()
+        self.assertEqual(short_response.status_code, 200)
+        self.assertEqual(long_response.status_code, 200)
+        self.assertEqual(long_response.json()["version"], data["version"])
+        self.assertGreaterEqual(long_elapsed, 38)
+        
+        # A stale version returns immediately
+        start = time.time()
+        response = requests.get(status_url, params={"wait": 10, "since": data["version"] - 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(time.time() - start, 5)
+        
+        # Unknown exchanges return 404
+        response = requests.get(f"{API_URL}/exchange/{uuid.uuid4()}/status")
+        self.assertEqual(response.status_code, 404)
+        
+        print("✅ Exchange Status Long-Poll test passed")
+
+    def test_22_idempotent_exchange_creation(self):
+        """Test that retried exchange creation with an Idempotency-Key is replayed"""
+        print("\n=== Testing Idempotent Exchange Creation ===")
+        
+        exchange_data = {
+            "from_currency": "BTC",
+            "to_currency": "ETH",
+            "from_amount": 0.1,
+            "to_amount": 1.63,
+            "receiving_address": "0x742d35Cc6634C0532925a3b844Bc454e4438f44e",
+            "rate_type": "float"
+        }
+        headers = {"Idempotency-Key": str(uuid.uuid4())}
+        
+        first = requests.post(f"{API_URL}/exchange", json=exchange_data, headers=headers)
+        self.assertEqual(first.status_code, 200)
+        
+        # A retry returns the original exchange instead of creating a new one
+        retry = requests.post(f"{API_URL}/exchange", json=exchange_data, headers=headers)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json()["id"], first.json()["id"])
+        self.assertEqual(retry.headers.get("Idempotent-Replayed"), "true")
+        
+        # Reusing the key with a different body is rejected
+        conflict = requests.post(
+            f"{API_URL}/exchange",
+            json={**exchange_data, "from_amount": 0.2},
+            headers=headers
+        )
+        self.assertEqual(conflict.status_code, 422)
+        
+        print("✅ Idempotent Exchange Creation test passed")
+
+    def test_23_currencies_etag(self):
+        """Test that the currency catalog supports conditional requests"""
+        print("\n=== Testing Currencies ETag ===")
+        
+        response = requests.get(f"{API_URL}/currencies")
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers.get("ETag")
+        self.assertIsNotNone(etag)
+        
+        # Unchanged catalog is answered with 304 and no body
+        response = requests.get(f"{API_URL}/currencies", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        
+        print("✅ Currencies ETag test passed")
+
+    def test_24_metrics_endpoint(self):
+        """Test that /metrics exposes Prometheus text with per-route series"""
+        print("\n=== Testing Metrics Endpoint ===")
+        
+        # Through the public URL /metrics needs the scrape token
+        response = requests.get(f"{BACKEND_URL}/metrics")
+        self.assertEqual(response.status_code, 403)
+        
+        token = os.environ.get("METRICS_TOKEN")
+        if not token:
+            self.skipTest("METRICS_TOKEN not set")
+        
+        requests.get(f"{API_URL}/currencies")
+        response = requests.get(f"{BACKEND_URL}/metrics", headers={"Authorization": f"Bearer {token}"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        self.assertIn("# TYPE http_requests_total counter", response.text)
+        self.assertIn('route="/api/currencies"', response.text)
+        
+        print("✅ Metrics endpoint test passed")
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
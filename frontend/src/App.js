@@ -9,6 +9,15 @@ import "./components/AdminPanel.css";
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Partner referral links look like https://cartelex.ch/?ref=CODE; the code is
+// kept for later visits and sent with the exchange so the partner is credited
+const referralCode = () => {
+  const ref = new URLSearchParams(window.location.search).get('ref');
+  if (ref) localStorage.setItem('referralCode', ref);
+  return ref || localStorage.getItem('referralCode') || undefined;
+};
+referralCode();
+
 // Currency validation patterns
 const CURRENCY_PATTERNS = {
   BTC: /^(bc1|[13])[a-zA-HJ-NP-Z0-9]{25,62}$/,
@@ -469,7 +478,8 @@ const HomePage = () => {
         receiving_address: addressData.receivingAddress,
         refund_address: addressData.refundAddress,
         email: addressData.email,
-        rate_type: rateType
+        rate_type: rateType,
+        referral_code: referralCode()
       };
 
       const response = await axios.post(`${API}/exchange`, exchangeData);
@@ -4,6 +4,9 @@ import axios from 'axios';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Dashboard reload interval while the live feed has no change stream behind it
+const FALLBACK_POLL_MS = 15000;
+
 // Admin Login Component
 const AdminLogin = ({ onLogin }) => {
   const [credentials, setCredentials] = useState({ username: '', password: '' });
@@ -79,6 +82,7 @@ const AdminDashboard = ({ user, onLogout }) => {
   const [showPartnerApiModal, setShowPartnerApiModal] = useState(false);
   const [selectedExchange, setSelectedExchange] = useState(null);
   const [selectedPartner, setSelectedPartner] = useState(null);
+  const [partnerUsage, setPartnerUsage] = useState(null);
   const [editingExchange, setEditingExchange] = useState(null);
   const [editingPartner, setEditingPartner] = useState(null);
 
@@ -149,14 +153,115 @@ const AdminDashboard = ({ user, onLogout }) => {
     setLoading(false);
   };
 
+  // Stats, partners and exchanges arrive in one call and then stay current via the live feed,
+  // or via polling when the feed reports no change stream
+  const loadInitialData = async () => {
+    setLoading(true);
+    try {
+      const response = await axios.get(
+        `${API}/admin/dashboard?fields=stats,partners,exchanges`,
+        getAuthHeaders()
+      );
+      const data = response.data.data;
+      setStats(data.stats);
+      setPartners(data.partners.data);
+      setExchanges(data.exchanges.data);
+    } catch (error) {
+      console.error('Error loading dashboard:', error);
+    }
+    setLoading(false);
+  };
+
+  useEffect(() => {
+    loadInitialData();
+  }, []);
+
   useEffect(() => {
-    if (activeTab === 'dashboard') loadDashboard();
-    if (activeTab === 'partners') loadPartners();
-    if (activeTab === 'exchanges') loadExchanges();
     if (activeTab === 'tokens') loadTokens();
     if (activeTab === 'settings') loadSettings();
   }, [activeTab]);
 
+  // Live feed: apply exchange/partner deltas and stats pushes instead of reloading
+  useEffect(() => {
+    let source = null;
+    let retryTimer = null;
+    let pollTimer = null;
+    let closed = false;
+
+    // Without a live change stream (standalone mongod) or while disconnected, poll instead
+    const setPolling = (enabled) => {
+      if (enabled && !pollTimer) {
+        pollTimer = setInterval(loadInitialData, FALLBACK_POLL_MS);
+      } else if (!enabled && pollTimer) {
+        clearInterval(pollTimer);
+        pollTimer = null;
+      }
+    };
+
+    const applyDelta = (list, delta) => {
+      if (delta.op === 'insert') {
+        return [delta.data, ...list.filter((item) => item.id !== delta.id)];
+      }
+      if (delta.op === 'delete') {
+        return list.filter((item) => item.id !== delta.id);
+      }
+      return list.map((item) => (item.id === delta.id ? { ...item, ...delta.data } : item));
+    };
+
+    // Each connection uses a fresh one-minute feed token, never the admin token
+    const connect = async () => {
+      try {
+        const response = await axios.post(`${API}/admin/feed/token`, {}, getAuthHeaders());
+        if (closed) return;
+        source = new EventSource(`${API}/admin/feed?token=${encodeURIComponent(response.data.data.token)}`);
+      } catch (error) {
+        console.error('Error opening live feed:', error);
+        setPolling(true);
+        retryTimer = setTimeout(connect, 5000);
+        return;
+      }
+
+      source.addEventListener('status', (e) => {
+        const live = JSON.parse(e.data).live;
+        // Catch up on anything missed before the stream went live
+        if (live && pollTimer) loadInitialData();
+        setPolling(!live);
+      });
+      source.addEventListener('exchange', (e) => {
+        const delta = JSON.parse(e.data);
+        setExchanges((list) => applyDelta(list, delta));
+      });
+      source.addEventListener('partner', (e) => {
+        const delta = JSON.parse(e.data);
+        setPartners((list) => applyDelta(list, delta));
+      });
+      source.addEventListener('stats', (e) => {
+        setStats(JSON.parse(e.data).data);
+      });
+      // The server dropped queued deltas for us; fall back to a full reload
+      source.addEventListener('resync', () => {
+        loadDashboard();
+        loadPartners();
+        loadExchanges();
+      });
+      // The token has expired by the time EventSource would reconnect on its own
+      source.onerror = () => {
+        source.close();
+        setPolling(true);
+        if (!closed) retryTimer = setTimeout(connect, 3000);
+      };
+    };
+
+    connect();
+
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      setPolling(false);
+      if (source) source.close();
+    };
+  }, []);
+
   // Exchange operations
   const handleEditExchange = (exchange) => {
     setSelectedExchange(exchange);
@@ -261,7 +366,7 @@ const AdminDashboard = ({ user, onLogout }) => {
     
     try {
       setLoading(true);
-      await axios.post(
+      const response = await axios.post(
         `${API}/admin/partners`, 
         editingPartner,
         getAuthHeaders()
@@ -270,6 +375,8 @@ const AdminDashboard = ({ user, onLogout }) => {
       await loadPartners();
       setShowCreatePartnerModal(false);
       setEditingPartner(null);
+      // The full API key and secret are only returned here
+      handleViewPartner(response.data.data);
     } catch (error) {
       console.error('Error creating partner:', error);
     }
@@ -332,9 +439,16 @@ const AdminDashboard = ({ user, onLogout }) => {
     setLoading(false);
   };
 
-  const handleViewPartner = (partner) => {
+  const handleViewPartner = async (partner) => {
     setSelectedPartner(partner);
+    setPartnerUsage(null);
     setShowPartnerApiModal(true);
+    try {
+      const response = await axios.get(`${API}/admin/partners/${partner.id}/usage`, getAuthHeaders());
+      setPartnerUsage(response.data.data);
+    } catch (error) {
+      console.error('Error loading partner usage:', error);
+    }
   };
 
   // Dashboard Tab Content
@@ -398,7 +512,7 @@ const AdminDashboard = ({ user, onLogout }) => {
                 <td>{partner.email}</td>
                 <td>{partner.commission_rate}%</td>
                 <td className={`status ${partner.status}`}>{partner.status}</td>
-                <td className="api-key">{partner.api_key}</td>
+                <td className="api-key">{partner.api_key_prefix}…</td>
                 <td className="referral-code">{partner.referral_code}</td>
                 <td className="referral-url">
                   {partner.referral_url && (
@@ -586,6 +700,21 @@ const AdminDashboard = ({ user, onLogout }) => {
             </div>
           </div>
           
+          <div className="settings-section">
+            <h3>Partner API</h3>
+            <div className="form-group">
+              <label>Default Rate Limit (requests/min):</label>
+              <input 
+                type="number" 
+                value={settings.default_partner_rate_limit}
+                onChange={(e) => setSettings({
+                  ...settings, 
+                  default_partner_rate_limit: parseInt(e.target.value, 10)
+                })}
+              />
+            </div>
+          </div>
+          
           <div className="settings-section">
             <h3>Minimum Deposits</h3>
             {Object.entries(settings.min_deposits || {}).map(([currency, amount]) => (
@@ -1055,6 +1184,17 @@ const AdminDashboard = ({ user, onLogout }) => {
                   />
                 </div>
               </div>
+              <div className="form-group">
+                <label>Rate Limit (requests/min, 0 = default):</label>
+                <input
+                  type="number"
+                  value={editingPartner.rate_limit_per_minute || 0}
+                  onChange={(e) => setEditingPartner({
+                    ...editingPartner,
+                    rate_limit_per_minute: parseInt(e.target.value, 10)
+                  })}
+                />
+              </div>
             </div>
             <div className="modal-footer">
               <button 
@@ -1220,7 +1360,7 @@ const AdminDashboard = ({ user, onLogout }) => {
                 <h4>🔑 API Credentials</h4>
                 <div className="detail-group">
                   <label>API Key:</label>
-                  <span className="copy-value api-key">{selectedPartner.api_key}</span>
+                  <span className="copy-value api-key">{selectedPartner.api_key || `${selectedPartner.api_key_prefix}… (shown only at creation)`}</span>
                 </div>
                 <div className="detail-group">
                   <label>API Secret:</label>
@@ -1235,20 +1375,54 @@ const AdminDashboard = ({ user, onLogout }) => {
                 <div className="api-endpoint">
                   <strong>Get Rates:</strong>
                   <code>GET /api/partner/rates?from_currency=BTC&to_currency=ETH&rate_type=float</code>
-                  <p>Headers: <code>X-API-Key: {selectedPartner.api_key}</code></p>
+                  <p>Headers: <code>X-API-Key: {selectedPartner.api_key || "your_api_key"}</code></p>
                 </div>
                 <div className="api-endpoint">
                   <strong>Get Currencies:</strong>
                   <code>GET /api/partner/currencies</code>
-                  <p>Headers: <code>X-API-Key: {selectedPartner.api_key}</code></p>
+                  <p>Headers: <code>X-API-Key: {selectedPartner.api_key || "your_api_key"}</code></p>
                 </div>
                 <div className="api-endpoint">
                   <strong>API Status:</strong>
                   <code>GET /api/partner/status</code>
-                  <p>Headers: <code>X-API-Key: {selectedPartner.api_key}</code></p>
+                  <p>Headers: <code>X-API-Key: {selectedPartner.api_key || "your_api_key"}</code></p>
                 </div>
               </div>
               
+              <div className="api-section">
+                <h4>📈 Usage (last 24h)</h4>
+                {partnerUsage ? (
+                  <>
+                    <div className="detail-group">
+                      <label>Rate Limit:</label>
+                      <span>{partnerUsage.rate_limit_per_minute} requests/min</span>
+                    </div>
+                    <div className="detail-group">
+                      <label>Requests:</label>
+                      <span>{partnerUsage.total}</span>
+                    </div>
+                    <div className="detail-group">
+                      <label>Rate Limited:</label>
+                      <span>{partnerUsage.rate_limited}</span>
+                    </div>
+                    {partnerUsage.endpoints.map(row => (
+                      <div key={`${row.endpoint}-${row.status}`} className="detail-group">
+                        <label>{row.endpoint} ({row.status}):</label>
+                        <span>{row.count}</span>
+                      </div>
+                    ))}
+                    {partnerUsage.pairs.length > 0 && (
+                      <div className="detail-group">
+                        <label>Top Pairs:</label>
+                        <span>{partnerUsage.pairs.slice(0, 5).map(row => `${row.pair} (${row.count})`).join(', ')}</span>
+                      </div>
+                    )}
+                  </>
+                ) : (
+                  <p>Loading usage...</p>
+                )}
+              </div>
+              
               <div className="api-section">
                 <h4>💰 Commission Info</h4>
                 <div className="detail-group">
@@ -1269,7 +1443,7 @@ const AdminDashboard = ({ user, onLogout }) => {
                 <h4>📖 Usage Example</h4>
                 <div className="code-example">
                   <pre>{`curl -X GET "${window.location.origin}/api/partner/rates?from_currency=BTC&to_currency=ETH&rate_type=float" \\
-  -H "X-API-Key: ${selectedPartner.api_key}"`}</pre>
+  -H "X-API-Key: ${selectedPartner.api_key || 'your_api_key'}"`}</pre>
                 </div>
               </div>
             </div>
@@ -1280,15 +1454,17 @@ const AdminDashboard = ({ user, onLogout }) => {
               >
                 Close
               </button>
-              <button 
-                className="btn-copy"
-                onClick={() => {
-                  navigator.clipboard.writeText(selectedPartner.api_key);
-                  alert('API Key copied to clipboard!');
-                }}
-              >
-                Copy API Key
-              </button>
+              {selectedPartner.api_key && (
+                <button 
+                  className="btn-copy"
+                  onClick={() => {
+                    navigator.clipboard.writeText(selectedPartner.api_key);
+                    alert('API Key copied to clipboard!');
+                  }}
+                >
+                  Copy API Key
+                </button>
+              )}
             </div>
           </div>
         </div>
@@ -5,7 +5,6 @@ import { useLocation, useNavigate } from 'react-router-dom';
 class TransactionMonitor {
     constructor() {
         this.pollingIntervals = {};
-        this.lastCheckedTime = {};
         this.callLimits = {
             'BTC': 30000,     // 30 seconds for Bitcoin
             'ETH': 20000,     // 20 seconds for Ethereum
@@ -17,7 +16,7 @@ class TransactionMonitor {
         };
     }
 
-    startMonitoring(address, currency, exchangeId, statusCallback) {
+    startMonitoring(address, currency, exchangeId, statusCallback, expectedAmount) {
         console.log(`Starting real blockchain monitoring for ${currency} address: ${address}`);
         
         let currentStatus = localStorage.getItem(`txStatus_${exchangeId}`) || 'waiting';
@@ -28,123 +27,89 @@ class TransactionMonitor {
             return;
         }
         
-        if (txHash && currentStatus !== 'waiting') {
-            this.checkTransactionConfirmations(currency, txHash, exchangeId, statusCallback);
-            return;
-        }
-        
-        const interval = this.callLimits[currency] || this.callLimits.default;
-        
-        this.pollingIntervals[exchangeId] = setInterval(() => {
-            this.checkForDeposit(address, currency, exchangeId, statusCallback);
-        }, interval);
-        
-        // Check immediately
-        this.checkForDeposit(address, currency, exchangeId, statusCallback);
+        this.watchStatus(currency, txHash, exchangeId, statusCallback, expectedAmount);
     }
     
     stopMonitoring(exchangeId) {
-        if (this.pollingIntervals[exchangeId]) {
-            clearInterval(this.pollingIntervals[exchangeId]);
-            delete this.pollingIntervals[exchangeId];
-        }
-        if (this.pollingIntervals[`${exchangeId}_confirmations`]) {
-            clearInterval(this.pollingIntervals[`${exchangeId}_confirmations`]);
-            delete this.pollingIntervals[`${exchangeId}_confirmations`];
-        }
+        // Long-polling stops on its next iteration
+        delete this.pollingIntervals[exchangeId];
     }
     
-    async checkForDeposit(address, currency, exchangeId, statusCallback) {
-        const now = Date.now();
-        const lastCheck = this.lastCheckedTime[`${currency}_${address}`] || 0;
-        const minInterval = this.callLimits[currency] || this.callLimits.default;
-        
-        if (now - lastCheck < minInterval) {
-            return;
-        }
-        
-        this.lastCheckedTime[`${currency}_${address}`] = now;
+    async watchStatus(currency, txHash, exchangeId, statusCallback, expectedAmount) {
+        // Long-poll the status endpoint for the whole lifecycle: the backend holds
+        // the request until the exchange version changes (the deposit monitor
+        // detects the deposit and counts confirmations), so an idle exchange
+        // costs one request per window
+        this.pollingIntervals[exchangeId] = true;
+        const retryDelay = this.callLimits[currency] || this.callLimits.default;
+        let version = null;
         
-        try {
-            // Call backend API to check blockchain for deposits
-            const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/exchange/${exchangeId}/check-deposit`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
+        while (this.pollingIntervals[exchangeId]) {
+            try {
+                const query = version === null ? '' : `?wait=30&since=${version}`;
+                const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/exchange/${exchangeId}/status${query}`);
+                
+                if (!response.ok) {
+                    await new Promise(resolve => setTimeout(resolve, retryDelay));
+                    continue;
                 }
-            });
-            
-            if (response.ok) {
-                const result = await response.json();
                 
-                if (result.detected) {
-                    const transaction = result.transaction;
-                    
-                    localStorage.setItem(`txHash_${exchangeId}`, transaction.tx_hash);
+                const exchange = await response.json();
+                if (exchange.version === version) {
+                    continue;
+                }
+                version = exchange.version;
+                
+                if (exchange.status === 'waiting' || !exchange.deposit_hash) {
+                    continue;
+                }
+                
+                const requiredConfirmations = this.getRequiredConfirmations(currency);
+                const confirmations = exchange.confirmations || 0;
+                
+                if (!txHash) {
+                    txHash = exchange.deposit_hash;
+                    localStorage.setItem(`txHash_${exchangeId}`, txHash);
                     localStorage.setItem(`txStatus_${exchangeId}`, 'received');
-                    localStorage.setItem(`actualAmount_${exchangeId}`, transaction.amount);
-                    localStorage.setItem(`confirmations_${exchangeId}`, transaction.confirmations || 0);
-                    
-                    this.stopMonitoring(exchangeId);
-                    
-                    if (statusCallback) {
-                        statusCallback('received', transaction.tx_hash, transaction.confirmations, this.getRequiredConfirmations(currency));
-                    }
-                    
-                    // Start monitoring confirmations
-                    this.checkTransactionConfirmations(currency, transaction.tx_hash, exchangeId, statusCallback);
+                    localStorage.setItem(`actualAmount_${exchangeId}`, exchange.actual_received_amount);
                     
                     // Show amount adjustment notification if needed
-                    if (!transaction.amount_match) {
-                        this.showAmountAdjustmentNotification(transaction.expected_amount, transaction.amount, currency);
+                    const actualAmount = exchange.actual_received_amount;
+                    if (expectedAmount && actualAmount && Math.abs(actualAmount - expectedAmount) > expectedAmount * 0.001) {
+                        this.showAmountAdjustmentNotification(expectedAmount, actualAmount, currency);
                     }
                 }
-            } else {
-                console.error('Error checking deposit:', response.statusText);
-            }
-        } catch (error) {
-            console.error(`Error checking ${currency} deposit:`, error);
-        }
-    }
-    
-    async checkTransactionConfirmations(currency, txHash, exchangeId, statusCallback) {
-        const interval = this.callLimits[currency] || this.callLimits.default;
-        
-        this.pollingIntervals[`${exchangeId}_confirmations`] = setInterval(async () => {
-            try {
-                // Get latest exchange status from backend
-                const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/exchange/${exchangeId}/status`);
                 
-                if (response.ok) {
-                    const exchange = await response.json();
-                    
-                    const confirmations = exchange.confirmations || 0;
-                    const requiredConfirmations = this.getRequiredConfirmations(currency);
-                    
-                    localStorage.setItem(`confirmations_${exchangeId}`, confirmations);
+                if (exchange.status === 'completed') {
+                    delete this.pollingIntervals[exchangeId];
+                    localStorage.setItem(`txStatus_${exchangeId}`, 'completed');
+                    if (statusCallback) statusCallback('completed', txHash);
+                    break;
+                }
+                
+                localStorage.setItem(`confirmations_${exchangeId}`, confirmations);
+                
+                if (statusCallback) {
+                    statusCallback('received', txHash, confirmations, requiredConfirmations);
+                }
+                
+                if (confirmations >= requiredConfirmations || exchange.status === 'exchanging') {
+                    delete this.pollingIntervals[exchangeId];
                     
-                    if (statusCallback) {
-                        statusCallback('received', txHash, confirmations, requiredConfirmations);
-                    }
+                    localStorage.setItem(`txStatus_${exchangeId}`, 'exchanging');
+                    if (statusCallback) statusCallback('exchanging', txHash);
                     
-                    if (confirmations >= requiredConfirmations) {
-                        clearInterval(this.pollingIntervals[`${exchangeId}_confirmations`]);
-                        delete this.pollingIntervals[`${exchangeId}_confirmations`];
-                        
-                        localStorage.setItem(`txStatus_${exchangeId}`, 'exchanging');
-                        if (statusCallback) statusCallback('exchanging', txHash);
-                        
-                        // Simulate exchange processing time (5-15 seconds)
-                        setTimeout(() => {
-                            localStorage.setItem(`txStatus_${exchangeId}`, 'completed');
-                            if (statusCallback) statusCallback('completed', txHash);
-                        }, Math.floor(Math.random() * 10000) + 5000);
-                    }
+                    // Simulate exchange processing time (5-15 seconds)
+                    setTimeout(() => {
+                        localStorage.setItem(`txStatus_${exchangeId}`, 'completed');
+                        if (statusCallback) statusCallback('completed', txHash);
+                    }, Math.floor(Math.random() * 10000) + 5000);
                 }
             } catch (error) {
-                console.error(`Error checking confirmations:`, error);
+                console.error(`Error checking ${currency} exchange status:`, error);
+                await new Promise(resolve => setTimeout(resolve, retryDelay));
             }
-        }, interval);
+        }
     }
     
     getRequiredConfirmations(currency) {
@@ -349,7 +314,8 @@ const ConfirmationPage = () => {
                             exchangeDetails.deposit_address,
                             data.fromCurrency,
                             data.exchangeId,
-                            handleStatusUpdate
+                            handleStatusUpdate,
+                            exchangeDetails.from_amount
                         );
                     }
                 } catch (error) {
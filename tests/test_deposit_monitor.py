@@ -0,0 +1,307 @@
+import os
+import sys
+import time
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from mongomock_motor import AsyncMongoMockClient
+
+from deposit_monitor import (
+    CHAIN_BLOCK_SECONDS, EXCHANGE_EXPIRY, MAX_POLL_SECONDS, MIN_POLL_SECONDS,
+    DepositMonitor, ShardLeaseManager, can_claim, poll_delay, shard_for
+)
+from kucoin_service import utc_timestamp
+
+ADDRESS = "bc1qmonitortestaddress"
+
+
+class FakeExplorer:
+    def __init__(self, result=None):
+        self.result = result or {"detected": False}
+        self.calls = 0
+
+    async def check_address(self, address, currency):
+        self.calls += 1
+        return dict(self.result)
+
+
+def make_exchange(exchange_id, created_at, status="waiting", **fields):
+    return {
+        "id": exchange_id,
+        "status": status,
+        "from_currency": "BTC",
+        "to_currency": "ETH",
+        "from_amount": 0.5,
+        "deposit_address": ADDRESS,
+        "monitor_shard": shard_for("BTC", ADDRESS),
+        "created_at": created_at,
+        "version": 1,
+        **fields
+    }
+
+
+class TestShardFor(unittest.TestCase):
+    """Deposit addresses map to a stable chain bucket"""
+
+    def test_stable_bucket_per_address(self):
+        shard = shard_for("BTC", ADDRESS)
+        self.assertEqual(shard, shard_for("btc", ADDRESS))
+        chain, bucket = shard.split(":")
+        self.assertEqual(chain, "BTC")
+        self.assertTrue(0 <= int(bucket) < 16)
+        self.assertEqual(shard_for("BTC", ADDRESS, buckets=4), f"BTC:{int(bucket) % 4}")
+
+    def test_tokens_share_their_chain(self):
+        self.assertTrue(shard_for("USDT-ERC20", "0xabc").startswith("ETH:"))
+        self.assertEqual(shard_for("USDT-ERC20", "0xabc"), shard_for("ETH", "0xabc"))
+        self.assertTrue(shard_for("USDT-TRX", "Tabc").startswith("TRX:"))
+
+    def test_unmonitored(self):
+        self.assertIsNone(shard_for("XMR", "4abc"))
+        self.assertIsNone(shard_for("UNKNOWN", "abc"))
+        self.assertIsNone(shard_for("BTC", None))
+        self.assertIsNone(shard_for(None, ADDRESS))
+
+
+class TestPollDelay(unittest.TestCase):
+    """Per-address check intervals from block time and exchange age"""
+
+    def setUp(self):
+        self.now = datetime(2026, 1, 1, 12, 0)
+
+    def test_new_waiting_exchange_polls_at_half_a_block(self):
+        group = [make_exchange("e1", self.now)]
+        self.assertEqual(poll_delay("LTC", group, self.now), CHAIN_BLOCK_SECONDS["LTC"] / 2)
+
+    def test_backs_off_with_age(self):
+        young = poll_delay("LTC", [make_exchange("e1", self.now - timedelta(minutes=1))], self.now)
+        old = poll_delay("LTC", [make_exchange("e1", self.now - timedelta(hours=2))], self.now)
+        self.assertLess(young, old)
+        # The youngest exchange on the address sets the pace
+        group = [make_exchange("e1", self.now - timedelta(hours=2)), make_exchange("e2", self.now)]
+        self.assertEqual(poll_delay("LTC", group, self.now), CHAIN_BLOCK_SECONDS["LTC"] / 2)
+
+    def test_received_and_recent_activity_poll_every_block(self):
+        old = self.now - timedelta(hours=3)
+        received = [make_exchange("e1", old, status="received")]
+        self.assertEqual(poll_delay("LTC", received, self.now), CHAIN_BLOCK_SECONDS["LTC"])
+        waiting = [make_exchange("e1", old)]
+        self.assertEqual(poll_delay("LTC", waiting, self.now, self.now - timedelta(minutes=2)), CHAIN_BLOCK_SECONDS["LTC"])
+
+    def test_bounds(self):
+        fast = [make_exchange("e1", self.now, status="received")]
+        self.assertEqual(poll_delay("TRX", fast, self.now), MIN_POLL_SECONDS)
+        slow = [make_exchange("e1", self.now - timedelta(hours=12))]
+        self.assertEqual(poll_delay("BTC", slow, self.now), MAX_POLL_SECONDS)
+
+    def test_never_polls_past_expiry(self):
+        created_at = self.now - EXCHANGE_EXPIRY + timedelta(seconds=60)
+        self.assertEqual(poll_delay("LTC", [make_exchange("e1", created_at)], self.now), 60)
+
+
+class TestShardLeases(unittest.IsolatedAsyncioTestCase):
+    """Lease acquisition, rebalancing between workers and failover"""
+
+    async def asyncSetUp(self):
+        self.db = AsyncMongoMockClient()["deposit_monitor_test"]
+
+    def manager(self, worker_id):
+        return ShardLeaseManager(self.db, worker_id, ["BTC", "ETH"], 2, lease_seconds=30)
+
+    async def owners(self):
+        return {lease["_id"]: lease["owner"] async for lease in self.db.monitor_leases.find()}
+
+    async def test_single_worker_takes_every_shard(self):
+        first = self.manager("w1")
+        self.assertEqual(await first.rebalance(), set(first.shards))
+        self.assertEqual(set((await self.owners()).values()), {"w1"})
+        # Renewing keeps the same leases
+        self.assertEqual(await first.rebalance(), set(first.shards))
+
+    async def test_workers_split_shards(self):
+        first, second = self.manager("w1"), self.manager("w2")
+        await first.rebalance()
+        await second.heartbeat()
+        # The first worker sheds down to its share, the second picks the rest up
+        self.assertEqual(len(await first.rebalance()), 2)
+        self.assertEqual(len(await second.rebalance()), 2)
+        self.assertEqual(first.owned | second.owned, set(first.shards))
+        self.assertFalse(first.owned & second.owned)
+        owners = await self.owners()
+        for shard_id in second.owned:
+            self.assertEqual(owners[shard_id], "w2")
+
+    async def test_live_lease_is_not_taken(self):
+        first, second = self.manager("w1"), self.manager("w2")
+        await first.rebalance()
+        for shard_id in first.shards:
+            self.assertFalse(await second._try_acquire(shard_id))
+
+    async def test_expired_leases_fail_over(self):
+        first, second = self.manager("w1"), self.manager("w2")
+        await first.rebalance()
+        # w1 dies: no heartbeat and its leases run out
+        await self.db.monitor_workers.delete_one({"_id": "w1"})
+        await self.db.monitor_leases.update_many({}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+        self.assertEqual(await second.rebalance(), set(second.shards))
+        self.assertEqual(set((await self.owners()).values()), {"w2"})
+
+    async def test_release_all(self):
+        first, second = self.manager("w1"), self.manager("w2")
+        await first.rebalance()
+        await first.release_all()
+        self.assertEqual(await second.rebalance(), set(second.shards))
+
+
+class TestApplyResult(unittest.IsolatedAsyncioTestCase):
+    """Claim-once and confirmation rules for one explorer result on a shared address.
+
+    mongomock's find_one_and_update returns None when the update changes a
+    field the filter matched on, so outcomes are read back from the collection.
+    """
+
+    async def asyncSetUp(self):
+        self.db = AsyncMongoMockClient()["deposit_monitor_test"]
+        self.monitor = DepositMonitor(self.db, FakeExplorer(), lambda currency: 2)
+        self.created_at = datetime.utcnow() - timedelta(minutes=30)
+        await self.db.exchanges.insert_many([
+            make_exchange("older", self.created_at),
+            make_exchange("newer", self.created_at + timedelta(minutes=1)),
+        ])
+
+    def result(self, tx_hash="tx1", confirmations=0, amount=0.5, sent_at=None):
+        sent_at = sent_at or datetime.utcnow()
+        return {
+            "detected": True,
+            "tx_hash": tx_hash,
+            "amount": amount,
+            "confirmations": confirmations,
+            "timestamp": sent_at.isoformat() + "Z"
+        }
+
+    async def group(self):
+        return await self.db.exchanges.find({}, {"_id": 0}).sort("created_at", 1).to_list(None)
+
+    async def states(self):
+        return {
+            exchange["id"]: (exchange["status"], exchange.get("deposit_hash"), exchange.get("confirmations"))
+            for exchange in await self.group()
+        }
+
+    async def test_oldest_matching_exchange_claims_once(self):
+        await self.monitor.apply_result(await self.group(), self.result(confirmations=1))
+        states = await self.states()
+        self.assertEqual(states["older"], ("received", "tx1", 1))
+        self.assertEqual(states["newer"], ("waiting", None, None))
+
+        # The same transaction seen again is not credited to the other exchange
+        await self.monitor.apply_result(await self.group(), self.result(confirmations=1))
+        self.assertEqual((await self.states())["newer"], ("waiting", None, None))
+
+    async def test_claimed_elsewhere_is_not_claimed(self):
+        await self.db.exchanges.insert_one(make_exchange(
+            "done", self.created_at - timedelta(hours=1), status="completed",
+            deposit_address="other", deposit_hash="tx1"
+        ))
+        group = [exchange for exchange in await self.group() if exchange["status"] == "waiting"]
+        self.assertFalse(await self.monitor.apply_result(group, self.result()))
+        states = await self.states()
+        self.assertEqual(states["older"][0], "waiting")
+        self.assertEqual(states["newer"][0], "waiting")
+
+    async def test_confirmations_then_exchanging(self):
+        await self.monitor.apply_result(await self.group(), self.result(confirmations=0))
+        self.assertEqual((await self.states())["older"], ("received", "tx1", 0))
+
+        # Unchanged confirmations write nothing
+        self.assertFalse(await self.monitor.apply_result(await self.group(), self.result(confirmations=0)))
+
+        await self.monitor.apply_result(await self.group(), self.result(confirmations=2))
+        self.assertEqual((await self.states())["older"], ("exchanging", "tx1", 2))
+
+    async def test_enough_confirmations_on_first_sight(self):
+        await self.monitor.apply_result(await self.group(), self.result(confirmations=5))
+        self.assertEqual((await self.states())["older"], ("exchanging", "tx1", 5))
+
+    async def test_unclaimable_results(self):
+        group = await self.group()
+        self.assertFalse(await self.monitor.apply_result(group, {"detected": False}))
+        self.assertFalse(await self.monitor.apply_result(group, {**self.result(), "tx_hash": None}))
+        # Wrong amount, or sent before either exchange existed
+        await self.monitor.apply_result(group, self.result(amount=0.3))
+        await self.monitor.apply_result(group, self.result(sent_at=self.created_at - timedelta(minutes=5)))
+        self.assertEqual({state[0] for state in (await self.states()).values()}, {"waiting"})
+
+    async def test_other_transaction_does_not_confirm_received(self):
+        await self.monitor.apply_result(await self.group(), self.result(confirmations=0))
+        # A different transaction on the address goes to the next waiting exchange
+        await self.monitor.apply_result(await self.group(), self.result(tx_hash="tx2", confirmations=3))
+        states = await self.states()
+        self.assertEqual(states["older"], ("received", "tx1", 0))
+        self.assertEqual(states["newer"], ("exchanging", "tx2", 3))
+
+
+class TestCanClaim(unittest.TestCase):
+    """Whether an explorer result may be the deposit of an exchange"""
+
+    def setUp(self):
+        self.created_at = datetime(2026, 1, 1, 12, 0)
+        self.exchange = make_exchange("e1", self.created_at)
+
+    def result(self, timestamp, amount=0.5):
+        return {"detected": True, "tx_hash": "tx", "amount": amount, "timestamp": timestamp}
+
+    def test_transaction_after_creation(self):
+        # Epoch seconds from an explorer, converted as kucoin_service does
+        later = (self.created_at + timedelta(minutes=5) - datetime(1970, 1, 1)).total_seconds()
+        self.assertTrue(can_claim(self.exchange, self.result(utc_timestamp(later))))
+        self.assertTrue(can_claim(self.exchange, self.result("2026-01-01T12:05:00Z")))
+
+    def test_transaction_before_creation(self):
+        self.assertFalse(can_claim(self.exchange, self.result("2026-01-01T11:59:00Z")))
+        # Aware times are compared in UTC
+        self.assertFalse(can_claim(self.exchange, self.result("2026-01-01T13:30:00+02:00")))
+
+    def test_transaction_without_time(self):
+        self.assertFalse(can_claim(self.exchange, self.result(None)))
+        self.assertFalse(can_claim(self.exchange, self.result(utc_timestamp(0))))
+        self.assertFalse(can_claim(self.exchange, self.result("not a time")))
+
+    def test_amount_must_match(self):
+        self.assertTrue(can_claim(self.exchange, self.result("2026-01-01T12:05:00Z", amount=0.50004)))
+        self.assertFalse(can_claim(self.exchange, self.result("2026-01-01T12:05:00Z", amount=0.4)))
+
+
+class TestDepositMonitorScan(unittest.IsolatedAsyncioTestCase):
+    """Scan loop of the deposit monitor against an in-memory Mongo"""
+
+    async def asyncSetUp(self):
+        self.db = AsyncMongoMockClient()["deposit_monitor_test"]
+        self.explorer = FakeExplorer()
+        self.monitor = DepositMonitor(self.db, self.explorer, lambda currency: 2)
+        await self.db.exchanges.insert_one(make_exchange("e1", datetime.utcnow()))
+
+    async def test_failed_scan_is_rescheduled(self):
+        """An exception in apply_result must not drop the address from the schedule"""
+        async def broken_apply_result(group, result):
+            raise RuntimeError("transient Mongo error")
+        self.monitor.apply_result = broken_apply_result
+
+        self.assertEqual(await self.monitor.run_once(), 1)
+        key = ("BTC", ADDRESS)
+        self.assertIn(key, self.monitor._due)
+        self.assertEqual(self.monitor._failures[key], 1)
+        self.assertGreaterEqual(self.monitor._due[key], time.monotonic() + MIN_POLL_SECONDS - 1)
+        self.assertTrue(any(entry[2] == key for entry in self.monitor._heap))
+
+        # Once due again it is scanned again, and backs off further on failure
+        self.monitor._schedule(key, time.monotonic())
+        self.assertEqual(await self.monitor.run_once(), 1)
+        self.assertEqual(self.monitor._failures[key], 2)
+        self.assertEqual(self.explorer.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()